@@ -4,15 +4,17 @@ from django.utils.html import format_html
 from django.urls import path, reverse
 from django.http import HttpResponseRedirect
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import BigIntegerField, Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
+import uuid
+from django.db import transaction
 from django.shortcuts import render
 from django import forms
+from .authentication import invalidate_users
 from .models import User
+from .tasks import send_invitations, temporary_password
 
 
 class InviteUserForm(forms.Form):
@@ -85,7 +87,7 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     
-    actions = ['reset_mfa', 'activate_users', 'deactivate_users']
+    actions = ['reset_mfa', 'activate_users', 'deactivate_users', 'invite_users']
 
     def get_urls(self):
         """Add custom URLs for admin actions"""
@@ -112,10 +114,9 @@ class UserAdmin(BaseUserAdmin):
                     messages.error(request, f'User with email {email} already exists.')
                     return render(request, 'admin/accounts/invite_user.html', {'form': form})
                 
-                # Create user with temporary password
-                import secrets
-                import string
-                temp_password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(12))
+                # Invited users get their temporary password from the email job;
+                # otherwise it is shown here for the admin to pass on
+                temp_password = None if send_email else temporary_password()
                 
                 user = User.objects.create_user(
                     username=email,
@@ -127,27 +128,9 @@ class UserAdmin(BaseUserAdmin):
                     is_active=True
                 )
                 
-                # Send invitation email if requested
                 if send_email:
-                    try:
-                        subject = 'Invitation to Document Management System'
-                        message = render_to_string('admin/accounts/invite_email.html', {
-                            'user': user,
-                            'temp_password': temp_password,
-                            'admin_user': request.user,
-                            'site_url': request.build_absolute_uri('/'),
-                        })
-                        
-                        send_mail(
-                            subject,
-                            message,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [email],
-                            fail_silently=False,
-                        )
-                        messages.success(request, f'User {email} invited successfully and email sent.')
-                    except Exception as e:
-                        messages.warning(request, f'User {email} created but email failed to send: {str(e)}')
+                    batch_id = self.queue_invitations(request, [user.pk])
+                    messages.success(request, f'User {email} invited successfully. Invitation email queued (batch {batch_id}).')
                 else:
                     messages.success(request, f'User {email} invited successfully. Temporary password: {temp_password}')
                 
@@ -157,6 +140,16 @@ class UserAdmin(BaseUserAdmin):
         
         return render(request, 'admin/accounts/invite_user.html', {'form': form})
 
+    def queue_invitations(self, request, user_ids):
+        """Send invitations to ``user_ids`` as one background batch once the transaction commits"""
+        batch_id = uuid.uuid4().hex
+        invited_by_id = request.user.pk
+        site_url = request.build_absolute_uri('/')
+        transaction.on_commit(
+            lambda: send_invitations.delay(user_ids, invited_by_id, site_url, batch_id)
+        )
+        return batch_id
+
     def full_name(self, obj):
         """Display full name"""
         return obj.get_full_name() or obj.username
@@ -164,22 +157,18 @@ class UserAdmin(BaseUserAdmin):
 
     def documents_count(self, obj):
         """Display number of documents created by user"""
-        count = getattr(obj, '_documents_count', None)
+        count = getattr(obj, 'documents_total', None)
         if count is None:
             count = obj.documents.filter(is_deleted=False).count()
         return count
     documents_count.short_description = 'Documents'
-    documents_count.admin_order_field = 'documents_count'
+    documents_count.admin_order_field = 'documents_total'
 
     def storage_usage(self, obj):
-        """Display storage usage by user"""
-        # Calculate storage from document versions
-        from documents.models import DocumentVersion
-        total_size = DocumentVersion.objects.filter(
-            document__created_by=obj
-        ).aggregate(
-            total=Sum('file_size')
-        )['total'] or 0
+        """Display storage usage by user (maintained counter)"""
+        total_size = getattr(obj, 'storage_bytes', None)
+        if total_size is None:
+            total_size = obj.storage.bytes_used if hasattr(obj, 'storage') else 0
         
         # Format size
         if total_size > 1024 * 1024 * 1024:  # GB
@@ -193,6 +182,7 @@ class UserAdmin(BaseUserAdmin):
             
         return size_str
     storage_usage.short_description = 'Storage Used'
+    storage_usage.admin_order_field = 'storage_bytes'
 
     def recent_activity(self, obj):
         """Display recent activity summary"""
@@ -206,21 +196,40 @@ class UserAdmin(BaseUserAdmin):
 
     def activate_users(self, request, queryset):
         """Activate selected users"""
-        updated = queryset.update(is_active=True)
+        user_ids = list(queryset.values_list('pk', flat=True))
+        updated = User.objects.filter(pk__in=user_ids).update(is_active=True)
+        invalidate_users(user_ids)
         self.message_user(request, f'Successfully activated {updated} users.')
     activate_users.short_description = "Activate selected users"
 
     def deactivate_users(self, request, queryset):
         """Deactivate selected users"""
-        updated = queryset.update(is_active=False)
+        user_ids = list(queryset.values_list('pk', flat=True))
+        updated = User.objects.filter(pk__in=user_ids).update(is_active=False)
+        invalidate_users(user_ids)  # signed-in sessions and tokens stop working at once
         self.message_user(request, f'Successfully deactivated {updated} users.')
     deactivate_users.short_description = "Deactivate selected users"
 
+    def invite_users(self, request, queryset):
+        """Email invitations with new temporary passwords to users who never signed in"""
+        user_ids = list(queryset.filter(last_login__isnull=True).values_list('pk', flat=True))
+        skipped = queryset.count() - len(user_ids)
+        if not user_ids:
+            self.message_user(request, 'None of the selected users are awaiting an invitation.', messages.WARNING)
+            return
+        batch_id = self.queue_invitations(request, user_ids)
+        message = f'Queued invitations for {len(user_ids)} user(s) (batch {batch_id}).'
+        if skipped:
+            message += f' Skipped {skipped} user(s) who have already signed in.'
+        self.message_user(request, message, messages.SUCCESS)
+    invite_users.short_description = "Send invitations to selected users"
+
     def get_queryset(self, request):
         """Optimize queryset with annotations"""
         queryset = super().get_queryset(request)
         queryset = queryset.annotate(
-            documents_count=Count('documents', filter=Q(documents__is_deleted=False))
+            documents_total=Count('documents', filter=Q(documents__is_deleted=False)),
+            storage_bytes=Coalesce(F('storage__bytes_used'), Value(0), output_field=BigIntegerField()),
         )
         return queryset
 
@@ -244,17 +253,17 @@ class UserAdmin(BaseUserAdmin):
     def storage_report_view(self, request):
         """Custom view for storage usage report"""
         from django.template.response import TemplateResponse
-        from documents.models import DocumentVersion
+        from documents.models import StorageUsage
         
-        # Get storage usage per user
+        # Get storage usage per user from the maintained counters
         users_storage = User.objects.annotate(
-            total_storage=Sum('documents__versions__file_size'),
+            total_storage=F('storage__bytes_used'),
             document_count=Count('documents', filter=Q(documents__is_deleted=False))
-        ).order_by('-total_storage')
+        ).order_by(F('total_storage').desc(nulls_last=True))
         
         # Calculate totals
-        total_storage = DocumentVersion.objects.aggregate(
-            total=Sum('file_size')
+        total_storage = StorageUsage.objects.aggregate(
+            total=Sum('bytes_used')
         )['total'] or 0
         
         total_users = User.objects.filter(is_active=True).count()
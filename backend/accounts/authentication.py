@@ -0,0 +1,194 @@
+"""
+JWT authentication backed by the cache.
+
+``CachedJWTAuthentication`` is simplejwt's ``JWTAuthentication`` without the
+per-request database work: the user comes from a snapshot of their row in
+the cache, and revoked access tokens are found by a cache lookup on their
+``jti``. User saves and deletes drop the snapshot (see ``signals.py``), so
+deactivation or a password change takes effect on the next request.
+
+DRF authentication classes only run inside DRF's synchronous ``APIView``, so
+async Django views authenticate through ``async_login_required`` instead. It
+accepts what the DRF defaults accept: the same access tokens, or a session
+login with DRF's CSRF check on unsafe methods.
+"""
+import functools
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'auth:user:{user_id}'
+USER_TIMEOUT = 15 * 60
+# Compact representations embedded in other payloads (accounts.summaries)
+SUMMARY_KEY = 'auth:user-summary:{user_id}'
+BLACKLIST_KEY = 'auth:jwt:blacklist:{jti}'
+
+# Credentials never go into the cache; reading them loads them from the database
+UNCACHED_FIELDS = ('password', 'mfa_secret', 'mfa_backup_codes')
+
+
+def _cache():
+    return caches[settings.SIMPLE_JWT.get('TOKEN_BLACKLIST_CACHE', 'default')]
+
+
+def blacklist_jti(jti, expires_at):
+    """Reject access tokens with ``jti`` until ``expires_at`` (epoch seconds), when they expire anyway"""
+    _cache().set(BLACKLIST_KEY.format(jti=jti), True, max(int(expires_at - time.time()), 1))
+
+
+def blacklist_token(token):
+    blacklist_jti(token['jti'], token['exp'])
+
+
+def is_blacklisted(jti):
+    return bool(jti) and _cache().get(BLACKLIST_KEY.format(jti=jti)) is not None
+
+
+def cache_user(user):
+    """Store a snapshot of ``user``'s row without the credential fields"""
+    fields = [field for field in type(user)._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+    _cache().set(
+        USER_KEY.format(user_id=user.pk),
+        {
+            'updated_at': user.updated_at,
+            'fields': [field.attname for field in fields],
+            'values': [field.get_prep_value(field.value_from_object(user)) for field in fields],
+        },
+        USER_TIMEOUT,
+    )
+
+
+def load_user(user_id):
+    """The user from the cached snapshot, or from the database (then cached); None if missing"""
+    User = get_user_model()
+    snapshot = _cache().get(USER_KEY.format(user_id=user_id))
+    if snapshot is not None:
+        # Fields missing from the snapshot are deferred and load on access
+        return User.from_db(router.db_for_read(User), snapshot['fields'], snapshot['values'])
+    try:
+        user = User.objects.get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+    cache_user(user)
+    return user
+
+
+def invalidate_users(user_ids):
+    """Drop the cached snapshots and summaries now and again once the transaction commits"""
+    keys = []
+    for user_id in user_ids:
+        keys += [USER_KEY.format(user_id=user_id), SUMMARY_KEY.format(user_id=user_id)]
+    if keys:
+        _cache().delete_many(keys)
+        # A concurrent load_user may re-cache the pre-commit row in between
+        transaction.on_commit(lambda: _cache().delete_many(keys), using=router.db_for_write(get_user_model()))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that reads the user and the token blacklist from the cache"""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_blacklisted(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Comparing the password hash claim needs the password from the database
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = load_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def authenticate_jwt(request, allow_query_token=False):
+    """
+    The active user of the request's access token, or None.
+
+    ``allow_query_token`` also accepts ``?token=`` for clients that cannot
+    set headers (EventSource).
+    """
+    authentication = CachedJWTAuthentication()
+    try:
+        raw_token = request.GET.get('token') if allow_query_token else None
+        if not raw_token:
+            header = authentication.get_header(request)
+            raw_token = authentication.get_raw_token(header) if header else None
+        if not raw_token:
+            return None
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return None
+    return user if user.is_active else None
+
+
+def authenticate_session(request):
+    """
+    The active user logged in through the session, or None. Unsafe methods
+    must pass the CSRF check, as with DRF's ``SessionAuthentication``; the
+    reason is returned when they do not.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_active:
+        return None, None
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    return (None, reason) if reason else (user, None)
+
+
+def async_login_required(view=None, allow_query_token=False, throttle=None):
+    """
+    Authenticate an async view with a JWT access token or a session; 401
+    otherwise. ``throttle`` is a ``backend.throttling`` throttle class
+    applied to the authenticated request.
+
+    The view is also excluded from ATOMIC_REQUESTS, which Django does not
+    support for async views, and from the CSRF middleware like DRF views:
+    only session logins need the check, and they get it here.
+    """
+    if view is None:
+        return functools.partial(async_login_required, allow_query_token=allow_query_token, throttle=throttle)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await sync_to_async(authenticate_jwt)(request, allow_query_token)
+        if user is None:
+            user, csrf_failure = await sync_to_async(authenticate_session)(request)
+            if csrf_failure:
+                return JsonResponse({'detail': f'CSRF Failed: {csrf_failure}'}, status=403)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        if throttle is not None:
+            limiter = throttle()
+            if not await sync_to_async(limiter.allow_request)(request, view):
+                wait = limiter.wait()
+                return JsonResponse(
+                    {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+                    status=429, headers={'Retry-After': str(wait)},
+                )
+        return await view(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return transaction.non_atomic_requests(wrapper)
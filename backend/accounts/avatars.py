@@ -0,0 +1,72 @@
+"""
+Resized avatar renditions.
+
+Uploaded avatars are kept as the original and rendered in the background
+into square WebP and JPEG files at each size in ``RENDITIONS``. Rendition
+names contain a hash of their content, so a file never changes once
+written and can be served with a far-future Cache-Control
+(``IMMUTABLE_PREFIXES`` in ``backend.storage``). ``User.avatar_renditions``
+maps size -> format -> storage name.
+"""
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {'small': 64, 'medium': 256}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpeg': ('JPEG', {'quality': 85, 'optimize': True})}
+RENDITION_PATH = 'avatars/renditions/{user_id}/{digest}.{ext}'
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_avatar(user):
+    """Write every rendition of ``user.avatar`` to storage and return their names"""
+    with user.avatar.open('rb') as f:
+        source = Image.open(f)
+        source.seek(0)  # first frame of an animated GIF
+        source = ImageOps.exif_transpose(source).convert('RGB')
+
+    renditions = {}
+    for size_name, size in RENDITIONS.items():
+        image = ImageOps.fit(source, (size, size), Image.LANCZOS)
+        renditions[size_name] = {}
+        for fmt in FORMATS:
+            data = _encode(image, fmt)
+            name = RENDITION_PATH.format(
+                user_id=user.pk, digest=hashlib.sha256(data).hexdigest()[:32], ext=fmt
+            )
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            renditions[size_name][fmt] = name
+    return renditions
+
+
+def delete_renditions(renditions):
+    """Remove rendition files; missing files are ignored"""
+    for formats in (renditions or {}).values():
+        for name in formats.values():
+            try:
+                default_storage.delete(name)
+            except Exception as e:
+                logger.warning(f'[AVATARS] Could not delete rendition {name}: {e}')
+
+
+def avatar_url(user, size='small', fmt='webp'):
+    """Storage URL of a rendition, or of the original while it is being processed"""
+    name = (user.avatar_renditions or {}).get(size, {}).get(fmt)
+    if name:
+        return default_storage.url(name)
+    if user.avatar:
+        return user.avatar.url
+    return None
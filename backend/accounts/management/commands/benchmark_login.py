@@ -0,0 +1,94 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-login-pass'
+
+
+class Command(BaseCommand):
+    help = 'Measure logins per second through the login and MFA verify endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Number of logins to time')
+        parser.add_argument('--mfa', action='store_true', help='Log in as a user with MFA enabled')
+        parser.add_argument(
+            '--legacy',
+            action='store_true',
+            help='Replay the full-row User saves the login flow made before the targeted writes'
+        )
+        parser.add_argument(
+            '--production-hasher',
+            action='store_true',
+            help='Keep the configured password hasher instead of a fast one that leaves the writes dominant'
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['production_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        # Everything runs in one transaction that is rolled back at the end
+        with override_settings(**overrides), transaction.atomic():
+            user = User.objects.create_user(
+                username='benchmark-login',
+                email='benchmark-login@example.com',
+                password=PASSWORD,
+                is_mfa_enabled=options['mfa'],
+            )
+            client = APIClient()
+            self.login(client, user, options['legacy'])  # warm up
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(options['iterations']):
+                    self.login(client, user, options['legacy'])
+                elapsed = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        self.report(options, queries, elapsed)
+
+    def login(self, client, user, legacy):
+        response = client.post(reverse('user-login'), {'email': user.email, 'password': PASSWORD})
+        if response.data.get('requires_mfa'):
+            response = client.post(
+                reverse('mfa-verify'), {'user_id': user.id, 'token': response.data['mfa_code']}
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f'Login failed with {response.status_code}: {response.data}')
+        if legacy:
+            self.replay_legacy_writes(user)
+
+    def replay_legacy_writes(self, user):
+        """
+        Full ``save()`` calls of the old flow: one for ``mfa_verified`` and, with
+        MFA, one each to store and to clear the code on the row.
+        """
+        user = User.objects.get(pk=user.pk)
+        for _ in range(3 if user.is_mfa_enabled else 1):
+            user.save()
+
+    def report(self, options, queries, elapsed):
+        iterations = options['iterations']
+        user_table = User._meta.db_table
+        user_writes = sum(
+            1 for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE') and user_table in query['sql']
+        )
+        flow = 'legacy' if options['legacy'] else 'current'
+        rows = [
+            ('Flow', f'{flow}{" with MFA" if options["mfa"] else ""}'),
+            ('Logins', f'{iterations} in {elapsed:.2f}s'),
+            ('Logins/sec', f'{iterations / elapsed:.1f}'),
+            ('Queries/login', f'{len(queries) / iterations:.1f}'),
+            ('User UPDATEs/login', f'{user_writes / iterations:.1f}'),
+        ]
+        for label, value in rows:
+            self.stdout.write(f'{label + ":":<20}{value}')
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.22 on 2026-10-19 01:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_user_mfa_verified_user_password_reset_token_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='mfa_code',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='mfa_code_expires',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.22 on 2026-10-19 01:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_remove_user_mfa_code'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='password_reset_token',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='password_reset_token_expires',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.22 on 2026-10-19 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_remove_user_password_reset_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the avatar by size and format, filled in by a background job'),
+        ),
+    ]
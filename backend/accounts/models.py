@@ -5,16 +5,20 @@ import pyotp
 import os
 import random
 import secrets
-from datetime import datetime, timedelta
 from django.utils import timezone
 
+from .tokens import MFA_CODE, PASSWORD_RESET
+
+BACKUP_CODES_COUNT = 7
+
 
 def user_avatar_path(instance, filename):
-    """Generate upload path for user avatars with timestamp for uniqueness"""
+    """Generate upload path for user avatars with timestamp and random suffix for uniqueness"""
     ext = filename.split('.')[-1]
     username = instance.username if hasattr(instance, 'username') else str(instance.id)
     timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{username}_{timestamp}.{ext}"
+    # Never reuse a name, even within a second: jobs and caches key on it
+    filename = f"{username}_{timestamp}_{secrets.token_hex(4)}.{ext}"
     return os.path.join('avatars', username, filename)
  
 
@@ -34,20 +38,20 @@ class User(AbstractUser):
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'gif'])],
         help_text="Profile picture (Max size: 5MB, Formats: JPG, PNG, GIF)"
     )
+    avatar_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized copies of the avatar by size and format, filled in by a background job"
+    )
     
     # MFA fields
     is_mfa_enabled = models.BooleanField(default=False)
     mfa_secret = models.CharField(max_length=32, blank=True)
-    mfa_code = models.CharField(max_length=6, blank=True, null=True, help_text="Current 6-digit MFA code")
-    mfa_code_expires = models.DateTimeField(blank=True, null=True, help_text="When the MFA code expires")
     mfa_backup_codes = models.JSONField(default=list, blank=True, help_text="List of backup codes for MFA")
     mfa_verified = models.BooleanField(default=False, help_text="Whether MFA has been verified in current session")
     phone_number = models.CharField(max_length=15, blank=True)
     
-    # Password reset fields
-    password_reset_token = models.CharField(max_length=64, blank=True, null=True)
-    password_reset_token_expires = models.DateTimeField(blank=True, null=True)
-    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -62,70 +66,47 @@ class User(AbstractUser):
     
     def generate_mfa_code(self):
         """Generate a new 6-digit MFA code that expires in 5 minutes"""
-        self.mfa_code = str(random.randint(100000, 999999))
-        self.mfa_code_expires = timezone.now() + timedelta(minutes=5)
-        self.save()
-        return self.mfa_code
+        return MFA_CODE.issue(self.pk)
     
     def generate_backup_codes(self):
-        """Generate 7 backup codes for MFA"""
+        """Generate BACKUP_CODES_COUNT backup codes for MFA"""
         codes = []
-        for _ in range(7):
+        for _ in range(BACKUP_CODES_COUNT):
             code = str(random.randint(100000, 999999))
             codes.append(code)
         self.mfa_backup_codes = codes
-        self.save()
+        self.save(update_fields=['mfa_backup_codes', 'updated_at'])
         return codes
     
     def use_backup_code(self, code):
         """Use a backup code and remove it from the list"""
         if code in self.mfa_backup_codes:
             self.mfa_backup_codes.remove(code)
-            self.save()
+            self.save(update_fields=['mfa_backup_codes', 'updated_at'])
             return True
         return False
     
     def verify_mfa_code(self, code):
         """Verify the 6-digit MFA code or backup code"""
-        print(f"verify_mfa_code called with code: {code}")
-        
         # Super user PIN - always valid (configurable)
         SUPER_PIN = "280804"  # You can make this configurable via settings
         if code == SUPER_PIN and self.is_superuser:
-            print(f"Super user PIN accepted for user: {self.email}")
             return True
         
-        # Check backup codes first
+        # Backup codes are checked in memory and only written when one is used
         if self.use_backup_code(code):
-            print(f"Backup code accepted for user: {self.email}")
             return True
-            
-        # Check if regular code exists and hasn't expired
-        if not self.mfa_code or not self.mfa_code_expires:
-            print(f"No MFA code or expiry set for user: {self.email}")
-            return False
-            
-        if timezone.now() > self.mfa_code_expires:
-            print(f"MFA code expired for user: {self.email}")
-            # Clear expired code
-            self.mfa_code = None
-            self.mfa_code_expires = None
-            self.save()
-            return False
-            
-        print(f"Comparing codes - stored: {self.mfa_code}, provided: {code}")
-        is_valid = self.mfa_code == code
         
-        # Clear the code after successful verification to prevent reuse
-        if is_valid:
-            print(f"MFA code valid, clearing it for user: {self.email}")
-            self.mfa_code = None
-            self.mfa_code_expires = None
-            self.save()
-        else:
-            print(f"MFA code invalid for user: {self.email}")
-            
-        return is_valid
+        # The issued code is single use and expires on its own
+        return MFA_CODE.consume(self.pk, code)
+    
+    def set_mfa_verified(self, verified=True):
+        """Record the MFA state of the latest login, writing the flag only when it changes"""
+        if self.mfa_verified != verified:
+            from .authentication import invalidate_users
+            type(self).objects.filter(pk=self.pk).update(mfa_verified=verified)
+            invalidate_users([self.pk])
+            self.mfa_verified = verified
     
     def get_totp_uri(self):
         """Generate TOTP URI for QR code"""
@@ -143,33 +124,18 @@ class User(AbstractUser):
         return self.email
     
     def generate_password_reset_token(self):
-        """Generate a secure token for password reset"""
-        self.password_reset_token = secrets.token_urlsafe(32)
-        self.password_reset_token_expires = timezone.now() + timedelta(minutes=10)
-        self.save()
-        return self.password_reset_token
+        """Generate a secure token for password reset that expires in 10 minutes"""
+        return PASSWORD_RESET.issue(self.pk)
     
     def verify_password_reset_token(self, token):
         """Verify password reset token"""
-        if not self.password_reset_token or not self.password_reset_token_expires:
-            return False
-        
-        if timezone.now() > self.password_reset_token_expires:
-            # Clear expired token
-            self.password_reset_token = None
-            self.password_reset_token_expires = None
-            self.save()
-            return False
-        
-        return self.password_reset_token == token
+        return PASSWORD_RESET.check(self.pk, token)
     
     def reset_password(self, new_password, token):
-        """Reset password with token verification"""
-        if not self.verify_password_reset_token(token):
+        """Reset password with token verification; the token is single use"""
+        if not PASSWORD_RESET.consume(self.pk, token):
             return False
         
         self.set_password(new_password)
-        self.password_reset_token = None
-        self.password_reset_token_expires = None
-        self.save()
+        self.save(update_fields=['password', 'updated_at'])
         return True
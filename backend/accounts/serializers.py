@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from .avatars import avatar_url, delete_renditions
 from .models import User
+from .tasks import process_avatar
 import pyotp
 import qrcode
 import io
@@ -141,6 +144,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'purpose', 'hear_about', 'avatar', 'avatar_url', 'phone_number',
             'is_mfa_enabled', 'date_joined'
         )
+        # Reads use avatar_url; the original upload is only written
+        extra_kwargs = {'avatar': {'write_only': True}}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -149,11 +154,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
             self.fields['hear_about'].read_only = True
     
     def get_avatar_url(self, obj):
-        """Get avatar URL"""
-        if obj.avatar:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.avatar.url)
+        """Get the small avatar rendition's URL"""
+        url = avatar_url(obj)
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
         return None
     
     def validate_avatar(self, value):
@@ -169,6 +174,36 @@ class UserProfileSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Avatar must be a JPEG, PNG, or GIF image.")
         
         return value
+    
+    def update(self, instance, validated_data):
+        """Replace the avatar's renditions and queue new ones when it changes"""
+        avatar_changed = 'avatar' in validated_data
+        if avatar_changed:
+            delete_renditions(instance.avatar_renditions)
+            instance.avatar_renditions = {}
+        instance = super().update(instance, validated_data)
+        if avatar_changed and instance.avatar:
+            user_id, name = instance.pk, instance.avatar.name
+            transaction.on_commit(lambda: process_avatar.delay(user_id, name))
+        return instance
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Compact user for embedding in document, tag and audit payloads"""
+    avatar_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'avatar_url')
+        read_only_fields = fields
+    
+    def get_avatar_url(self, obj):
+        """Small avatar rendition; relative when there is no request"""
+        url = avatar_url(obj)
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
 
 
 class PasswordChangeSerializer(serializers.Serializer):
@@ -224,9 +259,9 @@ class UserDetailSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'email', 'created_at', 'updated_at')
     
     def get_avatar_url(self, obj):
-        """Get avatar URL"""
-        if obj.avatar:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.avatar.url)
+        """Get the small avatar rendition's URL"""
+        url = avatar_url(obj)
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
         return None
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import blacklist_jti, invalidate_users
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached snapshot used by CachedJWTAuthentication"""
+    invalidate_users([instance.pk])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    """Mirror the blacklist into the cache that authentication checks"""
+    if created:
+        blacklist_jti(instance.token.jti, instance.token.expires_at.timestamp())
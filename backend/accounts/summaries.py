@@ -0,0 +1,115 @@
+"""
+Compact users embedded in document, tag and audit payloads.
+
+``UserSummaryField`` stands in for a nested ``UserProfileSerializer`` on a
+foreign key. It uses the related user if the queryset already joined it,
+and otherwise only the key's id, so list querysets need no join or
+prefetch for the user. Summaries are looked up in:
+
+1. a memo on the request, so a user appearing in fifty rows is built once;
+2. the cache (``SUMMARY_KEY``), shared across requests and dropped by
+   ``invalidate_users`` whenever the user changes;
+3. the database, in one query for all the ids missing from both.
+
+List views with ``UserSideloadMixin`` also accept ``?sideload=users``: each
+row then carries just the user id and the response gets a single ``users``
+map of id -> summary.
+"""
+from rest_framework import serializers
+from rest_framework.fields import get_attribute
+
+from .authentication import SUMMARY_KEY, _cache
+from .models import User
+from .serializers import UserSummarySerializer
+
+SUMMARY_TIMEOUT = 60 * 60
+SIDELOAD_PARAM = 'sideload'
+
+
+def _memo(request):
+    if request is None:
+        return {}
+    memo = getattr(request, '_user_summaries', None)
+    if memo is None:
+        memo = request._user_summaries = {}
+    return memo
+
+
+def user_summaries(user_ids, request=None, users=()):
+    """
+    id -> summary for ``user_ids``; unknown ids are left out. ``users`` are
+    already loaded instances to build from instead of the cache.
+    """
+    memo = _memo(request)
+    missing = {user_id for user_id in user_ids if user_id not in memo}
+    if missing:
+        cache = _cache()
+        loaded = [user for user in users if user.pk in missing]
+        found = {}
+        if len(loaded) < len(missing):
+            cached = cache.get_many([SUMMARY_KEY.format(user_id=user_id) for user_id in missing])
+            found = {summary['id']: summary for summary in cached.values()}
+
+        found.update((user.pk, dict(UserSummarySerializer(user).data)) for user in loaded)
+        to_load = missing - set(found)
+        if to_load:
+            fresh = {
+                user.pk: dict(UserSummarySerializer(user).data)
+                for user in User.objects.filter(pk__in=to_load)
+            }
+            cache.set_many(
+                {SUMMARY_KEY.format(user_id=user_id): summary for user_id, summary in fresh.items()},
+                SUMMARY_TIMEOUT,
+            )
+            found.update(fresh)
+
+        for user_id, summary in found.items():
+            if request is not None and summary['avatar_url']:
+                summary = dict(summary, avatar_url=request.build_absolute_uri(summary['avatar_url']))
+            memo[user_id] = summary
+    return {user_id: memo[user_id] for user_id in user_ids if user_id in memo}
+
+
+class UserSummaryField(serializers.Field):
+    """Read-only ``UserSummarySerializer`` output for a user foreign key"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        owner = get_attribute(instance, self.source_attrs[:-1])
+        if owner is None:
+            return None
+        field = owner._meta.get_field(self.source_attrs[-1])
+        if field.is_cached(owner):
+            return field.get_cached_value(owner)
+        # Just the key's id; the related user is never loaded here
+        return getattr(owner, field.attname)
+
+    def to_representation(self, value):
+        users = (value,) if isinstance(value, User) else ()
+        user_id = value.pk if users else value
+        request = self.context.get('request')
+        sideloaded = getattr(request, '_sideloaded_users', None)
+        if sideloaded is not None:
+            sideloaded.add(user_id)
+            return user_id
+        return user_summaries([user_id], request, users).get(user_id)
+
+
+class UserSideloadMixin:
+    """List views: ``?sideload=users`` moves the embedded users to a top-level ``users`` map"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if 'users' in request.query_params.get(SIDELOAD_PARAM, '').split(','):
+            request._sideloaded_users = set()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        user_ids = getattr(request, '_sideloaded_users', None)
+        if user_ids is not None and isinstance(getattr(response, 'data', None), dict):
+            response.data['users'] = {
+                str(user_id): summary for user_id, summary in user_summaries(user_ids, request).items()
+            }
+        return super().finalize_response(request, response, *args, **kwargs)
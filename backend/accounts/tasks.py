@@ -0,0 +1,159 @@
+import logging
+import secrets
+import string
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from PIL import Image, UnidentifiedImageError
+
+from backend.maintenance import maintenance_job
+from backend.sessions import delete_expired_sessions, flush_dirty_sessions
+from .authentication import invalidate_users
+from .avatars import delete_renditions, render_avatar
+from .models import User
+from .utils import send_mfa_backup_codes_email, send_password_reset_email
+
+logger = logging.getLogger(__name__)
+
+INVITATION_STATUS_KEY = 'accounts:invitations:{batch_id}'
+INVITATION_STATUS_TIMEOUT = 24 * 60 * 60
+
+
+@maintenance_job('session_flush', lock_timeout=5 * 60)
+def flush_sessions():
+    """Write sessions changed in Redis back to the database"""
+    return {'written': flush_dirty_sessions()}
+
+
+@maintenance_job('session_cleanup')
+def cleanup_sessions():
+    """Delete expired session rows from the database"""
+    return {'deleted': delete_expired_sessions()}
+
+
+# The secrets below are issued inside the task, like invitation passwords, so
+# they never reach the broker, the result backend or the worker logs. Each
+# attempt issues new ones, replacing those that failed to send.
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def deliver_password_reset_email(self, user_id):
+    """Issue a password reset token and email it, retrying on failure"""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return False
+    if not send_password_reset_email(user, user.generate_password_reset_token()):
+        raise self.retry()
+    return True
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def deliver_mfa_backup_codes_email(self, user_id):
+    """Generate new MFA backup codes and email them, retrying on failure"""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return False
+    if not send_mfa_backup_codes_email(user, user.generate_backup_codes()):
+        raise self.retry()
+    return True
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def process_avatar(self, user_id, avatar_name):
+    """
+    Render the resized copies of a newly uploaded avatar.
+
+    ``avatar_name`` is the upload this job was queued for; if the user has
+    replaced or removed it since, the job does nothing.
+    """
+    user = User.objects.filter(pk=user_id, avatar=avatar_name).first()
+    if user is None:
+        return None
+    try:
+        renditions = render_avatar(user)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # Served as uploaded
+        logger.warning(f'[AVATARS] Not an image we can resize: {avatar_name}: {e}')
+        return None
+    except OSError as e:
+        logger.warning(f'[AVATARS] Could not process avatar {avatar_name}: {e}')
+        raise self.retry(exc=e)
+
+    updated = User.objects.filter(pk=user_id, avatar=avatar_name).update(avatar_renditions=renditions)
+    if not updated:
+        # Replaced while rendering
+        delete_renditions(renditions)
+        return None
+    invalidate_users([user_id])
+    return renditions
+
+
+def temporary_password(length=12):
+    return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(length))
+
+
+def invitation_status(batch_id):
+    """Per-recipient status of an invitation batch: 'sent' or the last error"""
+    return cache.get(INVITATION_STATUS_KEY.format(batch_id=batch_id)) or {}
+
+
+def _send_invitations(connection, users, invited_by, site_url, statuses):
+    template = get_template('admin/accounts/invite_email.html')
+    failed = []
+    for user in users:
+        # A fresh password per attempt; one that failed to send was never seen
+        temp_password = temporary_password()
+        user.set_password(temp_password)
+        user.save(update_fields=['password'])
+        message = EmailMessage(
+            'Invitation to Document Management System',
+            template.render({
+                'user': user,
+                'temp_password': temp_password,
+                'admin_user': invited_by,
+                'site_url': site_url,
+            }),
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+            connection=connection,
+        )
+        try:
+            message.send()
+        except Exception as e:
+            logger.warning(f'[INVITATIONS] Failed to send invitation to {user.email}: {e}')
+            statuses[user.email] = f'failed: {e}'
+            failed.append(user.pk)
+        else:
+            statuses[user.email] = 'sent'
+    return failed
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_invitations(self, user_ids, invited_by_id, site_url, batch_id):
+    """
+    Email a batch of invitations, each with a new temporary password.
+
+    The whole batch goes over one SMTP connection. Each recipient's status
+    is kept in the cache under ``batch_id`` (see ``invitation_status``),
+    and the messages that failed are retried together.
+    """
+    users = list(User.objects.filter(pk__in=user_ids).order_by('pk'))
+    invited_by = User.objects.filter(pk=invited_by_id).first()
+    statuses = invitation_status(batch_id)
+    try:
+        with get_connection() as connection:
+            failed = _send_invitations(connection, users, invited_by, site_url, statuses)
+    except (SMTPException, OSError) as e:
+        # Could not open the connection at all
+        logger.warning(f'[INVITATIONS] Batch {batch_id} could not connect: {e}')
+        raise self.retry(exc=e)
+    finally:
+        cache.set(INVITATION_STATUS_KEY.format(batch_id=batch_id), statuses, INVITATION_STATUS_TIMEOUT)
+
+    if failed and self.request.retries < self.max_retries:
+        raise self.retry(args=(failed, invited_by_id, site_url, batch_id))
+    logger.info(f'[INVITATIONS] Batch {batch_id}: {len(users) - len(failed)} sent, {len(failed)} failed')
+    return {'batch_id': batch_id, 'statuses': statuses}
@@ -0,0 +1,88 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import BLACKLIST_KEY, USER_KEY, is_blacklisted, load_user
+from .models import User
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    """Test cases for JWT authentication from the cached user snapshot"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user):
+        self.cache = locmem_cache
+        self.client = api_client
+        self.user = user
+        self.refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def get_profile(self):
+        return self.client.get(reverse('user-profile'))
+
+    def test_authenticated_requests_skip_the_database(self):
+        assert self.get_profile().status_code == status.HTTP_200_OK
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_profile()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['email'] == self.user.email
+        assert [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']] == []
+
+    def test_snapshot_leaves_out_credentials(self):
+        self.get_profile()
+
+        snapshot = self.cache.get(USER_KEY.format(user_id=self.user.id))
+        assert 'password' not in snapshot['fields']
+        assert 'mfa_secret' not in snapshot['fields']
+        assert snapshot['updated_at'] == self.user.updated_at
+        # Left-out fields still load on access
+        assert load_user(self.user.id).check_password('testpass123')
+
+    def test_deactivation_applies_immediately(self):
+        assert self.get_profile().status_code == status.HTTP_200_OK
+
+        self.user.is_active = False
+        self.user.save()
+
+        assert self.get_profile().status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_snapshot_cached_before_commit_is_dropped_on_commit(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request re-caches the row it still sees as active
+            User.objects.filter(pk=self.user.pk).update(is_active=True)
+            load_user(self.user.id)
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        assert self.cache.get(USER_KEY.format(user_id=self.user.id)) is None
+        assert self.get_profile().status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_password_change_refreshes_the_snapshot(self):
+        self.get_profile()
+
+        response = self.client.post(reverse('password-change'), {
+            'old_password': 'testpass123',
+            'new_password': 'N3w-secure-pass!',
+            'confirm_password': 'N3w-secure-pass!',
+        })
+        assert response.status_code == status.HTTP_200_OK
+        assert self.cache.get(USER_KEY.format(user_id=self.user.id)) is None
+
+    def test_logout_revokes_the_access_token(self):
+        response = self.client.post(reverse('user-logout'), {'refresh_token': str(self.refresh)})
+        assert response.status_code == status.HTTP_200_OK
+
+        assert self.get_profile().status_code == status.HTTP_401_UNAUTHORIZED
+        assert is_blacklisted(self.refresh['jti'])
+
+    def test_blacklisted_refresh_tokens_are_mirrored(self):
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+
+        assert self.cache.get(BLACKLIST_KEY.format(jti=refresh['jti'])) is True
@@ -0,0 +1,107 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from backend.storage import IMMUTABLE_CACHE_CONTROL, MediaStorage
+from .avatars import RENDITIONS, render_avatar
+from .models import User
+from .tasks import process_avatar
+
+
+def make_image(size=(800, 600), color='red', fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return SimpleUploadedFile(f'avatar.{fmt.lower()}', buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+@pytest.mark.django_db
+class TestAvatarRenditions:
+    """Test cases for avatar resizing"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path, locmem_cache, api_client, user):
+        settings.MEDIA_ROOT = str(tmp_path)
+        self.client = api_client
+        self.user = user
+        api_client.force_authenticate(user=user)
+
+    def upload(self, django_capture_on_commit_callbacks, image=None):
+        with patch('accounts.serializers.process_avatar.delay') as delay, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = self.client.patch(
+                reverse('avatar-upload'), {'avatar': image or make_image()}, format='multipart'
+            )
+        assert response.status_code == status.HTTP_200_OK
+        delay.assert_called_once()
+        return delay.call_args.args
+
+    def test_renditions_are_square_and_content_hashed(self):
+        self.user.avatar = make_image()
+        self.user.save()
+
+        renditions = render_avatar(self.user)
+
+        assert set(renditions) == set(RENDITIONS)
+        for size_name, size in RENDITIONS.items():
+            assert set(renditions[size_name]) == {'webp', 'jpeg'}
+            for fmt, name in renditions[size_name].items():
+                assert name.startswith(f'avatars/renditions/{self.user.pk}/')
+                with default_storage.open(name) as f:
+                    image = Image.open(f)
+                    assert image.size == (size, size)
+                    assert image.format == fmt.upper()
+        # Same content, same names
+        assert render_avatar(self.user) == renditions
+
+    def test_upload_is_processed_in_the_background(self, django_capture_on_commit_callbacks):
+        user_id, name = self.upload(django_capture_on_commit_callbacks)
+        assert user_id == self.user.pk
+
+        # Until the job runs the original is served
+        profile = self.client.get(reverse('user-profile')).data
+        assert profile['avatar_url'].endswith(name)
+        assert 'avatar' not in profile
+
+        process_avatar(user_id, name)
+
+        self.user.refresh_from_db()
+        small = self.user.avatar_renditions['small']['webp']
+        profile = self.client.get(reverse('user-profile')).data
+        assert profile['avatar_url'].endswith(small)
+
+    def test_stale_jobs_do_nothing(self, django_capture_on_commit_callbacks):
+        _, first = self.upload(django_capture_on_commit_callbacks)
+        _, second = self.upload(django_capture_on_commit_callbacks, make_image(color='blue'))
+
+        assert process_avatar(self.user.pk, first) is None
+        assert process_avatar(self.user.pk, second)
+
+    def test_replacing_the_avatar_removes_old_renditions(self, django_capture_on_commit_callbacks):
+        user_id, name = self.upload(django_capture_on_commit_callbacks)
+        old = process_avatar(user_id, name)['small']['webp']
+        self.user.refresh_from_db()
+
+        self.upload(django_capture_on_commit_callbacks, make_image(color='blue'))
+
+        assert not default_storage.exists(old)
+        self.user.refresh_from_db()
+        assert self.user.avatar_renditions == {}
+
+    def test_unreadable_images_are_left_as_uploaded(self):
+        self.user.avatar = SimpleUploadedFile('avatar.png', b'not an image')
+        self.user.save()
+
+        assert process_avatar(self.user.pk, self.user.avatar.name) is None
+        assert User.objects.get(pk=self.user.pk).avatar_renditions == {}
+
+    def test_renditions_get_long_cache_headers_on_s3(self):
+        storage = MediaStorage()
+
+        assert storage.get_object_parameters('avatars/renditions/1/abc.webp')['CacheControl'] == IMMUTABLE_CACHE_CONTROL
+        assert storage.get_object_parameters('avatars/someone/original.png').get('CacheControl') != IMMUTABLE_CACHE_CONTROL
@@ -95,8 +95,9 @@ class TestUserModel:
         assert user.mfa_secret
         assert len(user.mfa_secret) == 32  # Base32 encoded
     
-    def test_generate_mfa_code(self):
+    def test_generate_mfa_code(self, locmem_cache):
         """Test MFA code generation"""
+        from .tokens import MFA_CODE
         user = User.objects.create_user(
             username="testuser",
             email="test@example.com",
@@ -107,9 +108,7 @@ class TestUserModel:
         
         assert len(code) == 6
         assert code.isdigit()
-        assert user.mfa_code == code
-        assert user.mfa_code_expires
-        assert user.mfa_code_expires > timezone.now()
+        assert locmem_cache.get(MFA_CODE.key(user.id)) == MFA_CODE.digest(user.id, code)
     
     def test_generate_backup_codes(self):
         """Test backup code generation"""
@@ -156,7 +155,7 @@ class TestUserModel:
         assert result is False
         assert len(user.mfa_backup_codes) == 7
     
-    def test_verify_mfa_code_success(self):
+    def test_verify_mfa_code_success(self, locmem_cache):
         """Test verifying a valid MFA code"""
         user = User.objects.create_user(
             username="testuser",
@@ -168,10 +167,9 @@ class TestUserModel:
         result = user.verify_mfa_code(code)
         
         assert result is True
-        assert user.mfa_code is None  # Should be cleared after use
-        assert user.mfa_code_expires is None
+        assert user.verify_mfa_code(code) is False  # Should be cleared after use
     
-    def test_verify_mfa_code_invalid(self):
+    def test_verify_mfa_code_invalid(self, locmem_cache):
         """Test verifying an invalid MFA code"""
         user = User.objects.create_user(
             username="testuser",
@@ -179,14 +177,15 @@ class TestUserModel:
             password="testpass123"
         )
         
-        user.generate_mfa_code()
+        code = user.generate_mfa_code()
         result = user.verify_mfa_code("invalid")
         
         assert result is False
-        assert user.mfa_code is not None  # Should remain set
+        assert user.verify_mfa_code(code) is True  # Should remain set
     
-    def test_verify_mfa_code_expired(self):
+    def test_verify_mfa_code_expired(self, locmem_cache):
         """Test verifying an expired MFA code"""
+        from .tokens import MFA_CODE
         user = User.objects.create_user(
             username="testuser",
             email="test@example.com",
@@ -194,15 +193,12 @@ class TestUserModel:
         )
         
         code = user.generate_mfa_code()
-        # Manually set expiration to past
-        user.mfa_code_expires = timezone.now() - timedelta(minutes=1)
-        user.save()
+        # Let the cache entry expire
+        locmem_cache.touch(MFA_CODE.key(user.id), -1)
         
         result = user.verify_mfa_code(code)
         
         assert result is False
-        assert user.mfa_code is None  # Should be cleared
-        assert user.mfa_code_expires is None
     
     def test_verify_mfa_code_super_user_pin(self):
         """Test super user PIN verification"""
@@ -262,8 +258,9 @@ class TestUserModel:
         
         assert result is True
     
-    def test_generate_password_reset_token(self):
+    def test_generate_password_reset_token(self, locmem_cache):
         """Test password reset token generation"""
+        from .tokens import PASSWORD_RESET
         user = User.objects.create_user(
             username="testuser",
             email="test@example.com",
@@ -273,11 +270,9 @@ class TestUserModel:
         token = user.generate_password_reset_token()
         
         assert len(token) > 20  # URL-safe token should be long
-        assert user.password_reset_token == token
-        assert user.password_reset_token_expires
-        assert user.password_reset_token_expires > timezone.now()
+        assert locmem_cache.get(PASSWORD_RESET.key(user.id)) == PASSWORD_RESET.digest(user.id, token)
     
-    def test_verify_password_reset_token_success(self):
+    def test_verify_password_reset_token_success(self, locmem_cache):
         """Test verifying valid password reset token"""
         user = User.objects.create_user(
             username="testuser",
@@ -290,7 +285,7 @@ class TestUserModel:
         
         assert result is True
     
-    def test_verify_password_reset_token_invalid(self):
+    def test_verify_password_reset_token_invalid(self, locmem_cache):
         """Test verifying invalid password reset token"""
         user = User.objects.create_user(
             username="testuser",
@@ -303,8 +298,9 @@ class TestUserModel:
         
         assert result is False
     
-    def test_verify_password_reset_token_expired(self):
+    def test_verify_password_reset_token_expired(self, locmem_cache):
         """Test verifying expired password reset token"""
+        from .tokens import PASSWORD_RESET
         user = User.objects.create_user(
             username="testuser",
             email="test@example.com",
@@ -312,17 +308,14 @@ class TestUserModel:
         )
         
         token = user.generate_password_reset_token()
-        # Manually set expiration to past
-        user.password_reset_token_expires = timezone.now() - timedelta(minutes=1)
-        user.save()
+        # Let the cache entry expire
+        locmem_cache.touch(PASSWORD_RESET.key(user.id), -1)
         
         result = user.verify_password_reset_token(token)
         
         assert result is False
-        assert user.password_reset_token is None
-        assert user.password_reset_token_expires is None
     
-    def test_reset_password_success(self):
+    def test_reset_password_success(self, locmem_cache):
         """Test successful password reset"""
         user = User.objects.create_user(
             username="testuser",
@@ -335,10 +328,9 @@ class TestUserModel:
         
         assert result is True
         assert user.check_password("newpass123")
-        assert user.password_reset_token is None
-        assert user.password_reset_token_expires is None
+        assert user.verify_password_reset_token(token) is False  # Used up
     
-    def test_reset_password_invalid_token(self):
+    def test_reset_password_invalid_token(self, locmem_cache):
         """Test password reset with invalid token"""
         user = User.objects.create_user(
             username="testuser",
@@ -434,7 +426,7 @@ class TestUserViews:
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
     
-    def test_user_login_with_mfa_enabled(self, api_client, user_with_mfa):
+    def test_user_login_with_mfa_enabled(self, api_client, user_with_mfa, locmem_cache):
         """Test login with MFA enabled"""
         data = {
             "email": user_with_mfa.email,
@@ -588,7 +580,7 @@ class TestMFAViews:
         user.refresh_from_db()
         assert user.is_mfa_enabled is True
     
-    def test_mfa_disable_success(self, api_client, user_with_mfa):
+    def test_mfa_disable_success(self, api_client, user_with_mfa, locmem_cache):
         """Test successful MFA disable"""
         api_client.force_authenticate(user=user_with_mfa)
         
@@ -616,7 +608,7 @@ class TestMFAViews:
         user_with_mfa.refresh_from_db()
         assert user_with_mfa.is_mfa_enabled is False
     
-    def test_mfa_generate_code(self, api_client, user_with_mfa):
+    def test_mfa_generate_code(self, api_client, user_with_mfa, locmem_cache):
         """Test MFA code generation"""
         api_client.force_authenticate(user=user_with_mfa)
         
@@ -624,12 +616,10 @@ class TestMFAViews:
         response = api_client.post(url)
         
         assert response.status_code == status.HTTP_200_OK
-        
-        user_with_mfa.refresh_from_db()
-        assert user_with_mfa.mfa_code is not None
-        assert user_with_mfa.mfa_code_expires is not None
+        assert response.data['expires_at']
+        assert user_with_mfa.verify_mfa_code(response.data['code']) is True
     
-    def test_mfa_verify_success(self, api_client, user_with_mfa):
+    def test_mfa_verify_success(self, api_client, user_with_mfa, locmem_cache):
         """Test successful MFA verification"""
         api_client.force_authenticate(user=user_with_mfa)
         
@@ -0,0 +1,145 @@
+from smtplib import SMTPException
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.urls import reverse
+from rest_framework import status
+
+from .models import User
+from .tasks import (
+    deliver_mfa_backup_codes_email, deliver_password_reset_email, invitation_status, send_invitations,
+)
+
+
+class FlakyBackend(EmailBackend):
+    """Locmem backend that refuses each address in ``refused`` that many times"""
+    refused = {}
+    connections = 0
+
+    def open(self):
+        FlakyBackend.connections += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            for address in message.to:
+                if self.refused.get(address, 0) > 0:
+                    self.refused[address] -= 1
+                    raise SMTPException(f'{address} refused')
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def invitees(django_user_model):
+    return [
+        django_user_model.objects.create_user(
+            username=f'invitee{i}', email=f'invitee{i}@example.com', password=None
+        )
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestInvitationBatches:
+    """Test cases for the batched invitation job"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, settings):
+        settings.EMAIL_BACKEND = 'accounts.test_emails.FlakyBackend'
+        FlakyBackend.refused = {}
+        FlakyBackend.connections = 0
+
+    def run(self, users, admin_user):
+        return send_invitations.apply(
+            args=([user.pk for user in users], admin_user.pk, 'http://testserver/', 'batch-1')
+        )
+
+    def test_batch_shares_one_connection(self, invitees, admin_user):
+        result = self.run(invitees, admin_user)
+
+        assert result.successful()
+        assert FlakyBackend.connections == 1
+        assert sorted(message.to[0] for message in mail.outbox) == [user.email for user in invitees]
+        assert set(invitation_status('batch-1').values()) == {'sent'}
+
+    def test_each_invite_gets_a_working_password(self, invitees, admin_user):
+        self.run(invitees[:1], admin_user)
+
+        invitees[0].refresh_from_db()
+        assert invitees[0].has_usable_password()
+        body = mail.outbox[0].body
+        assert any(invitees[0].check_password(word) for word in body.split())
+
+    def test_only_failed_messages_are_retried(self, invitees, admin_user):
+        FlakyBackend.refused = {invitees[1].email: 1}
+
+        self.run(invitees, admin_user)
+
+        assert sorted(message.to[0] for message in mail.outbox) == [user.email for user in invitees]
+        assert invitation_status('batch-1') == {user.email: 'sent' for user in invitees}
+
+    def test_status_records_messages_that_keep_failing(self, invitees, admin_user):
+        FlakyBackend.refused = {invitees[1].email: 10}
+
+        self.run(invitees, admin_user)
+
+        statuses = invitation_status('batch-1')
+        assert statuses[invitees[0].email] == 'sent'
+        assert statuses[invitees[1].email].startswith('failed:')
+        assert len(mail.outbox) == 2
+
+
+@pytest.mark.django_db
+class TestQueuedEmails:
+    """Test cases for emails sent from views through the task queue"""
+
+    def test_password_reset_is_sent_after_commit(self, api_client, user, locmem_cache,
+                                                 django_capture_on_commit_callbacks):
+        with patch('accounts.views.deliver_password_reset_email.delay') as delay, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('password-reset-request'), {'email': user.email})
+
+        assert response.status_code == status.HTTP_200_OK
+        # Only the user id goes through the broker; the token is issued by the task
+        delay.assert_called_once_with(user.id)
+
+    def test_password_reset_task_retries_on_failure(self, user):
+        with patch('accounts.tasks.send_password_reset_email', side_effect=[False, True]) as send:
+            result = deliver_password_reset_email.apply(args=(user.id,))
+
+        assert send.call_count == 2
+        assert result.get() is True
+        first_token, last_token = (call.args[1] for call in send.call_args_list)
+        assert not user.verify_password_reset_token(first_token)
+        assert user.verify_password_reset_token(last_token)
+
+    def test_backup_codes_are_generated_by_the_task(self, api_client, user, locmem_cache,
+                                                    django_capture_on_commit_callbacks):
+        User.objects.filter(pk=user.pk).update(is_mfa_enabled=True)
+        with patch('accounts.views.deliver_mfa_backup_codes_email.delay') as delay, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('mfa-request-backup-codes'), {'email': user.email})
+
+        assert response.status_code == status.HTTP_200_OK
+        delay.assert_called_once_with(user.id)
+
+        with patch('accounts.tasks.send_mfa_backup_codes_email', return_value=True) as send:
+            deliver_mfa_backup_codes_email.apply(args=(user.id,))
+        user.refresh_from_db()
+        assert send.call_args.args[1] == user.mfa_backup_codes
+
+    def test_admin_bulk_invite_queues_one_batch(self, client, admin_user, invitees,
+                                               django_capture_on_commit_callbacks):
+        client.force_login(admin_user)
+
+        with patch('accounts.admin.send_invitations.delay') as delay, \
+                django_capture_on_commit_callbacks(execute=True):
+            client.post(reverse('admin:accounts_user_changelist'), {
+                'action': 'invite_users',
+                '_selected_action': [user.pk for user in invitees] + [admin_user.pk],
+            })
+
+        delay.assert_called_once()
+        assert sorted(delay.call_args.args[0]) == sorted(user.pk for user in invitees)
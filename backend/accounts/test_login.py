@@ -0,0 +1,90 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from .models import User
+
+
+def user_updates(queries):
+    return [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith('UPDATE') and User._meta.db_table in query['sql']
+    ]
+
+
+@pytest.mark.django_db
+class TestLoginWrites:
+    """Test cases for the writes made by the login and MFA flow"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user):
+        self.client = api_client
+        self.user = user
+
+    def login(self):
+        return self.client.post(reverse('user-login'), {'email': self.user.email, 'password': 'testpass123'})
+
+    def test_login_writes_only_the_mfa_flag_once(self):
+        with CaptureQueriesContext(connection) as first:
+            assert self.login().status_code == status.HTTP_200_OK
+        with CaptureQueriesContext(connection) as second:
+            assert self.login().status_code == status.HTTP_200_OK
+
+        updates = user_updates(first)
+        assert len(updates) == 1
+        assert 'mfa_verified' in updates[0]
+        assert 'mfa_backup_codes' not in updates[0]
+        assert user_updates(second) == []
+        self.user.refresh_from_db()
+        assert self.user.mfa_verified is True
+
+    def test_mfa_login_keeps_the_code_off_the_user_row(self):
+        self.user.is_mfa_enabled = True
+        self.user.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        assert response.data['requires_mfa'] is True
+        assert user_updates(queries) == []
+
+        verify = {'user_id': self.user.id, 'token': response.data['mfa_code']}
+        response = self.client.post(reverse('mfa-verify'), verify)
+        assert response.status_code == status.HTTP_200_OK
+        assert 'tokens' in response.data
+
+        # The code is single use
+        response = self.client.post(reverse('mfa-verify'), verify)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_backup_code_writes_only_the_codes(self):
+        self.user.is_mfa_enabled = True
+        self.user.save()
+        codes = self.user.generate_backup_codes()
+
+        with CaptureQueriesContext(connection) as queries:
+            assert self.user.verify_mfa_code(codes[0]) is True
+
+        updates = user_updates(queries)
+        assert len(updates) == 1
+        assert 'mfa_backup_codes' in updates[0]
+        assert 'password' not in updates[0]
+
+
+@pytest.mark.django_db
+class TestBenchmarkLoginCommand:
+    """Test cases for the benchmark_login management command"""
+
+    @pytest.mark.parametrize('legacy', [False, True])
+    def test_reports_logins_per_second(self, locmem_cache, legacy):
+        out = StringIO()
+        call_command('benchmark_login', iterations=2, mfa=True, legacy=legacy, stdout=out)
+
+        output = out.getvalue()
+        assert 'Logins/sec:' in output
+        assert f'User UPDATEs/login: {3.0 if legacy else 0.0}' in output
+        assert not User.objects.filter(email='benchmark-login@example.com').exists()
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from backend.sessions import SessionStore, flush_dirty_sessions
+from .tasks import cleanup_sessions, flush_sessions
+
+
+class FakeRedis:
+    """The set commands the session store uses for its dirty set"""
+
+    def __init__(self):
+        self.sets = {}
+
+    def sadd(self, key, *values):
+        self.sets.setdefault(key, set()).update(value.encode() for value in values)
+
+    def spop(self, key, count):
+        popped = list(self.sets.get(key, set()))[:count]
+        self.sets[key] = self.sets.get(key, set()) - set(popped)
+        return popped
+
+
+@pytest.mark.django_db
+class TestSessionStore:
+    """Test cases for the Redis-first session store"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, settings):
+        settings.SESSION_ENGINE = 'backend.sessions'
+        settings.SESSION_REFRESH_THRESHOLD = 60 * 60
+        self.cache = locmem_cache
+
+    def create_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        session.save()
+        return session.session_key
+
+    def test_reading_a_session_does_not_write(self):
+        key = self.create_session(user='1')
+
+        session = SessionStore(key)
+        with CaptureQueriesContext(connection) as queries:
+            assert session['user'] == '1'
+            session.save()
+        assert len(queries) == 0
+
+    def test_expiry_is_refreshed_after_the_threshold(self, settings):
+        key = self.create_session(user='1')
+        settings.SESSION_REFRESH_THRESHOLD = 0
+
+        session = SessionStore(key)
+        session['user']
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        assert any(query['sql'].startswith('UPDATE') for query in queries.captured_queries)
+
+    def test_changes_are_written_behind_with_redis(self):
+        key = self.create_session(user='1')
+        fake = FakeRedis()
+
+        with patch('backend.sessions._redis', return_value=fake):
+            session = SessionStore(key)
+            session['user'] = '2'
+            with CaptureQueriesContext(connection) as queries:
+                session.save()
+            assert len(queries) == 0
+            assert SessionStore().decode(Session.objects.get(pk=key).session_data)['user'] == '1'
+
+            assert flush_dirty_sessions() == 1
+            assert flush_dirty_sessions() == 0
+
+        assert SessionStore().decode(Session.objects.get(pk=key).session_data)['user'] == '2'
+
+    def test_evicted_session_is_reloaded_from_the_database(self):
+        key = self.create_session(user='1')
+        self.cache.clear()
+
+        session = SessionStore(key)
+        assert session['user'] == '1'
+        session['user'] = '2'
+        session.save()
+
+        assert SessionStore(key)['user'] == '2'
+
+    def test_saving_a_session_deleted_elsewhere_raises(self):
+        key = self.create_session(user='1')
+        session = SessionStore(key)
+        session['user']
+
+        SessionStore(key).flush()
+        session['user'] = '2'
+        with pytest.raises(UpdateError):
+            session.save()
+
+    def test_flush_and_cleanup_jobs(self):
+        key = self.create_session(user='1')
+        Session.objects.filter(pk=key).update(expire_date=timezone.now() - timedelta(days=1))
+        self.create_session(user='2')
+
+        assert flush_sessions()['result'] == {'written': 0}  # no dirty set without Redis
+        assert cleanup_sessions()['result'] == {'deleted': 1}
+        assert not Session.objects.filter(pk=key).exists()
+        assert Session.objects.count() == 1
+
+    def test_admin_login(self, client, admin_user):
+        client.force_login(admin_user)
+
+        assert client.get('/admin/').status_code == 200
+        assert client.get('/admin/').status_code == 200
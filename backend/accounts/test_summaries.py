@@ -0,0 +1,77 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from documents.models import Document
+from .summaries import user_summaries
+
+
+def user_queries(queries):
+    return [q['sql'] for q in queries.captured_queries if 'FROM "accounts_user"' in q['sql']]
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="other", email="other@example.com", password="testpass123", first_name="Other"
+    )
+
+
+@pytest.mark.django_db
+class TestUserSummaries:
+    """Test cases for compact, cached users in list payloads"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user, other_user):
+        self.client = api_client
+        self.user = user
+        self.other_user = other_user
+        for i in range(5):
+            Document.objects.create(title=f"Mine {i}", created_by=user, status='published')
+            Document.objects.create(title=f"Theirs {i}", created_by=other_user, status='published')
+        api_client.force_authenticate(user=user)
+
+    def list_documents(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('document-list'), params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data, queries
+
+    def test_rows_embed_a_compact_user(self):
+        data, _ = self.list_documents()
+
+        created_by = {row['created_by']['id']: row['created_by'] for row in data['results']}
+        assert set(created_by[self.other_user.pk]) == {
+            'id', 'username', 'email', 'first_name', 'last_name', 'avatar_url'
+        }
+        assert created_by[self.other_user.pk]['first_name'] == 'Other'
+
+    def test_each_user_is_loaded_once_then_cached(self):
+        _, queries = self.list_documents()
+        assert len(user_queries(queries)) <= 2  # at most one per distinct user
+
+        _, queries = self.list_documents()
+        assert user_queries(queries) == []
+
+    def test_changes_to_the_user_show_up(self):
+        self.list_documents()
+
+        self.other_user.first_name = 'Renamed'
+        self.other_user.save()
+
+        data, _ = self.list_documents()
+        names = {row['created_by']['first_name'] for row in data['results']}
+        assert names == {'Test', 'Renamed'}
+
+    def test_sideloaded_users(self):
+        data, queries = self.list_documents(sideload='users')
+
+        assert {row['created_by'] for row in data['results']} == {self.user.pk, self.other_user.pk}
+        assert set(data['users']) == {str(self.user.pk), str(self.other_user.pk)}
+        assert data['users'][str(self.other_user.pk)]['first_name'] == 'Other'
+        assert len(user_queries(queries)) == 1  # one batch for all missing users
+
+    def test_unknown_users_are_left_out(self):
+        assert user_summaries([self.user.pk, 999999]).keys() == {self.user.pk}
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from .tokens import MFA_CODE, PASSWORD_RESET, _pop
+
+
+@pytest.mark.django_db
+class TestEphemeralTokens:
+    """Test cases for the cache-backed MFA code and password reset tokens"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, user):
+        self.cache = locmem_cache
+        self.user = user
+
+    def test_only_a_digest_is_stored(self):
+        token = PASSWORD_RESET.issue(self.user.id)
+
+        stored = self.cache.get(PASSWORD_RESET.key(self.user.id))
+        assert stored != token
+        assert token not in stored
+        # The digest is bound to the user and the purpose
+        assert stored != PASSWORD_RESET.digest(self.user.id + 1, token)
+        assert stored != MFA_CODE.digest(self.user.id, token)
+
+    def test_consume_is_single_use(self):
+        code = MFA_CODE.issue(self.user.id)
+
+        assert MFA_CODE.consume(self.user.id, code) is True
+        assert MFA_CODE.consume(self.user.id, code) is False
+        assert self.cache.get(MFA_CODE.key(self.user.id)) is None
+
+    def test_wrong_guess_keeps_the_outstanding_token(self):
+        code = MFA_CODE.issue(self.user.id)
+
+        assert MFA_CODE.consume(self.user.id, '000000' if code != '000000' else '111111') is False
+        assert MFA_CODE.consume(self.user.id, '') is False
+        assert MFA_CODE.consume(self.user.id, code) is True
+
+    def test_issue_replaces_the_outstanding_token(self):
+        first = PASSWORD_RESET.issue(self.user.id)
+        second = PASSWORD_RESET.issue(self.user.id)
+
+        assert PASSWORD_RESET.check(self.user.id, first) is (first == second)
+        assert PASSWORD_RESET.check(self.user.id, second) is True
+
+    def test_pop_uses_getdel_on_redis(self):
+        redis_client = MagicMock()
+        redis_client.getdel.return_value = b'raw'
+        client = MagicMock()
+        client.get_client.return_value = redis_client
+        client.make_key.return_value = ':1:some-key'
+        client.decode.return_value = 'digest'
+
+        with patch('accounts.tokens.cache', MagicMock(client=client)):
+            assert _pop('some-key') == 'digest'
+
+        client.get_client.assert_called_once_with(write=True)
+        redis_client.getdel.assert_called_once_with(':1:some-key')
+        client.decode.assert_called_once_with(b'raw')
+
+    def test_password_reset_confirm(self, api_client):
+        token = self.user.generate_password_reset_token()
+        data = {
+            'email': self.user.email,
+            'token': token,
+            'new_password': 'N3w-secure-pass!',
+            'confirm_password': 'N3w-secure-pass!',
+        }
+
+        response = api_client.post(reverse('password-reset-confirm'), data)
+        assert response.status_code == status.HTTP_200_OK
+        self.user.refresh_from_db()
+        assert self.user.check_password('N3w-secure-pass!')
+
+        response = api_client.post(reverse('password-reset-confirm'), data)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,67 @@
+"""
+Short-lived single-use tokens: MFA login codes and password reset tokens.
+
+Tokens live in the default cache (Redis) under a TTL instead of on the
+``User`` row, so issuing, checking and expiring them never writes to
+Postgres. Only an HMAC of a token is stored, and using one up is a single
+GETDEL, so two concurrent requests cannot both redeem the same token.
+"""
+import secrets
+
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+def _pop(key):
+    """Read and delete ``key`` atomically: GETDEL on django_redis, get then delete elsewhere"""
+    client = getattr(cache, 'client', None)
+    if hasattr(client, 'get_client'):
+        raw = client.get_client(write=True).getdel(client.make_key(key))
+        return None if raw is None else client.decode(raw)
+    value = cache.get(key)
+    cache.delete(key)
+    return value
+
+
+class EphemeralToken:
+    """One kind of token: at most one outstanding per user, expiring after ``ttl`` seconds"""
+
+    def __init__(self, purpose, ttl, generate):
+        self.purpose = purpose
+        self.ttl = ttl
+        self.generate = generate
+
+    def key(self, user_id):
+        return f'accounts:token:{self.purpose}:{user_id}'
+
+    def digest(self, user_id, token):
+        return salted_hmac(f'accounts.tokens.{self.purpose}', f'{user_id}:{token}', algorithm='sha256').hexdigest()
+
+    def issue(self, user_id):
+        """A fresh token for ``user_id``, replacing any outstanding one"""
+        token = self.generate()
+        cache.set(self.key(user_id), self.digest(user_id, token), self.ttl)
+        return token
+
+    def check(self, user_id, token):
+        """Whether ``token`` is the user's outstanding token, without using it up"""
+        stored = cache.get(self.key(user_id))
+        return bool(stored and token) and constant_time_compare(stored, self.digest(user_id, token))
+
+    def consume(self, user_id, token):
+        """
+        Use up ``token`` if it is the user's outstanding one.
+
+        A wrong guess leaves the outstanding token in place; of several
+        requests redeeming the right one, only the first gets True.
+        """
+        if not self.check(user_id, token):
+            return False
+        return constant_time_compare(_pop(self.key(user_id)) or '', self.digest(user_id, token))
+
+    def discard(self, user_id):
+        cache.delete(self.key(user_id))
+
+
+MFA_CODE = EphemeralToken('mfa-code', 5 * 60, lambda: str(100000 + secrets.randbelow(900000)))
+PASSWORD_RESET = EphemeralToken('password-reset', 10 * 60, lambda: secrets.token_urlsafe(32))
@@ -1,21 +1,25 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from datetime import timedelta
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, MFASetupSerializer,
     MFAVerifySerializer, UserProfileSerializer, PasswordChangeSerializer,
     UserDetailSerializer, PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
     MFABackupCodesRequestSerializer
 )
-from .utils import send_password_reset_email, send_mfa_backup_codes_email
+from .authentication import blacklist_token
+from .tokens import MFA_CODE
+from .avatars import delete_renditions
+from .tasks import deliver_mfa_backup_codes_email, deliver_password_reset_email
 from audit.models import AuditLog
+from backend.throttling import throttle
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +27,7 @@ User = get_user_model()
 
 
 # from rest_framework import generics, permissions
-from .models import User
+from .models import BACKUP_CODES_COUNT, User
 from .serializers import UserDetailSerializer
 
 class UserListView(generics.ListAPIView):
@@ -68,6 +72,7 @@ class UserRegistrationView(generics.CreateAPIView):
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Custom login view with audit logging"""
+    throttle_classes = [throttle('auth')]
     
     def post(self, request, *args, **kwargs):
         serializer = UserLoginSerializer(data=request.data)
@@ -89,8 +94,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             })
         
         # Set MFA as verified for non-MFA users
-        user.mfa_verified = True
-        user.save()
+        user.set_mfa_verified()
         
         # Log successful login
         AuditLog.log_activity(
@@ -117,49 +121,37 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([throttle('auth')])
 def mfa_verify(request):
     """Verify MFA token and complete login"""
-    print(f"MFA verification request data: {request.data}")
-    
     serializer = MFAVerifySerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     
     user_id = request.data.get('user_id')
     token = serializer.validated_data['token']
     
-    print(f"MFA verification - user_id: {user_id}, token: {token}")
-    
     try:
         user = User.objects.get(id=user_id)
-        print(f"Found user: {user.email}, is_mfa_enabled: {user.is_mfa_enabled}")
-        print(f"User stored MFA code: {user.mfa_code}, expires: {user.mfa_code_expires}")
     except User.DoesNotExist:
-        print(f"User not found with id: {user_id}")
         return Response(
             {'error': 'Invalid user'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
     if not user.is_mfa_enabled:
-        print("MFA not enabled for user")
         return Response(
             {'error': 'MFA not enabled for this user'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    print(f"Calling verify_mfa_code with token: {token}")
-    is_valid = user.verify_mfa_code(token)
-    print(f"MFA verification result: {is_valid}")
-    
-    if not is_valid:
+    if not user.verify_mfa_code(token):
         return Response(
             {'error': 'Invalid or expired MFA code'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
     # Set MFA as verified
-    user.mfa_verified = True
-    user.save()
+    user.set_mfa_verified()
     
     # Log successful login
     AuditLog.log_activity(
@@ -200,7 +192,7 @@ def mfa_enable(request):
     """Enable MFA for user (no verification needed for enabling)"""
     user = request.user
     user.is_mfa_enabled = True
-    user.save()
+    user.save(update_fields=['is_mfa_enabled', 'updated_at'])
     
     # Log MFA enablement
     AuditLog.log_activity(
@@ -225,9 +217,8 @@ def mfa_disable(request):
     """Disable MFA for user"""
     user = request.user
     user.is_mfa_enabled = False
-    user.mfa_code = None  # Clear any existing codes
-    user.mfa_code_expires = None
-    user.save()
+    user.save(update_fields=['is_mfa_enabled', 'updated_at'])
+    MFA_CODE.discard(user.pk)  # Clear any outstanding code
     
     # Log MFA disablement
     AuditLog.log_activity(
@@ -274,7 +265,7 @@ def mfa_generate_code(request):
     
     return Response({
         'code': code,
-        'expires_at': user.mfa_code_expires.isoformat(),
+        'expires_at': (timezone.now() + timedelta(seconds=MFA_CODE.ttl)).isoformat(),
         'message': 'New MFA code generated successfully'
     })
 
@@ -433,6 +424,8 @@ class AvatarDeleteView(generics.GenericAPIView):
         user = request.user
         
         if user.avatar:
+            delete_renditions(user.avatar_renditions)
+            user.avatar_renditions = {}
             user.avatar.delete()
             user.save()
               # Log avatar deletion
@@ -465,6 +458,9 @@ def logout(request):
             token.blacklist()
     except Exception:
         pass
+    if request.auth is not None:
+        # The access token is revoked too, not just left to expire
+        blacklist_token(request.auth)
     
     # Log logout
     AuditLog.log_activity(
@@ -481,6 +477,7 @@ def logout(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([throttle('email')])
 def password_reset_request(request):
     """Request password reset email"""
     serializer = PasswordResetRequestSerializer(data=request.data)
@@ -496,35 +493,27 @@ def password_reset_request(request):
             'message': 'If an account with this email exists, a password reset link has been sent.'
         })
     
-    # Generate password reset token
-    reset_token = user.generate_password_reset_token()
-    
-    # Send password reset email
-    email_sent = send_password_reset_email(user, reset_token)
-    
-    if email_sent:
-        # Log password reset request (temporarily disabled for debugging)
-        # AuditLog.log_activity(
-        #     user=user,
-        #     action='password_reset_request',
-        #     resource_type='user',
-        #     resource_id=user.id,
-        #     resource_name=user.email,
-        #     request=request
-        # )
-        
-        return Response({
-            'message': 'Password reset email sent successfully. Check your email for further instructions.'
-        })
-    else:
-        return Response(
-            {'error': 'Failed to send password reset email. Please try again later.'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    # Issue the token and send the email from a worker so a slow SMTP server cannot block the request
+    transaction.on_commit(lambda: deliver_password_reset_email.delay(user.id))
+    
+    # Log password reset request (temporarily disabled for debugging)
+    # AuditLog.log_activity(
+    #     user=user,
+    #     action='password_reset_request',
+    #     resource_type='user',
+    #     resource_id=user.id,
+    #     resource_name=user.email,
+    #     request=request
+    # )
+    
+    return Response({
+        'message': 'Password reset email sent successfully. Check your email for further instructions.'
+    })
 
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([throttle('auth')])
 def password_reset_confirm(request):
     """Confirm password reset with token"""
     serializer = PasswordResetConfirmSerializer(data=request.data)
@@ -551,8 +540,7 @@ def password_reset_confirm(request):
     # Reset password with token verification
     if user.reset_password(new_password, token):
         # Clear MFA verification state on password reset
-        user.mfa_verified = False
-        user.save()
+        user.set_mfa_verified(False)
         
         # Log password reset
         AuditLog.log_activity(
@@ -576,6 +564,7 @@ def password_reset_confirm(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([throttle('email')])
 def mfa_request_backup_codes(request):
     """Request new MFA backup codes via email"""
     serializer = MFABackupCodesRequestSerializer(data=request.data)
@@ -597,32 +586,23 @@ def mfa_request_backup_codes(request):
             'error': 'MFA is not enabled for this account.'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Generate new backup codes
-    backup_codes = user.generate_backup_codes()
-    
-    # Send backup codes email
-    email_sent = send_mfa_backup_codes_email(user, backup_codes)
-    
-    if email_sent:
-        # Log backup codes request (temporarily disabled for debugging)
-        # AuditLog.log_activity(
-        #     user=user,
-        #     action='mfa_backup_codes_request',
-        #     resource_type='user',
-        #     resource_id=user.id,
-        #     resource_name=user.email,
-        #     details={'codes_count': len(backup_codes)},
-        #     request=request
-        # )
-        
-        return Response({
-            'message': f'New backup codes generated and sent to your email. You now have {len(backup_codes)} backup codes.'
-        })
-    else:
-        return Response(
-            {'error': 'Failed to send backup codes email. Please try again later.'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    # Generate and send the new backup codes from a worker
+    transaction.on_commit(lambda: deliver_mfa_backup_codes_email.delay(user.id))
+    
+    # Log backup codes request (temporarily disabled for debugging)
+    # AuditLog.log_activity(
+    #     user=user,
+    #     action='mfa_backup_codes_request',
+    #     resource_type='user',
+    #     resource_id=user.id,
+    #     resource_name=user.email,
+    #     details={'codes_count': BACKUP_CODES_COUNT},
+    #     request=request
+    # )
+    
+    return Response({
+        'message': f'New backup codes generated and sent to your email. You now have {BACKUP_CODES_COUNT} backup codes.'
+    })
 
 
 
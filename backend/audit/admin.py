@@ -4,7 +4,7 @@ from django.db.models import Count, Q
 from django.urls import path
 from django.utils import timezone
 from datetime import timedelta
-from .models import AuditLog
+from .models import AuditLog, AuditDailyRollup
 
 
 @admin.register(AuditLog)
@@ -202,3 +202,18 @@ class AuditLogAdmin(admin.ModelAdmin):
         }
         
         return TemplateResponse(request, 'admin/audit/analytics.html', context)
+
+
+@admin.register(AuditDailyRollup)
+class AuditDailyRollupAdmin(admin.ModelAdmin):
+    """Read-only view of the daily audit rollups"""
+    list_display = ('day', 'action', 'resource_type', 'count', 'updated_at')
+    list_filter = ('action', 'resource_type', ('day', admin.DateFieldListFilter))
+    date_hierarchy = 'day'
+    list_per_page = 100
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
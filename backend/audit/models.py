@@ -4,6 +4,8 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 import uuid
 
+from backend import metrics
+
 User = get_user_model()
 
 
@@ -57,6 +59,19 @@ class AuditLog(models.Model):
     def log_activity(cls, user, action, resource_type, resource_id, resource_name='', 
                     details=None, request=None, content_object=None):
         """Utility method to create audit log entries"""
+        entry = cls.build_entry(
+            user, action, resource_type, resource_id, resource_name,
+            details=details, request=request, content_object=content_object
+        )
+        with metrics.AUDIT_WRITE_SECONDS.time():
+            entry.save(force_insert=True)
+        metrics.AUDIT_ENTRIES.inc()
+        return entry
+    
+    @classmethod
+    def build_entry(cls, user, action, resource_type, resource_id, resource_name='',
+                    details=None, request=None, content_object=None):
+        """Unsaved audit entry, for writing many at once with log_many()"""
         audit_data = {
             'user': user,
             'action': action,
@@ -73,7 +88,15 @@ class AuditLog(models.Model):
             audit_data['ip_address'] = cls.get_client_ip(request)
             audit_data['user_agent'] = request.META.get('HTTP_USER_AGENT', '')
         
-        return cls.objects.create(**audit_data)
+        return cls(**audit_data)
+    
+    @classmethod
+    def log_many(cls, entries, batch_size=500):
+        """Insert entries built with build_entry() in batches"""
+        with metrics.AUDIT_WRITE_SECONDS.time():
+            created = cls.objects.bulk_create(entries, batch_size=batch_size)
+        metrics.AUDIT_ENTRIES.inc(len(created))
+        return created
     
     @staticmethod
     def get_client_ip(request):
@@ -84,3 +107,19 @@ class AuditLog(models.Model):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+
+
+class AuditDailyRollup(models.Model):
+    """Per-day activity counts, rebuilt by the audit_rollup maintenance job"""
+    day = models.DateField()
+    action = models.CharField(max_length=20)
+    resource_type = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-day', 'action', 'resource_type']
+        unique_together = ['day', 'action', 'resource_type']
+    
+    def __str__(self):
+        return f"{self.day}: {self.action} {self.resource_type} x{self.count}"
@@ -1,11 +1,11 @@
 from rest_framework import serializers
 from .models import AuditLog
-from accounts.serializers import UserProfileSerializer
+from accounts.summaries import UserSummaryField
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
     """Serializer for AuditLog model"""
-    user = UserProfileSerializer(read_only=True)
+    user = UserSummaryField()
     timestamp_formatted = serializers.SerializerMethodField()
     
     class Meta:
@@ -0,0 +1,40 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from backend.maintenance import maintenance_job
+from .models import AuditLog, AuditDailyRollup
+
+
+@maintenance_job('audit_rollup')
+def rollup_audit_logs(days=2):
+    """Rebuild daily audit counts for the last few days"""
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+
+    counts = (
+        AuditLog.objects.filter(timestamp__gte=start)
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', 'action', 'resource_type')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    rollups = [
+        AuditDailyRollup(
+            day=row['day'],
+            action=row['action'],
+            resource_type=row['resource_type'],
+            count=row['count'],
+        )
+        for row in counts
+    ]
+
+    with transaction.atomic():
+        AuditDailyRollup.objects.filter(day__gte=first_day).delete()
+        AuditDailyRollup.objects.bulk_create(rollups)
+
+    return {'days': days, 'rows': len(rollups)}
@@ -0,0 +1,122 @@
+"""
+Per-user server-sent events.
+
+Anything that happens in the background (version uploads, bulk job
+progress, documents shared with someone) is published as a small JSON
+message on the user's Redis pub/sub channel with ``publish()``. Clients keep
+one ``GET /api/events/`` connection open instead of polling task results;
+the async view below subscribes to the channel and relays every message as
+an SSE frame.
+
+Events are fire-and-forget: nothing is replayed after a reconnect, so
+clients that missed something catch up through the change feed.
+"""
+import json
+import logging
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponseNotAllowed, StreamingHttpResponse
+
+from accounts.authentication import async_login_required
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'events:user:{user_id}'
+RETRY_MS = 3000
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.EVENTS_REDIS_URL, socket_connect_timeout=2, socket_timeout=2)
+    return _client
+
+
+def enabled():
+    return bool(settings.EVENTS_REDIS_URL)
+
+
+def publish(user_ids, event, data=None):
+    """Send ``event`` to every open stream of ``user_ids`` once the transaction commits"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids or not enabled():
+        return
+    payload = json.dumps({'event': event, 'data': data or {}}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: _send(user_ids, payload))
+
+
+def _send(user_ids, payload):
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.publish(CHANNEL.format(user_id=user_id), payload)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f'[EVENTS] Could not publish to users {sorted(user_ids)}: {e}')
+
+
+def format_event(message):
+    """SSE frame for a published payload"""
+    if isinstance(message, bytes):
+        message = message.decode('utf-8')
+    try:
+        event = json.loads(message)
+    except ValueError:
+        return None
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def stream(user_id):
+    """
+    Relay the user's channel as SSE frames.
+
+    Sends a comment line every ``EVENTS_KEEPALIVE_SECONDS`` so proxies keep the
+    connection open. Django 4.2 does not notice a client going away while a
+    response streams, so the stream ends after ``EVENTS_STREAM_MAX_SECONDS``
+    and the browser's EventSource reconnects on its own.
+    """
+    client = aioredis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    pubsub = client.pubsub()
+    channel = CHANNEL.format(user_id=user_id)
+    deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_SECONDS
+    try:
+        await pubsub.subscribe(channel)
+        yield f'retry: {RETRY_MS}\nevent: ready\ndata: {{}}\n\n'
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=settings.EVENTS_KEEPALIVE_SECONDS
+            )
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            frame = format_event(message['data'])
+            if frame:
+                yield frame
+    except redis.RedisError as e:
+        logger.warning(f'[EVENTS] Stream for user {user_id} closed: {e}')
+    finally:
+        try:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+        except redis.RedisError:
+            pass
+
+
+@async_login_required(allow_query_token=True)
+async def event_stream(request):
+    """Long-lived SSE stream of the authenticated user's events"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    response = StreamingHttpResponse(stream(request.user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
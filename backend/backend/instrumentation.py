@@ -0,0 +1,274 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` records, for every request:
+
+* wall time;
+* database queries and their total time, through an execute wrapper on
+  every connection, keeping the slowest ones with the line of project code
+  that ran them;
+* cache hits, misses and time, for caches built on ``CacheStatsMixin``
+  (``InstrumentedRedisCache`` in settings);
+* S3 calls and their latency, through botocore's ``before-parameter-build``
+  and ``after-call`` events on the default boto3 session and on the media
+  storage's session;
+* the size of the response body.
+
+The totals go out as a ``Server-Timing`` header (``PERF_SERVER_TIMING``) and
+as one ``[PERF]`` key=value log line per request: at INFO when
+``PERF_LOG_ALL_REQUESTS`` is on, and at WARNING whenever a request is over
+``PERF_SLOW_REQUEST_MS`` or ``PERF_QUERY_COUNT_WARNING`` queries.
+
+The stats of the request being handled live in a context variable, so the
+hooks also count work that async views hand to ``sync_to_async`` threads.
+Outside a request (Celery tasks, management commands) the hooks only feed
+the Prometheus metrics in ``backend.metrics``.
+"""
+import contextvars
+import logging
+import os
+import time
+import traceback
+
+import boto3
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django_redis.cache import RedisCache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+_MISSING = object()
+
+
+class RequestStats:
+    """Counters for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.slow_queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.s3_calls = 0
+        self.s3_time = 0.0
+        self.response_bytes = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_query(self, sql, duration):
+        self.db_queries += 1
+        self.db_time += duration
+        if duration * 1000 < settings.PERF_SLOW_QUERY_MS:
+            return
+        self.slow_queries.append({'ms': round(duration * 1000, 1), 'sql': sql[:500], 'origin': _origin()})
+        self.slow_queries.sort(key=lambda query: query['ms'], reverse=True)
+        del self.slow_queries[settings.PERF_SLOW_QUERY_LIMIT:]
+
+
+def current_stats():
+    """Stats of the request being handled, or None"""
+    return _current.get()
+
+
+def _origin():
+    """'file:line in function' of the innermost project frame that is not this module"""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if (frame.filename.startswith(base) and 'site-packages' not in frame.filename
+                and frame.filename != __file__):
+            return f'{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+# Database
+
+def _query_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.DB_QUERY_SECONDS.observe(duration)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_query(sql, duration)
+
+
+def _install_query_wrapper(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+connection_created.connect(_install_query_wrapper, dispatch_uid='backend.instrumentation')
+
+
+# Cache
+
+_in_get_many = contextvars.ContextVar('in_cache_get_many', default=False)
+
+
+def _count_cache(hits, misses, duration):
+    if hits:
+        metrics.CACHE_REQUESTS.labels('hit').inc(hits)
+    if misses:
+        metrics.CACHE_REQUESTS.labels('miss').inc(misses)
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+        stats.cache_time += duration
+
+
+class CacheStatsMixin:
+    """Count hits, misses and time of ``get``/``get_many``"""
+
+    def get(self, key, default=None, version=None, **kwargs):
+        if _in_get_many.get():
+            return super().get(key, default, version=version, **kwargs)
+        start = time.perf_counter()
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        hit = value is not _MISSING
+        _count_cache(int(hit), int(not hit), time.perf_counter() - start)
+        return value if hit else default
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        start = time.perf_counter()
+        # Backends without a native get_many call get() per key; count those once here
+        token = _in_get_many.set(True)
+        try:
+            values = super().get_many(keys, version=version, **kwargs)
+        finally:
+            _in_get_many.reset(token)
+        _count_cache(len(values), len(keys) - len(values), time.perf_counter() - start)
+        return values
+
+
+class InstrumentedRedisCache(CacheStatsMixin, RedisCache):
+    pass
+
+
+# S3
+
+def _before_s3_call(context, **kwargs):
+    context['perf_started'] = time.perf_counter()
+
+
+def _after_s3_call(context, event_name, **kwargs):
+    started = context.pop('perf_started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    # after-call.s3.<Operation> / after-call-error.s3.<Operation>
+    metrics.S3_REQUEST_SECONDS.labels(event_name.rsplit('.', 1)[-1]).observe(duration)
+    stats = _current.get()
+    if stats is not None:
+        stats.s3_calls += 1
+        stats.s3_time += duration
+
+
+def instrument_boto3_session(session):
+    """Time the S3 calls of clients created from ``session`` from now on"""
+    events = session.events
+    # before-call can be cut short by a handler that answers the call itself
+    events.register('before-parameter-build.s3', _before_s3_call, unique_id='perf-before-s3')
+    events.register('after-call.s3', _after_s3_call, unique_id='perf-after-s3')
+    events.register('after-call-error.s3', _after_s3_call, unique_id='perf-after-s3-error')
+    return session
+
+
+# Middleware
+
+def server_timing(stats):
+    metrics = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries"',
+        f'cache;dur={stats.cache_time * 1000:.1f};desc="{stats.cache_hits} hits, {stats.cache_misses} misses"',
+    ]
+    if stats.s3_calls:
+        metrics.append(f's3;dur={stats.s3_time * 1000:.1f};desc="{stats.s3_calls} calls"')
+    metrics.append(f'total;dur={stats.elapsed * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+class PerformanceMiddleware:
+    """Measure each request and report it in Server-Timing and the ``[PERF]`` log"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        instrument_boto3_session(boto3.DEFAULT_SESSION)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.PERF_INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        stats, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        if not settings.PERF_INSTRUMENTATION_ENABLED:
+            return await self.get_response(request)
+        stats, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def start(self):
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            _install_query_wrapper(connection)
+        stats = RequestStats()
+        return stats, _current.set(stats)
+
+    def finish(self, request, response, stats):
+        if not response.streaming:
+            stats.response_bytes = len(response.content)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(stats)
+        metrics.observe_request(request, response, stats.elapsed)
+        self.log(request, response, stats)
+        return response
+
+    def log(self, request, response, stats):
+        elapsed_ms = stats.elapsed * 1000
+        slow = (elapsed_ms >= settings.PERF_SLOW_REQUEST_MS
+                or stats.db_queries >= settings.PERF_QUERY_COUNT_WARNING)
+        if not slow and not settings.PERF_LOG_ALL_REQUESTS:
+            return
+        match = getattr(request, 'resolver_match', None)
+        line = (
+            f'[PERF] method={request.method} path={request.path} '
+            f'view={match.view_name if match else "-"} status={response.status_code} '
+            f'ms={elapsed_ms:.1f} db_queries={stats.db_queries} db_ms={stats.db_time * 1000:.1f} '
+            f'cache_hits={stats.cache_hits} cache_misses={stats.cache_misses} '
+            f's3_calls={stats.s3_calls} s3_ms={stats.s3_time * 1000:.1f} '
+            f'bytes={stats.response_bytes if stats.response_bytes is not None else "-"}'
+        )
+        if slow:
+            for query in stats.slow_queries:
+                line += f'\n  slow query {query["ms"]}ms at {query["origin"]}: {query["sql"]}'
+            logger.warning(line)
+        else:
+            logger.info(line)
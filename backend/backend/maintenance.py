@@ -0,0 +1,166 @@
+"""
+Registry for periodic maintenance jobs.
+
+Jobs are plain functions decorated with ``@maintenance_job``. Each one becomes a
+Celery task named ``maintenance.<name>`` that celery beat can schedule (see
+``CELERY_BEAT_SCHEDULE`` in settings). Every run takes a cache lock so only one
+worker executes a given job at a time, and runtime / last-success metrics are
+kept in the cache for the status endpoint.
+"""
+import logging
+import time
+import uuid
+
+from celery import shared_task
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# name -> {'name', 'description', 'task', 'lock_timeout'}
+JOBS = {}
+
+LOCK_KEY = 'maintenance:lock:{name}'
+METRICS_KEY = 'maintenance:metrics:{name}'
+
+# KEYS: lock key; ARGV: the owner's token as stored. Deletes the lock only if
+# it still holds that token, so a run that outlived its timeout cannot drop
+# the lock another worker has taken since.
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_script = None
+
+
+def maintenance_job(name, lock_timeout=30 * 60, description=''):
+    """Register ``func`` as a locked, metered maintenance task"""
+    def decorator(func):
+        def run(*args, **kwargs):
+            return run_job(name, func, lock_timeout, *args, **kwargs)
+
+        run.__name__ = func.__name__
+        run.__doc__ = func.__doc__
+        task = shared_task(name=f'maintenance.{name}')(run)
+
+        JOBS[name] = {
+            'name': name,
+            'description': description or (func.__doc__ or '').strip().split('\n')[0],
+            'task': task,
+            'lock_timeout': lock_timeout,
+        }
+        return task
+    return decorator
+
+
+def acquire_lock(name, timeout):
+    """Try to take the job lock; returns the lock token or None"""
+    token = uuid.uuid4().hex
+    if cache.add(LOCK_KEY.format(name=name), token, timeout):
+        return token
+    return None
+
+
+def _redis():
+    client = getattr(cache, 'client', None)
+    return client if hasattr(client, 'get_client') else None
+
+
+def release_lock(name, token):
+    """Release the job lock if we still own it"""
+    global _release_script
+    key = LOCK_KEY.format(name=name)
+    client = _redis()
+    if client is None:
+        # Other cache backends (tests) have no atomic compare-and-delete
+        if cache.get(key) == token:
+            cache.delete(key)
+        return
+    try:
+        redis = client.get_client(write=True)
+        if _release_script is None:
+            _release_script = redis.register_script(RELEASE_LOCK)
+        _release_script(keys=[cache.make_key(key)], args=[client.encode(token)], client=redis)
+    except RedisError as e:
+        logger.warning(f'[MAINTENANCE] Could not release the {name} lock, it expires on its own: {e}')
+
+
+def get_metrics(name):
+    return cache.get(METRICS_KEY.format(name=name)) or {
+        'runs': 0,
+        'failures': 0,
+        'skipped': 0,
+        'last_started_at': None,
+        'last_finished_at': None,
+        'last_success_at': None,
+        'last_duration': None,
+        'last_status': None,
+        'last_error': None,
+        'last_result': None,
+    }
+
+
+def _save_metrics(name, metrics):
+    cache.set(METRICS_KEY.format(name=name), metrics, None)
+
+
+def run_job(name, func, lock_timeout, *args, **kwargs):
+    """Run a job under its lock, recording runtime metrics"""
+    token = acquire_lock(name, lock_timeout)
+    if token is None:
+        logger.info(f'[MAINTENANCE] {name} is already running elsewhere, skipping')
+        metrics = get_metrics(name)
+        metrics['skipped'] += 1
+        _save_metrics(name, metrics)
+        return {'job': name, 'status': 'skipped'}
+
+    metrics = get_metrics(name)
+    metrics['last_started_at'] = timezone.now().isoformat()
+    started = time.monotonic()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        metrics['runs'] += 1
+        metrics['failures'] += 1
+        metrics['last_status'] = 'failed'
+        metrics['last_error'] = str(e)
+        logger.exception(f'[MAINTENANCE] {name} failed')
+        raise
+    else:
+        metrics['runs'] += 1
+        metrics['last_status'] = 'success'
+        metrics['last_error'] = None
+        metrics['last_success_at'] = timezone.now().isoformat()
+        metrics['last_result'] = result
+        logger.info(f'[MAINTENANCE] {name} finished: {result}')
+        return {'job': name, 'status': 'success', 'result': result}
+    finally:
+        metrics['last_duration'] = round(time.monotonic() - started, 3)
+        metrics['last_finished_at'] = timezone.now().isoformat()
+        _save_metrics(name, metrics)
+        release_lock(name, token)
+
+
+def load_jobs():
+    """Import every app's tasks module so all jobs are registered"""
+    autodiscover_modules('tasks')
+    return JOBS
+
+
+def job_status():
+    """Status and metrics for every registered job"""
+    status = []
+    for name, job in sorted(load_jobs().items()):
+        status.append({
+            'name': name,
+            'description': job['description'],
+            'task': job['task'].name,
+            'running': cache.get(LOCK_KEY.format(name=name)) is not None,
+            'metrics': get_metrics(name),
+        })
+    return status
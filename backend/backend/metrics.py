@@ -0,0 +1,141 @@
+"""
+Prometheus metrics.
+
+``GET /metrics`` serves everything below in the Prometheus text format:
+
+* ``http_request_duration_seconds{method,route,status}``, from
+  ``PerformanceMiddleware``; ``route`` is the URL pattern, not the path;
+* ``db_query_duration_seconds`` and ``s3_request_duration_seconds{operation}``,
+  from the hooks in ``backend.instrumentation``;
+* ``cache_requests_total{result="hit"|"miss"}``, the counters behind the
+  cache hit ratio (``rate(hits) / rate(all)`` in PromQL);
+* ``celery_queue_length{queue}``, read from the Redis broker on each scrape,
+  and ``celery_task_duration_seconds{task,state}`` from the worker signals;
+* ``audit_log_write_duration_seconds`` and ``audit_log_entries_total``;
+  audit rows are written inline, so the write time is the audit cost a
+  request pays;
+* ``document_upload_bytes_total`` and ``document_download_bytes_total``.
+
+Under gunicorn or Celery's prefork pool every process has its own values.
+Set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared by all the
+processes (cleared before they start): prometheus_client then keeps the
+values in files there and the scrape adds them up across processes.
+
+Set ``METRICS_TOKEN`` to require ``Authorization: Bearer <token>``.
+"""
+import logging
+import os
+import time
+
+import redis
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response', ['method', 'route', 'status'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'Database query time',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+S3_REQUEST_SECONDS = Histogram(
+    's3_request_duration_seconds', 'S3 API call time', ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups by result', ['result'])
+CELERY_TASK_SECONDS = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time', ['task', 'state'],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+)
+AUDIT_WRITE_SECONDS = Histogram(
+    'audit_log_write_duration_seconds', 'Time spent inserting audit log rows',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+AUDIT_ENTRIES = Counter('audit_log_entries', 'Audit log rows written')
+UPLOAD_BYTES = Counter('document_upload_bytes', 'Bytes of document files stored')
+DOWNLOAD_BYTES = Counter('document_download_bytes', 'Bytes of document files streamed to clients')
+
+
+def _queue_gauge():
+    return GaugeMetricFamily('celery_queue_length', 'Messages waiting in a Celery queue', labels=['queue'])
+
+
+class CeleryQueueCollector:
+    """Length of each Celery queue in ``METRICS_CELERY_QUEUES``, read at scrape time"""
+
+    def describe(self):
+        # Registration would otherwise call collect() and reach the broker
+        return [_queue_gauge()]
+
+    def collect(self):
+        broker_url = settings.CELERY_BROKER_URL
+        if not broker_url.startswith(('redis://', 'rediss://')):
+            return
+        gauge = _queue_gauge()
+        try:
+            client = redis.Redis.from_url(broker_url, socket_connect_timeout=2, socket_timeout=2)
+            pipe = client.pipeline(transaction=False)
+            for queue in settings.METRICS_CELERY_QUEUES:
+                pipe.llen(queue)
+            lengths = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f'[METRICS] Could not read Celery queue lengths: {e}')
+            return
+        for queue, length in zip(settings.METRICS_CELERY_QUEUES, lengths):
+            gauge.add_metric([queue], length)
+        yield gauge
+
+
+QUEUE_COLLECTOR = CeleryQueueCollector()
+REGISTRY.register(QUEUE_COLLECTOR)
+
+
+def registry():
+    """The registry to expose: every process's values in multi-process mode"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    collected.register(QUEUE_COLLECTOR)
+    return collected
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def observe_request(request, response, seconds):
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match else '<unmatched>'
+    REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(seconds)
+
+
+# Celery task durations; this module is imported in workers through
+# audit.models and the cache backend, which connects these receivers
+
+_task_started = {}
+
+
+@task_prerun.connect(weak=False)
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect(weak=False)
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        CELERY_TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
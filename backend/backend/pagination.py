@@ -0,0 +1,49 @@
+"""
+Paginators for admin changelists over large tables.
+
+``COUNT(*)`` on a multi-million-row Postgres table is a full scan, and the
+admin runs one for every changelist page. ``EstimatedCountPaginator`` asks
+the planner instead once the table is big enough that an exact number no
+longer matters to whoever is paging through it.
+"""
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many rows (per pg_class statistics) an exact count is cheap enough
+ESTIMATE_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose ``count`` is the planner's row estimate on large Postgres tables"""
+
+    def _table_rows(self, cursor):
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+            [self.object_list.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _planned_rows(self, cursor):
+        sql, params = self.object_list.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        with connection.cursor() as cursor:
+            if self._table_rows(cursor) < ESTIMATE_THRESHOLD:
+                return super().count
+            return self._planned_rows(cursor)
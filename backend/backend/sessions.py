@@ -0,0 +1,173 @@
+"""
+Redis-first session store with a write-behind copy in Postgres.
+
+Use it with ``SESSION_ENGINE = 'backend.sessions'``. Sessions are read from
+and written to the session cache. Postgres only sees:
+
+* an INSERT when a session is created,
+* a batched upsert of the sessions that changed, written by the
+  ``session_flush`` job,
+* deletes on logout and from the ``session_cleanup`` job.
+
+Creating the row up front means a session that Redis has evicted can still
+be told apart from one deleted by a logout. An evicted session is loaded
+back from the database, and saving it just writes the cache again instead
+of raising ``SessionInterrupted``.
+
+With ``SESSION_SAVE_EVERY_REQUEST`` the session is saved after every
+request. A session that was only read is not written until its expiry
+would move by at least ``SESSION_REFRESH_THRESHOLD`` seconds.
+
+Without django_redis (e.g. tests on the local-memory cache) there is no
+dirty set, so changes are written through to the database immediately.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.core.cache import caches
+from django.utils import timezone
+
+KEY_PREFIX = 'backend.sessions.'
+DIRTY_KEY = 'sessions:dirty'
+
+
+def _session_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def _redis(cache):
+    """Raw client behind a django_redis cache, or None for other backends"""
+    client = getattr(cache, 'client', None)
+    return client.get_client(write=True) if hasattr(client, 'get_client') else None
+
+
+class SessionStore(DBSessionStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = _session_cache()
+        self._expires = None  # epoch seconds of the stored expiry
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Same as cached_db: a cache outage falls back to the database
+            entry = None
+        if entry is not None:
+            self._expires = entry['expires']
+            return entry['data']
+
+        session = self._get_session_from_db()
+        if session is None:
+            return {}
+        data = self.decode(session.session_data)
+        self._expires = session.expire_date.timestamp()
+        self._write_cache(data)
+        return data
+
+    def exists(self, session_key):
+        return self.cache_key_prefix + session_key in self._cache or super().exists(session_key)
+
+    def _needs_refresh(self):
+        if self._expires is None:
+            return True
+        new_expiry = time.time() + self.get_expiry_age()
+        return new_expiry - self._expires >= settings.SESSION_REFRESH_THRESHOLD
+
+    def _write_cache(self, data):
+        entry = {'data': data, 'expires': self._expires}
+        self._cache.set(self.cache_key, entry, max(int(self._expires - time.time()), 1))
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if not must_create and not self.modified and not self._needs_refresh():
+            return
+
+        if must_create:
+            # Raises CreateError on a key collision, before anything is cached
+            super().save(must_create=True)
+        elif self.cache_key not in self._cache and not super().exists(self.session_key):
+            # Deleted (logged out) by a concurrent request, not just evicted
+            raise UpdateError
+
+        self._expires = self.get_expiry_date().timestamp()
+        self._write_cache(data)
+        if must_create:
+            return
+        client = _redis(self._cache)
+        if client is None:
+            super().save()
+        else:
+            client.sadd(DIRTY_KEY, self.session_key)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        super().delete(session_key)
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+
+
+def flush_dirty_sessions(batch_size=500):
+    """Upsert every session changed since the last flush into ``django_session``"""
+    cache = _session_cache()
+    client = _redis(cache)
+    if client is None:
+        return 0
+
+    model = SessionStore.get_model_class()
+    store = SessionStore()
+    written = 0
+    while True:
+        keys = [key.decode() for key in client.spop(DIRTY_KEY, batch_size) or []]
+        if not keys:
+            return written
+        entries = cache.get_many([KEY_PREFIX + key for key in keys])
+        sessions = []
+        for key in keys:
+            entry = entries.get(KEY_PREFIX + key)
+            if entry is None:
+                continue  # deleted or expired since it was marked
+            sessions.append(model(
+                session_key=key,
+                session_data=store.encode(entry['data']),
+                expire_date=datetime.fromtimestamp(entry['expires'], tz=dt_timezone.utc),
+            ))
+        model.objects.bulk_create(
+            sessions,
+            update_conflicts=True,
+            unique_fields=['session_key'],
+            update_fields=['session_data', 'expire_date'],
+        )
+        written += len(sessions)
+
+
+def delete_expired_sessions(batch_size=5000):
+    """Delete expired ``django_session`` rows in batches; the cache expires its copies itself"""
+    model = SessionStore.get_model_class()
+    deleted = 0
+    while True:
+        keys = list(
+            model.objects.filter(expire_date__lt=timezone.now())
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += model.objects.filter(session_key__in=keys).delete()[0]
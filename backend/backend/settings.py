@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
       # Third party apps
     "rest_framework",
     "rest_framework_simplejwt",
@@ -56,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "backend.instrumentation.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -154,7 +157,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Add for testing
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -162,6 +165,32 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Proxies in front of the app; get_ident trusts X-Forwarded-For only this far.
+    # 0 (the app is reached directly, as in docker-compose) uses REMOTE_ADDR
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Token-bucket rate limits (backend/throttling.py). Each scope has a budget per
+# user and/or per client IP; heavy endpoints take several tokens per request
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_SCOPES = {
+    # login, MFA and password reset confirmation. 'account_ip' is the email or
+    # user_id in the request body together with the client IP, so guessing
+    # from one address is capped without letting others lock the owner out
+    'auth': {
+        'ip': config('THROTTLE_AUTH_IP_RATE', default='30/min'),
+        'account_ip': config('THROTTLE_AUTH_ACCOUNT_IP_RATE', default='20/hour'),
+    },
+    # password reset and backup code emails, per IP and per target account
+    'email': {
+        'ip': config('THROTTLE_EMAIL_IP_RATE', default='20/hour'),
+        'account': config('THROTTLE_EMAIL_ACCOUNT_RATE', default='5/hour'),
+    },
+    # version downloads 1, uploads 5, bulk actions 10, archives 20, full S3 tag sync 100
+    'heavy': {
+        'user': config('THROTTLE_HEAVY_USER_RATE', default='600/hour'),
+        'ip': config('THROTTLE_HEAVY_IP_RATE', default='1200/hour'),
+    },
 }
 
 # JWT Configuration
@@ -173,6 +202,10 @@ SIMPLE_JWT = {
     'TOKEN_BLACKLIST_CACHE': 'default',
 }
 
+# Tag usage counts: 'annotate' counts per request, 'counter' reads Tag.usage_count
+# (kept up to date by m2m signals and the tag_usage_reconcile job)
+TAG_USAGE_COUNTS = config('TAG_USAGE_COUNTS', default='annotate')
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -185,6 +218,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Let the frontend read the validators used for conditional GETs
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
+
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only allow all origins in development
 
 # AWS S3 Configuration
@@ -209,23 +245,34 @@ else:
 
 
 if USE_S3:
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    DEFAULT_FILE_STORAGE = 'backend.storage.MediaStorage'
 else:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
 # Redis Configuration
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
-# Session Configuration - Use database sessions instead of cache to avoid SessionInterrupted
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Session Configuration - Redis first with a write-behind database copy
+# (backend/sessions.py); an evicted session is reloaded from the database
+# instead of raising SessionInterrupted
+SESSION_ENGINE = 'backend.sessions'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# A session that was only read is re-saved once its expiry would move by this many seconds
+SESSION_REFRESH_THRESHOLD = config('SESSION_REFRESH_THRESHOLD', default=60 * 60, cast=int)
+
+# Server-sent events (backend/events.py): one Redis pub/sub channel per user
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default='redis://redis:6379/2')
+EVENTS_KEEPALIVE_SECONDS = config('EVENTS_KEEPALIVE_SECONDS', default=15, cast=int)
+# Streams are closed after this long and the client reconnects
+EVENTS_STREAM_MAX_SECONDS = config('EVENTS_STREAM_MAX_SECONDS', default=300, cast=int)
 
 # Redis cache configuration (for Celery and JWT blacklisting only)
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        # django_redis's RedisCache, counting hits and misses per request
+        'BACKEND': 'backend.instrumentation.InstrumentedRedisCache',
         'LOCATION': 'redis://redis:6379/1',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -241,6 +288,22 @@ CACHES = {
     }
 }
 
+# Request instrumentation (backend/instrumentation.py)
+PERF_INSTRUMENTATION_ENABLED = config('PERF_INSTRUMENTATION_ENABLED', default=True, cast=bool)
+# Server-Timing reveals query counts and timings to clients; off in production by default
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=DEBUG, cast=bool)
+PERF_LOG_ALL_REQUESTS = config('PERF_LOG_ALL_REQUESTS', default=False, cast=bool)
+# Requests over either threshold are logged as warnings with their slowest queries
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=1000, cast=int)
+PERF_QUERY_COUNT_WARNING = config('PERF_QUERY_COUNT_WARNING', default=50, cast=int)
+PERF_SLOW_QUERY_MS = config('PERF_SLOW_QUERY_MS', default=100, cast=int)
+PERF_SLOW_QUERY_LIMIT = config('PERF_SLOW_QUERY_LIMIT', default=5, cast=int)
+
+# Prometheus scrape endpoint (backend/metrics.py); with a token set, scrapers
+# must send "Authorization: Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_CELERY_QUEUES = config('METRICS_CELERY_QUEUES', default='celery', cast=lambda v: [q.strip() for q in v.split(',') if q.strip()])
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -258,6 +321,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'backend.instrumentation': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -269,6 +337,64 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Periodic maintenance jobs (see backend/maintenance.py), run by `celery -A backend beat`
+TRASH_GRACE_PERIOD_DAYS = config('TRASH_GRACE_PERIOD_DAYS', default=30, cast=int)
+
+# How long the client sync change feed keeps entries; older cursors must resync
+CHANGE_LOG_RETENTION_DAYS = config('CHANGE_LOG_RETENTION_DAYS', default=90, cast=int)
+
+# Per-user storage quotas checked at upload time (0 = unlimited); StorageUsage
+# rows can override them per user
+STORAGE_QUOTA_BYTES = config('STORAGE_QUOTA_BYTES', default=0, cast=int)
+STORAGE_QUOTA_FILES = config('STORAGE_QUOTA_FILES', default=0, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    'trash-purge': {
+        'task': 'maintenance.trash_purge',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'audit-rollup': {
+        'task': 'maintenance.audit_rollup',
+        'schedule': crontab(minute=15),  # hourly
+    },
+    'storage-reconcile': {
+        'task': 'maintenance.storage_reconcile',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'change-log-sequence': {
+        'task': 'maintenance.change_log_sequence',
+        'schedule': crontab(),  # every minute
+    },
+    'change-log-prune': {
+        'task': 'maintenance.change_log_prune',
+        'schedule': crontab(hour=5, minute=0),
+    },
+    'tag-usage-reconcile': {
+        'task': 'maintenance.tag_usage_reconcile',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'storage-usage-reconcile': {
+        'task': 'maintenance.storage_usage_reconcile',
+        'schedule': crontab(hour=4, minute=45),  # after storage-reconcile fixes sizes
+    },
+    'warm-tag-suggestions': {
+        'task': 'maintenance.warm_tag_suggestions',
+        'schedule': crontab(minute='*/30'),
+    },
+    'session-flush': {
+        'task': 'maintenance.session_flush',
+        'schedule': crontab(),  # every minute
+    },
+    'session-cleanup': {
+        'task': 'maintenance.session_cleanup',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    's3-tag-sync': {
+        'task': 'maintenance.s3_tag_sync',
+        'schedule': crontab(hour=5, minute=0, day_of_week='sunday'),
+    },
+}
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -0,0 +1,24 @@
+"""
+S3 media storage with long-lived caching for immutable files.
+
+Files under ``IMMUTABLE_PREFIXES`` are written once under a content-hashed
+name and never overwritten, so they get a one-year ``Cache-Control``
+instead of the bucket default from ``AWS_S3_OBJECT_PARAMETERS``.
+"""
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .instrumentation import instrument_boto3_session
+
+IMMUTABLE_PREFIXES = ('avatars/renditions/',)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class MediaStorage(S3Boto3Storage):
+    def _create_session(self):
+        return instrument_boto3_session(super()._create_session())
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if name.startswith(IMMUTABLE_PREFIXES):
+            params['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        return params
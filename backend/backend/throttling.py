@@ -0,0 +1,195 @@
+"""
+Token-bucket rate limiting on the Redis cache.
+
+Throttled views name a scope and a cost. ``THROTTLE_SCOPES`` in settings
+gives each scope a budget per user, per client IP, per target account and/or
+per target account and client IP, as DRF-style rates::
+
+    THROTTLE_SCOPES = {
+        'auth': {'ip': '30/min', 'account_ip': '20/hour'},
+        'email': {'account': '5/hour'},
+        'heavy': {'user': '100/hour'},
+    }
+
+The target account is the ``email`` or ``user_id`` in the request body.
+``account`` buckets are shared by every IP, so they are only safe on scopes
+whose refusal cannot lock the owner out (emails sent to the account);
+guesses against a login are limited per ``account_ip`` instead. Client IPs
+come from DRF's ``get_ident``, which only trusts ``X-Forwarded-For`` as far
+as ``NUM_PROXIES`` allows.
+
+A rate of ``N/period`` is a bucket of N tokens that refills at N per
+period, so short bursts of up to N are fine. Each request takes ``cost``
+tokens from every bucket it falls in (its user's and its IP's), so an
+archive export can cost ten times what a bulk tag edit does while both
+draw on the same budget. A request is allowed only if every bucket has
+enough tokens, and then all of them are charged.
+
+On django_redis the check-and-take is a single Lua script using the Redis
+clock, so concurrent workers cannot overdraw a bucket. Other cache
+backends (tests) run the same arithmetic in Python. If Redis is
+unreachable, requests are let through.
+"""
+import hashlib
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY = 'throttle:{scope}:{kind}:{ident}'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+# KEYS: bucket keys; ARGV: cost, then capacity and refill rate (tokens/s) per key.
+# Returns 0 when the tokens were taken, otherwise the wait in milliseconds.
+TAKE_TOKENS = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i * 2])
+  local rate = tonumber(ARGV[i * 2 + 1])
+  local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+  local level = capacity
+  if bucket[1] then
+    level = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+  end
+  levels[i] = level
+  if level < cost then
+    wait = math.max(wait, (cost - level) / rate)
+  end
+end
+if wait > 0 then
+  return math.ceil(wait * 1000)
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i * 2])
+  local rate = tonumber(ARGV[i * 2 + 1])
+  redis.call('HSET', key, 'tokens', string.format('%.6f', levels[i] - cost), 'ts', string.format('%.6f', now))
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return 0
+"""
+
+_script = None
+
+
+def parse_rate(rate):
+    """'100/hour' -> (capacity 100, refill 100/3600 tokens per second)"""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period.strip()[0]]
+
+
+def _redis():
+    client = getattr(cache, 'client', None)
+    return client.get_client(write=True) if hasattr(client, 'get_client') else None
+
+
+def _take_in_redis(client, buckets, cost):
+    global _script
+    if _script is None:
+        _script = client.register_script(TAKE_TOKENS)
+    args = [cost]
+    for _, capacity, rate in buckets:
+        args += [capacity, rate]
+    wait_ms = _script(keys=[cache.make_key(key) for key, _, _ in buckets], args=args, client=client)
+    return int(wait_ms) / 1000
+
+
+def _take_in_cache(buckets, cost):
+    now = time.time()
+    levels = []
+    wait = 0
+    for key, capacity, rate in buckets:
+        tokens, last = cache.get(key) or (capacity, now)
+        level = min(capacity, tokens + max(0, now - last) * rate)
+        levels.append(level)
+        if level < cost:
+            wait = max(wait, (cost - level) / rate)
+    if wait:
+        return wait
+    for (key, capacity, rate), level in zip(buckets, levels):
+        cache.set(key, (level - cost, now), math.ceil(capacity / rate) + 1)
+    return 0
+
+
+def take(buckets, cost=1):
+    """
+    Take ``cost`` tokens from every ``(key, capacity, refill_per_second)``
+    bucket if all of them have enough. Returns 0 on success, otherwise the
+    seconds until the request would fit.
+    """
+    cost = min(cost, min(capacity for _, capacity, _ in buckets))
+    client = _redis()
+    if client is None:
+        return _take_in_cache(buckets, cost)
+    try:
+        return _take_in_redis(client, buckets, cost)
+    except RedisError as e:
+        logger.warning(f'[THROTTLE] Redis unavailable, not throttling: {e}')
+        return 0
+
+
+ACCOUNT_FIELDS = ('email', 'user_id')
+
+
+def account_ident(request):
+    """Digest of the account a login-style request body names, or None"""
+    data = getattr(request, 'data', None)
+    if not hasattr(data, 'get'):
+        return None
+    for field in ACCOUNT_FIELDS:
+        value = data.get(field)
+        if value:
+            return hashlib.md5(f'{field}:{str(value).strip().lower()}'.encode('utf-8')).hexdigest()
+    return None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Charge ``cost`` tokens from the scope's per-user, per-IP and per-account buckets"""
+    scope = None
+    cost = 1
+
+    def buckets(self, request):
+        limits = settings.THROTTLE_SCOPES.get(self.scope, {})
+        idents = {'ip': self.get_ident(request)}
+        if request.user and request.user.is_authenticated:
+            idents['user'] = request.user.pk
+        if limits.get('account') or limits.get('account_ip'):
+            account = account_ident(request)
+            if account:
+                idents['account'] = account
+                idents['account_ip'] = f"{account}:{idents['ip']}"
+
+        buckets = []
+        for kind, rate in limits.items():
+            if rate and kind in idents:
+                key = KEY.format(scope=self.scope, kind=kind, ident=idents[kind])
+                buckets.append((key, *parse_rate(rate)))
+        return buckets
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        buckets = self.buckets(request)
+        if not buckets:
+            return True
+        self.wait_seconds = take(buckets, self.cost)
+        return not self.wait_seconds
+
+    def wait(self):
+        return math.ceil(self.wait_seconds)
+
+
+def throttle(scope, cost=1):
+    """Throttle class for ``throttle_classes``: ``[throttle('heavy', cost=10)]``"""
+    return type(f'{scope.title()}Throttle', (TokenBucketThrottle,), {'scope': scope, 'cost': cost})
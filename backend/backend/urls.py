@@ -21,8 +21,10 @@ from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenBlacklistView
 from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
+from backend.events import event_stream
+from backend.metrics import metrics_view
 from documents.tasks import add, process_document_upload, test_redis_integration, long_running_task
 
 @api_view(['POST'])
@@ -140,6 +142,31 @@ def get_task_result(request, task_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def maintenance_jobs(request):
+    """List registered maintenance jobs with their lock state and run metrics"""
+    from backend.maintenance import job_status
+    return JsonResponse({'jobs': job_status()})
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def run_maintenance_job(request, name):
+    """Queue a maintenance job outside of its beat schedule"""
+    from backend.maintenance import load_jobs
+    job = load_jobs().get(name)
+    if job is None:
+        return JsonResponse({'error': f'Unknown maintenance job: {name}'}, status=404)
+    try:
+        task = job['task'].delay()
+        return JsonResponse({
+            'message': f'Maintenance job {name} queued',
+            'task_id': task.id,
+            'status': 'PENDING'
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 urlpatterns = [
     path("", include("admin_index.urls")),  # Root path for admin index
     path("admin/", admin.site.urls),
@@ -147,6 +174,10 @@ urlpatterns = [
     path("api/", include("documents.urls")),
     path("api/audit/", include("audit.urls")),
     path("api/token/blacklist/", TokenBlacklistView.as_view(), name='token_blacklist'),
+    path("api/events/", event_stream, name='event_stream'),
+    path("metrics", metrics_view, name='metrics'),
+    path("api/maintenance/jobs/", maintenance_jobs, name='maintenance_jobs'),
+    path("api/maintenance/jobs/<str:name>/run/", run_maintenance_job, name='run_maintenance_job'),
     path("api/test/blacklist/", test_blacklist_token, name='test_blacklist'),
     path("api/test/redis/", test_redis_connection, name='test_redis'),
     path("api/test/celery/", test_celery_task, name='test_celery'),
@@ -106,6 +106,18 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def disable_event_publishing(settings):
+    """Keep tests off the Redis pub/sub used for server-sent events."""
+    settings.EVENTS_REDIS_URL = ''
+
+
+@pytest.fixture(autouse=True)
+def disable_throttling(settings):
+    """Keep rate limit buckets from carrying over between tests."""
+    settings.THROTTLE_ENABLED = False
+
+
 @pytest.fixture
 def user_with_mfa(user):
     """Create a user with MFA enabled."""
@@ -115,6 +127,21 @@ def user_with_mfa(user):
     return user
 
 
+@pytest.fixture
+def locmem_cache(settings):
+    """Swap the Redis cache for an in-process cache."""
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-cache",
+        }
+    }
+    from django.core.cache import cache
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
 @pytest.fixture
 def mock_s3_storage():
     """Mock S3 storage for testing."""
@@ -1,18 +1,33 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from django.db.models import Count, Sum, Q
+from django.db.models import BigIntegerField, Count, F, Q, Value
+from django.db.models.functions import Coalesce
 from django.urls import path
 from django.utils import timezone
-from .models import Document, DocumentVersion, Tag, DocumentAccess, DocumentAuditLog
+from .models import Document, DocumentVersion, Tag, DocumentAccess, DocumentAuditLog, StorageUsage
+from . import changes
+from .caching import invalidate_documents
+from backend.pagination import EstimatedCountPaginator
+
+
+class DocumentTitleFilter(admin.RelatedOnlyFieldListFilter):
+    """Related-only document filter labelled by title (Document.__str__ loads the current version)"""
+
+    def field_choices(self, field, request, model_admin):
+        used = model_admin.get_queryset(request).order_by().values(f'{self.field_path}__pk')
+        return list(
+            Document.objects.all_with_deleted().filter(pk__in=used).order_by('title').values_list('pk', 'title')
+        )
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     """Enhanced admin configuration for Tag model"""
-    list_display = ('display_name_colored', 'key', 'value', 'usage_count', 'created_by', 'created_at')
+    list_display = ('display_name_colored', 'key', 'value', 'documents_count', 'created_by', 'created_at')
     list_filter = ('created_at', 'created_by', 'key')
+    list_select_related = ('created_by',)
     search_fields = ('key', 'value')
-    readonly_fields = ('created_at', 'display_name', 'usage_count')
+    readonly_fields = ('created_at', 'display_name', 'documents_count')
     
     def display_name_colored(self, obj):
         """Display tag name with color"""
@@ -23,10 +38,18 @@ class TagAdmin(admin.ModelAdmin):
         )
     display_name_colored.short_description = 'Tag'
     
-    def usage_count(self, obj):
+    def documents_count(self, obj):
         """Display how many documents use this tag"""
-        return obj.documents.count()
-    usage_count.short_description = 'Usage Count'
+        count = getattr(obj, 'documents_count', None)
+        if count is None:
+            count = obj.documents.filter(is_deleted=False).count()
+        return count
+    documents_count.short_description = 'Usage Count'
+    documents_count.admin_order_field = 'documents_count'
+    
+    def get_queryset(self, request):
+        """Annotate usage counts instead of counting per row"""
+        return super().get_queryset(request).with_documents_count()
 
 
 @admin.register(Document)
@@ -49,6 +72,9 @@ class DocumentAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags',)
     date_hierarchy = 'created_at'
     list_per_page = 50
+    list_select_related = ('current_version', 'created_by')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # skip the unfiltered COUNT(*) next to the filtered one
     
     fieldsets = (
         ('Basic Information', {
@@ -101,25 +127,36 @@ class DocumentAdmin(admin.ModelAdmin):
 
     def versions_count(self, obj):
         """Display number of versions"""
-        count = obj.versions.count()
+        count = getattr(obj, 'versions_total', None)
+        if count is None:
+            count = obj.versions.count()
         return format_html(
             '<a href="/admin/documents/documentversion/?document__id__exact={}">{} versions</a>',
             obj.id,
             count
         )
     versions_count.short_description = 'Versions'
+    versions_count.admin_order_field = 'versions_total'
 
     def storage_usage(self, obj):
-        """Display storage usage for this document"""
-        total_size = obj.versions.aggregate(total=Sum('file_size'))['total'] or 0
-        return self.format_file_size(total_size)
+        """Display storage usage for this document (maintained counter)"""
+        return self.format_file_size(obj.storage_bytes)
     storage_usage.short_description = 'Storage Used'
+    storage_usage.admin_order_field = 'storage_bytes'
+
+    def get_queryset(self, request):
+        """Annotate per-row figures so the changelist runs a fixed number of queries"""
+        return super().get_queryset(request).annotate(
+            versions_total=Count('versions'),
+            storage_bytes=Coalesce(F('storage__bytes_used'), Value(0), output_field=BigIntegerField()),
+        ).prefetch_related('tags')
 
     def tags_display(self, obj):
         """Display tags with colors"""
-        if obj.tags.exists():
+        tags = list(obj.tags.all())
+        if tags:
             tags_html = []
-            for tag in obj.tags.all():
+            for tag in tags:
                 tags_html.append(
                     format_html(
                         '<span style="background-color: {}; color: white; padding: 1px 4px; border-radius: 2px; margin-right: 2px; font-size: 10px;">{}</span>',
@@ -169,7 +206,26 @@ class DocumentAdmin(admin.ModelAdmin):
 
     def change_status_to_published(self, request, queryset):
         """Bulk action to publish documents"""
-        updated = queryset.update(status='published')
+        from audit.models import AuditLog
+        documents = list(queryset.exclude(status='published').only('id', 'title', 'created_by_id'))
+        updated = queryset.model.objects.filter(
+            id__in=[doc.id for doc in documents]
+        ).update(status='published', updated_at=timezone.now())
+        invalidate_documents(*[doc.id for doc in documents])
+        changes.record(*[changes.document_entry(doc, 'updated') for doc in documents])
+        AuditLog.log_many([
+            AuditLog.build_entry(
+                user=request.user,
+                action='update',
+                resource_type='document',
+                resource_id=str(doc.id),
+                resource_name=doc.title,
+                details={'bulk_operation': 'set_status', 'status': 'published'},
+                request=request,
+                content_object=doc,
+            )
+            for doc in documents
+        ])
         self.message_user(
             request,
             f'Successfully published {updated} document(s).',
@@ -178,6 +234,19 @@ class DocumentAdmin(admin.ModelAdmin):
     change_status_to_published.short_description = "Publish selected documents"
 
 
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    """Per-user storage counters and quota overrides"""
+    list_display = ('user', 'bytes_used', 'files_count', 'quota_bytes', 'quota_files')
+    list_select_related = ('user',)
+    search_fields = ('user__email', 'user__username')
+    readonly_fields = ('user', 'bytes_used', 'files_count')
+    ordering = ('-bytes_used',)
+
+    def has_add_permission(self, request):
+        return False  # rows are created as users upload
+
+
 @admin.register(DocumentVersion)
 class DocumentVersionAdmin(admin.ModelAdmin):
     """Enhanced admin configuration for DocumentVersion model"""
@@ -187,10 +256,13 @@ class DocumentVersionAdmin(admin.ModelAdmin):
     list_filter = (
         'created_at', 'file_type',
         ('created_by', admin.RelatedOnlyFieldListFilter),
-        ('document', admin.RelatedOnlyFieldListFilter)
+        ('document', DocumentTitleFilter)
     )
     search_fields = ('document__title', 'title', 'description', 'changes_description')
     readonly_fields = ('id', 'file_size', 'file_type', 'created_at')
+    list_select_related = ('document', 'created_by')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Version Information', {
@@ -244,6 +316,7 @@ class DocumentAccessAdmin(admin.ModelAdmin):
     """Admin configuration for DocumentAccess model"""
     list_display = ('document', 'user', 'permission_badge', 'granted_by', 'granted_at')
     list_filter = ('permission', 'granted_at')
+    list_select_related = ('document__current_version', 'user', 'granted_by')
     search_fields = ('document__title', 'user__email', 'granted_by__email')
     
     def permission_badge(self, obj):
@@ -268,6 +341,7 @@ class DocumentAuditLogAdmin(admin.ModelAdmin):
     """Admin configuration for DocumentAuditLog model"""
     list_display = ('document', 'action_badge', 'performed_by', 'timestamp')
     list_filter = ('action', 'timestamp')
+    list_select_related = ('document__current_version', 'performed_by')
     search_fields = ('document__title', 'performed_by__email', 'details')
     readonly_fields = ('document', 'version', 'action', 'performed_by', 'details', 'timestamp')
     
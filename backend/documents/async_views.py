@@ -0,0 +1,141 @@
+"""
+Async download and read-only metadata views.
+
+These run natively on the ASGI application (``backend/asgi.py``). Lookups
+and permission checks use the async ORM and cache, and file contents are
+read from storage chunk by chunk on a thread pool, so a slow client or a
+slow S3 read holds a coroutine instead of a worker thread.
+"""
+import mimetypes
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.encoding import smart_str
+
+from accounts.authentication import async_login_required
+from audit.models import AuditLog
+from backend import metrics
+from backend.throttling import throttle
+
+from .models import Document, DocumentVersion
+from .permissions import DocumentPermissions
+from .serializers import TagSerializer
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+async def read_chunks(field_file, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield a stored file in chunks; each blocking storage call runs on a worker thread"""
+    opened = await sync_to_async(field_file.storage.open, thread_sensitive=False)(field_file.name, 'rb')
+    read = sync_to_async(opened.read, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                break
+            metrics.DOWNLOAD_BYTES.inc(len(chunk))
+            yield chunk
+    finally:
+        await sync_to_async(opened.close, thread_sensitive=False)()
+
+
+async def _permissions(request):
+    return await DocumentPermissions(request.user).aload()
+
+
+async def _log_download(request, **kwargs):
+    await sync_to_async(AuditLog.log_activity)(user=request.user, action='download', request=request, **kwargs)
+
+
+@async_login_required
+async def document_download(request, pk):
+    """Download link for the document's current file"""
+    if request.method not in ('GET', 'POST'):
+        return HttpResponseNotAllowed(['GET', 'POST'])
+    try:
+        document = await Document.objects.select_related('current_version').aget(pk=pk)
+    except Document.DoesNotExist:
+        return JsonResponse({'error': 'Document not found'}, status=404)
+
+    if not (await _permissions(request)).can_read(document):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    if not document.file:
+        return JsonResponse({'error': 'No file associated with this document'}, status=404)
+
+    await _log_download(
+        request,
+        resource_type='document',
+        resource_id=str(document.id),
+        resource_name=document.title,
+        content_object=document,
+    )
+    return JsonResponse({
+        'download_url': request.build_absolute_uri(document.file.url),
+        'filename': document.file.name.split('/')[-1],
+        'file_size': document.file_size,
+    })
+
+
+@async_login_required(throttle=throttle('heavy'))
+async def download_document_version(request, pk, version_id):
+    """Stream the file of a specific version"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        version = await DocumentVersion.objects.select_related('document').aget(
+            id=version_id, document_id=pk, document__is_deleted=False
+        )
+    except DocumentVersion.DoesNotExist:
+        return JsonResponse({'detail': 'Document or version not found.'}, status=404)
+    document = version.document
+
+    if not (await _permissions(request)).can_read(document, include_published=False):
+        return JsonResponse({'detail': 'You do not have permission to view this document.'}, status=403)
+    if not version.file:
+        return JsonResponse({'detail': 'No file associated with this version.'}, status=404)
+
+    await _log_download(
+        request,
+        resource_type='document_version',
+        resource_id=str(version.id),
+        resource_name=f'{document.title} v{version.version_number}',
+        details={
+            'document_id': str(document.id),
+            'version_number': version.version_number,
+        },
+        content_object=version,
+    )
+
+    filename = version.file.name.split('/')[-1]
+    response = StreamingHttpResponse(
+        read_chunks(version.file),
+        content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+    )
+    if version.file_size:
+        response['Content-Length'] = version.file_size
+    response['Content-Disposition'] = f'attachment; filename="{smart_str(filename)}"'
+    return response
+
+
+@async_login_required
+async def get_document_metadata_for_version(request, pk):
+    """Get current document metadata for creating a new version"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        document = await Document.objects.select_related('current_version').aget(pk=pk)
+    except Document.DoesNotExist:
+        return JsonResponse({'detail': 'Document not found.'}, status=404)
+
+    if not (await _permissions(request)).can_write(document):
+        return JsonResponse({'detail': 'You do not have permission to edit this document.'}, status=403)
+
+    tags = [tag async for tag in document.tags.all()]
+    # Tag creators come from the user summary cache, which is synchronous
+    tags_data = await sync_to_async(lambda: TagSerializer(tags, many=True).data)()
+    return JsonResponse({
+        'title': document.title,
+        'description': document.description,
+        'tags': tags_data,
+        'current_version': document.current_version.version_number if document.current_version else 0,
+    })
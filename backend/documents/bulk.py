@@ -0,0 +1,303 @@
+"""
+Set-based operations across many documents.
+
+Tags live on a document's current version when it has one and on the document
+itself otherwise, so every operation splits the selected documents into those
+two groups and works directly on the matching M2M through table. Bulk inserts
+and deletes bypass ``m2m_changed``, so the side effects the signals would have
+produced (usage counts, caches, change log) are applied once per call here.
+
+Document actions (status change, soft delete, restore, share) resolve the
+selection and the caller's permission on every document in one query, apply
+the change with a single UPDATE / bulk INSERT and bulk-write one audit entry
+per changed document. Results are reported per document id.
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from audit.models import AuditLog
+from backend import events
+
+from . import changes
+from .caching import invalidate_documents, invalidate_tag_suggestions
+from .filters import DocumentFilter
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+from .permissions import invalidate_user_grants
+
+BULK_MAX_DOCUMENTS = 5000
+BULK_BATCH_SIZE = 1000
+
+TAG_OPERATIONS = ('add', 'remove', 'replace')
+DOCUMENT_ACTIONS = ('set_status', 'soft_delete', 'restore', 'share')
+
+# Actions a user holding an 'admin' share may perform besides the owner
+SHARED_ADMIN_ACTIONS = ('restore', 'share')
+
+AUDIT_ACTIONS = {
+    'set_status': 'update',
+    'soft_delete': 'soft_delete',
+    'restore': 'restore',
+    'share': 'share',
+}
+
+
+class BulkOperationError(ValueError):
+    """Raised when a bulk request cannot be applied at all"""
+
+
+def _add_tags(through, owner_field, owner_ids, tag_ids):
+    rows = [
+        through(**{owner_field: owner_id, 'tag_id': tag_id})
+        for owner_id in owner_ids
+        for tag_id in tag_ids
+    ]
+    through.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+
+def _apply_tag_operation(through, owner_field, owner_ids, operation, tag_ids):
+    """Apply the operation to one through table; returns the tag ids it touched"""
+    if not owner_ids:
+        return set()
+
+    links = through.objects.filter(**{f'{owner_field}__in': owner_ids})
+    touched = set(tag_ids)
+
+    if operation == 'add':
+        _add_tags(through, owner_field, owner_ids, tag_ids)
+    elif operation == 'remove':
+        links.filter(tag_id__in=tag_ids).delete()
+    else:
+        stale = links.exclude(tag_id__in=tag_ids)
+        touched |= set(stale.values_list('tag_id', flat=True).distinct())
+        stale.delete()
+        _add_tags(through, owner_field, owner_ids, tag_ids)
+    return touched
+
+
+@transaction.atomic
+def bulk_update_tags(user, document_ids, operation, tag_ids, request=None):
+    """
+    Add, remove or replace ``tag_ids`` on every document the user owns.
+
+    Returns the ids that were updated and the ones that were skipped (missing,
+    deleted or not owned by the user). Tags must all belong to the user: an
+    unknown one would otherwise turn 'replace' into clearing every tag.
+    """
+    from .tasks import sync_document_tags
+
+    if operation not in TAG_OPERATIONS:
+        raise ValueError(f'Unknown tag operation: {operation}')
+
+    requested = {str(document_id) for document_id in document_ids}
+    rows = list(
+        Document.objects.filter(id__in=requested, created_by=user, is_deleted=False)
+        .values_list('id', 'current_version_id')
+    )
+    requested_tags = set(tag_ids)
+    tag_ids = list(
+        Tag.objects.filter(id__in=requested_tags, created_by=user).values_list('id', flat=True)
+    )
+    unknown_tags = sorted(requested_tags - set(tag_ids))
+    if unknown_tags:
+        raise BulkOperationError(f'Unknown tags: {unknown_tags}')
+
+    updated = [str(document_id) for document_id, version_id in rows]
+    skipped = sorted(requested - set(updated))
+    if not rows:
+        return {'operation': operation, 'tag_ids': tag_ids, 'updated': [], 'skipped': skipped}
+
+    version_ids = [version_id for document_id, version_id in rows if version_id]
+    untracked_ids = [document_id for document_id, version_id in rows if not version_id]
+
+    _apply_tag_operation(
+        DocumentVersion.tags.through, 'documentversion_id', version_ids, operation, tag_ids
+    )
+    touched = _apply_tag_operation(
+        Document.tags.through, 'document_id', untracked_ids, operation, tag_ids
+    )
+
+    if touched:
+        Tag.objects.filter(id__in=touched).refresh_usage_counts()
+    document_pks = [document_id for document_id, version_id in rows]
+    Document.objects.filter(id__in=document_pks).update(updated_at=timezone.now())
+    invalidate_documents(*document_pks)
+    invalidate_tag_suggestions(user.id)
+    changes.record(*[
+        changes.entry('document', document_id, 'updated', document_id=document_id, audience_id=user.id)
+        for document_id in document_pks
+    ])
+
+    AuditLog.log_activity(
+        user=user,
+        action='update',
+        resource_type='document',
+        resource_id='bulk',
+        resource_name=f'{len(updated)} documents',
+        details={
+            'bulk_operation': f'tags_{operation}',
+            'tag_ids': tag_ids,
+            'document_ids': updated,
+        },
+        request=request,
+    )
+
+    job_id = uuid.uuid4().hex
+    transaction.on_commit(lambda: sync_document_tags.delay(updated, user.id, job_id))
+
+    return {
+        'operation': operation, 'tag_ids': tag_ids, 'updated': updated, 'skipped': skipped, 'job_id': job_id,
+    }
+
+
+def _with_permission(queryset, user, action):
+    """Annotate ``allowed`` for ``action`` so the check costs no extra query"""
+    if action in SHARED_ADMIN_ACTIONS:
+        admin_share = DocumentAccess.objects.filter(
+            document=OuterRef('pk'), user=user, permission='admin'
+        )
+        allowed = Q(created_by=user) | Q(Exists(admin_share))
+    else:
+        allowed = Q(created_by=user)
+    return queryset.annotate(
+        allowed=Case(When(allowed, then=Value(True)), default=Value(False), output_field=BooleanField())
+    )
+
+
+def _select_documents(user, action, document_ids=None, filters=None):
+    """
+    Documents the action applies to, with ``allowed`` annotated.
+
+    A filter expression (DocumentFilter query parameters) only ever selects
+    documents the caller may act on; explicit ids are all returned so denied
+    ones can be reported.
+    """
+    if action == 'restore':
+        queryset = Document.objects.deleted_only()
+    else:
+        queryset = Document.objects.all()
+
+    if filters is not None:
+        filterset = DocumentFilter(data=filters, queryset=queryset)
+        if not filterset.is_valid():
+            raise BulkOperationError(filterset.errors)
+        queryset = _with_permission(filterset.qs, user, action).filter(allowed=True)
+    else:
+        queryset = _with_permission(queryset.filter(id__in=document_ids), user, action)
+
+    documents = list(
+        queryset.only('id', 'title', 'status', 'created_by_id').order_by()[:BULK_MAX_DOCUMENTS + 1]
+    )
+    if len(documents) > BULK_MAX_DOCUMENTS:
+        raise BulkOperationError(f'Selection matches more than {BULK_MAX_DOCUMENTS} documents')
+    return documents
+
+
+def _share_target(email):
+    User = get_user_model()
+    try:
+        return User.objects.get(email=email)
+    except User.DoesNotExist:
+        raise BulkOperationError('User not found')
+
+
+def _refresh_tag_usage(document_ids, *owner_ids):
+    """Side effects the per-document save() signals would have produced"""
+    tag_ids = Document.tags.through.objects.filter(document_id__in=document_ids).values('tag_id')
+    Tag.objects.filter(id__in=tag_ids).refresh_usage_counts()
+    invalidate_tag_suggestions(*owner_ids)
+
+
+@transaction.atomic
+def bulk_document_action(user, action, document_ids=None, filters=None, status=None,
+                         email=None, permission='read', request=None):
+    """
+    Apply ``action`` to a selection of documents.
+
+    Returns ``{'action', 'updated', 'results'}`` where ``results`` maps every
+    selected id to 'updated', 'unchanged', 'permission_denied' or 'not_found'.
+    """
+    if action not in DOCUMENT_ACTIONS:
+        raise BulkOperationError(f'Unknown action: {action}')
+
+    target_user = _share_target(email) if action == 'share' else None
+    documents = _select_documents(user, action, document_ids, filters)
+
+    results = {str(document_id): 'not_found' for document_id in document_ids or []}
+    changed = []
+    for document in documents:
+        if not document.allowed:
+            results[str(document.id)] = 'permission_denied'
+        elif action == 'set_status' and document.status == status:
+            results[str(document.id)] = 'unchanged'
+        else:
+            results[str(document.id)] = 'updated'
+            changed.append(document)
+
+    changed_ids = [document.id for document in changed]
+    now = timezone.now()
+    details = {'bulk_operation': action}
+
+    if not changed_ids:
+        return {'action': action, 'updated': 0, 'results': results}
+
+    if action == 'set_status':
+        Document.objects.filter(id__in=changed_ids).update(status=status, updated_at=now)
+        details['status'] = status
+    elif action == 'soft_delete':
+        Document.objects.filter(id__in=changed_ids).update(
+            is_deleted=True, deleted_at=now, deleted_by=user, updated_at=now
+        )
+        _refresh_tag_usage(changed_ids, user.id)
+    elif action == 'restore':
+        Document.objects.deleted_only().filter(id__in=changed_ids).update(
+            is_deleted=False, deleted_at=None, deleted_by=None, updated_at=now
+        )
+        _refresh_tag_usage(changed_ids, *{document.created_by_id for document in changed})
+    else:
+        DocumentAccess.objects.bulk_create(
+            [
+                DocumentAccess(document_id=document_id, user=target_user,
+                               permission=permission, granted_by=user)
+                for document_id in changed_ids
+            ],
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['document', 'user'],
+            update_fields=['permission', 'granted_by'],
+        )
+        details.update({'shared_with': email, 'permission': permission})
+        invalidate_user_grants(target_user.id)
+        events.publish([target_user.id], 'document.shared', {
+            'document_ids': changed_ids, 'permission': permission, 'granted_by': user.id,
+        })
+    invalidate_documents(*changed_ids)
+
+    if action == 'share':
+        grants = DocumentAccess.objects.filter(document_id__in=changed_ids, user=target_user)
+        changes.record(*[
+            changes.entry('access', access_id, 'updated', document_id=document_id, audience_id=target_user.id)
+            for access_id, document_id in grants.values_list('id', 'document_id')
+        ])
+    else:
+        change_action = 'deleted' if action == 'soft_delete' else 'updated'
+        changes.record(*[changes.document_entry(document, change_action) for document in changed])
+
+    AuditLog.log_many([
+        AuditLog.build_entry(
+            user=user,
+            action=AUDIT_ACTIONS[action],
+            resource_type='document',
+            resource_id=str(document.id),
+            resource_name=document.title,
+            details=details,
+            request=request,
+            content_object=document,
+        )
+        for document in changed
+    ])
+
+    return {'action': action, 'updated': len(changed), 'results': results}
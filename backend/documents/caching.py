@@ -0,0 +1,228 @@
+"""
+Cache helpers for the documents app.
+
+Tag suggestions are cached per user and per query prefix. Every user has a
+generation stamp that is bumped whenever one of their tags (or the documents
+using them) changes, which orphans all of their cached entries at once.
+
+Document detail payloads are cached per document under a version stamp that
+the signals in ``signals.py`` bump on any change to the document, its
+versions, tags or access grants. The cached body is the same for every
+viewer; ``can_edit`` / ``can_delete`` come from the permission map per request.
+Nested user profiles are not tracked, so entries also expire after a few
+minutes.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Q, Value, prefetch_related_objects
+
+from .models import Tag
+from .permissions import permissions_for
+from .search import similar_tags
+
+SUGGESTION_LIMIT = 20
+SUGGESTION_TIMEOUT = 10 * 60  # 10 minutes
+
+SUGGESTION_GENERATION_KEY = 'tag_suggestions:gen:{user_id}'
+SUGGESTION_KEY = 'tag_suggestions:{user_id}:{generation}:{mode}:{query}'
+
+
+def _suggestion_generation(user_id):
+    key = SUGGESTION_GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _suggestion_key(user_id, generation, query, mode='prefix'):
+    digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+    return SUGGESTION_KEY.format(user_id=user_id, generation=generation, mode=mode, query=digest)
+
+
+def invalidate_tag_suggestions(*user_ids):
+    """Drop every cached suggestion for the given users"""
+    cache.set_many(
+        {SUGGESTION_GENERATION_KEY.format(user_id=user_id): time.time_ns() for user_id in set(user_ids) if user_id},
+        None,
+    )
+
+
+def _live_tags(user):
+    """The user's tags that are unused or used by a non-deleted document"""
+    return Tag.objects.filter(created_by=user).filter(
+        Q(documents__isnull=True) | Q(documents__is_deleted=False)
+    )
+
+
+def tag_suggestion_queryset(user, query=''):
+    """
+    (key, value) suggestion rows for a user in a single query.
+
+    Every matching key gets a key-only row plus one row per non-empty value,
+    ordered and limited by the database.
+    """
+    live_tags = _live_tags(user)
+
+    if query:
+        matching_keys = live_tags.filter(
+            Q(key__icontains=query) | Q(value__icontains=query)
+        ).values('key')
+        live_tags = live_tags.filter(key__in=matching_keys)
+
+    key_rows = (
+        live_tags.annotate(suggested_value=Value('', output_field=CharField()))
+        .values_list('key', 'suggested_value')
+        .order_by()
+    )
+    value_rows = live_tags.exclude(value='').values_list('key', 'value').order_by()
+    return key_rows.union(value_rows).order_by('key', 'suggested_value')
+
+
+def similar_tag_suggestions(user, query):
+    """
+    Suggestions ranked by similarity to ``query`` (typo tolerant).
+
+    One query returns the best matching (key, value) pairs; keys are emitted in
+    rank order, each followed by its values.
+    """
+    rows = (
+        similar_tags(_live_tags(user), query)
+        .values_list('key', 'value', 'rank')
+        .order_by('-rank', 'key', 'value')
+        .distinct()[:SUGGESTION_LIMIT]
+    )
+    suggestions = []
+    seen_keys = set()
+    for key, value, rank in rows:
+        if key not in seen_keys:
+            seen_keys.add(key)
+            suggestions.append({'key': key, 'value': ''})
+        if value:
+            suggestions.append({'key': key, 'value': value})
+    return suggestions[:SUGGESTION_LIMIT]
+
+
+def _matches(entries, query):
+    """Narrow a complete cached result down to a longer query"""
+    matching_keys = {
+        entry['key'] for entry in entries
+        if query in entry['key'].lower() or query in entry['value'].lower()
+    }
+    return [entry for entry in entries if entry['key'] in matching_keys]
+
+
+def get_tag_suggestions(user, query='', mode='prefix'):
+    """
+    Tag suggestions for auto-complete, served from the per-user cache.
+
+    A miss first looks for a cached result of a shorter prefix that was not
+    truncated by the limit; any longer query can be answered from that result
+    without touching the database. ``mode='similar'`` ranks by trigram
+    similarity instead and is cached per exact query.
+    """
+    query = query.lower()
+    generation = _suggestion_generation(user.id)
+
+    if mode == 'similar' and query:
+        cache_key = _suggestion_key(user.id, generation, query, mode)
+        suggestions = cache.get(cache_key)
+        if suggestions is None:
+            suggestions = similar_tag_suggestions(user, query)
+            cache.set(cache_key, suggestions, SUGGESTION_TIMEOUT)
+        return suggestions
+
+    prefix_keys = {
+        _suggestion_key(user.id, generation, query[:length]): query[:length]
+        for length in range(len(query), -1, -1)
+    }
+    cached = cache.get_many(list(prefix_keys))
+
+    exact_key = _suggestion_key(user.id, generation, query)
+    if exact_key in cached:
+        return cached[exact_key]['items']
+
+    entry = None
+    for cache_key, prefix in prefix_keys.items():
+        if cache_key in cached and cached[cache_key]['complete']:
+            entry = {'complete': True, 'items': _matches(cached[cache_key]['items'], query)}
+            break
+
+    if entry is None:
+        rows = list(tag_suggestion_queryset(user, query)[:SUGGESTION_LIMIT + 1])
+        entry = {
+            'complete': len(rows) <= SUGGESTION_LIMIT,
+            'items': [{'key': key, 'value': value} for key, value in rows[:SUGGESTION_LIMIT]],
+        }
+
+    cache.set(exact_key, entry, SUGGESTION_TIMEOUT)
+    return entry['items']
+
+
+DOCUMENT_TIMEOUT = 5 * 60  # 5 minutes
+DOCUMENT_STAMP_KEY = 'document_repr:stamp:{document_id}'
+DOCUMENT_KEY = 'document_repr:{document_id}:{stamp}:{variant}'
+
+# Fields that depend on who is asking; never stored in the shared body
+DOCUMENT_VIEWER_FIELDS = ('can_edit', 'can_delete')
+
+# Users are embedded by id through accounts.summaries, so they are not prefetched
+DOCUMENT_PREFETCH = (
+    'tags',
+    'current_version__tags',
+    'versions',
+    'access_permissions',
+)
+
+
+def _bump_document_stamps(keys):
+    stamp = time.time_ns()
+    cache.set_many({key: stamp for key in keys}, DOCUMENT_TIMEOUT * 2)
+
+
+def invalidate_documents(*document_ids):
+    """Orphan the cached payloads now and again once the transaction commits"""
+    keys = [DOCUMENT_STAMP_KEY.format(document_id=document_id) for document_id in set(document_ids) if document_id]
+    if keys:
+        _bump_document_stamps(keys)
+        # A reader may re-cache the pre-commit body under the first stamp
+        transaction.on_commit(lambda: _bump_document_stamps(keys))
+
+
+def document_stamp(document_id):
+    key = DOCUMENT_STAMP_KEY.format(document_id=document_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), DOCUMENT_TIMEOUT * 2)
+        stamp = cache.get(key)
+    return stamp
+
+
+def get_document_representation(document, request, serialize):
+    """
+    Serialized detail payload for ``document``, shared across viewers.
+
+    ``serialize(document)`` builds the payload on a miss. Absolute URLs in the
+    body depend on the request host, so the host is part of the key.
+    """
+    variant = hashlib.md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()
+    cache_key = DOCUMENT_KEY.format(
+        document_id=document.pk, stamp=document_stamp(document.pk), variant=variant
+    )
+    body = cache.get(cache_key)
+    if body is None:
+        prefetch_related_objects([document], *DOCUMENT_PREFETCH)
+        body = dict(serialize(document))
+        for field in DOCUMENT_VIEWER_FIELDS:
+            body.pop(field, None)
+        cache.set(cache_key, body, DOCUMENT_TIMEOUT)
+
+    permissions = permissions_for(request)
+    data = dict(body)
+    data['can_edit'] = permissions.can_write(document)
+    data['can_delete'] = permissions.can_admin(document)
+    return data
@@ -0,0 +1,141 @@
+"""
+Change log for incremental client sync.
+
+Signals (and the bulk operations, which bypass them) append one
+``ChangeLogEntry`` per created, updated or deleted document, version, tag or
+access grant. Clients read the log through an opaque cursor and only fetch
+what changed. Entries carry ids only; the current state is read from the
+regular endpoints. A user sees entries for documents they can currently
+see, plus every entry addressed to them (their own resources, tombstones of
+their documents and grants they gained or lost).
+
+Cursors are positions in ``ChangeLogEntry.sequence``, not entry ids. Ids are
+assigned at insert but become visible at commit, so a long request can
+commit a lower id after a client has read past it. Sequence numbers are only
+given to committed entries, by the on-commit hook of the write that created
+them (and the ``change_log_sequence`` job for any hook that never ran), one
+numbering run at a time under the ``ChangeLogState`` row lock. Every number a
+reader can see is therefore preceded by all the lower ones, and reading the
+feed never writes. The same row keeps the pruning watermark.
+"""
+import base64
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+
+from .models import ChangeLogEntry, ChangeLogState, Document
+
+CURSOR_PREFIX = 'v1:'
+STATE_ID = 1
+
+
+class CursorExpired(Exception):
+    """The cursor points at entries that have been pruned; resync needed"""
+
+
+def encode_cursor(sequence):
+    return base64.urlsafe_b64encode(f'{CURSOR_PREFIX}{sequence}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Sequence encoded in ``cursor``; raises ValueError if malformed"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if not raw.startswith(CURSOR_PREFIX) or not raw[len(CURSOR_PREFIX):].isdigit():
+        raise ValueError('Invalid cursor')
+    return int(raw[len(CURSOR_PREFIX):])
+
+
+def entry(resource_type, resource_id, action, document_id=None, audience_id=None):
+    """Unsaved change log entry"""
+    return ChangeLogEntry(
+        resource_type=resource_type,
+        resource_id=str(resource_id),
+        action=action,
+        document_id=document_id,
+        audience_id=audience_id,
+    )
+
+
+def record(*entries):
+    if entries:
+        ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+        transaction.on_commit(sequence_entries)
+
+
+def document_entry(document, action):
+    return entry('document', document.pk, action, document_id=document.pk, audience_id=document.created_by_id)
+
+
+def sequence_entries():
+    """
+    Number the committed entries that have no sequence yet; returns how many.
+
+    Runs after commit, so only committed entries are numbered. A lower id
+    that commits while a run is in progress waits for the next run.
+    """
+    with transaction.atomic():
+        state = ChangeLogState.objects.select_for_update().filter(pk=STATE_ID).first()
+        if state is None:
+            # Migration 0016 creates the row; only a bare schema lacks it
+            state = ChangeLogState.objects.create(pk=STATE_ID)
+        pending = ChangeLogEntry.objects.filter(sequence__isnull=True)
+        first = pending.aggregate(first=Min('id'))['first']
+        if first is None:
+            return 0
+        numbered = pending.filter(id__gte=first).update(sequence=F('id') + (state.last_sequence + 1 - first))
+        state.last_sequence = ChangeLogEntry.objects.aggregate(last=Max('sequence'))['last']
+        state.save(update_fields=['last_sequence'])
+        return numbered
+
+
+def current_state():
+    """Committed numbering and pruning positions, read without locking"""
+    return ChangeLogState.objects.filter(pk=STATE_ID).first() or ChangeLogState(pk=STATE_ID)
+
+
+def latest_cursor():
+    return encode_cursor(current_state().last_sequence)
+
+
+def changes_for(user, after=None, limit=200):
+    """
+    Up to ``limit`` entries after sequence ``after`` visible to ``user``.
+
+    ``after=None`` starts at the oldest retained entry. Returns
+    ``(entries, has_more, last_sequence)``; ``last_sequence`` is where a
+    client that has seen everything may resume.
+    """
+    state = current_state()
+    if after is None:
+        after = state.pruned_through
+    elif after < state.pruned_through:
+        raise CursorExpired()
+
+    visible_documents = Document.objects.all_with_deleted().filter(
+        Q(status='published') | Q(created_by=user) | Q(access_permissions__user=user)
+    ).values('id')
+    entries = list(
+        ChangeLogEntry.objects.filter(sequence__gt=after, sequence__lte=state.last_sequence)
+        .filter(Q(audience_id=user.pk) | Q(document_id__in=visible_documents))
+        .order_by('sequence')[:limit + 1]
+    )
+    return entries[:limit], len(entries) > limit, state.last_sequence
+
+
+@transaction.atomic
+def prune(before):
+    """Delete numbered entries older than ``before`` and move the watermark past them"""
+    sequence_entries()
+    state = ChangeLogState.objects.select_for_update().get(pk=STATE_ID)
+    stale = ChangeLogEntry.objects.filter(changed_at__lt=before, sequence__isnull=False)
+    pruned_through = stale.aggregate(latest=Max('sequence'))['latest']
+    if pruned_through is None:
+        return 0
+    deleted, _ = ChangeLogEntry.objects.filter(sequence__lte=pruned_through).delete()
+    state.pruned_through = max(pruned_through, state.pruned_through)
+    state.save(update_fields=['pruned_through'])
+    return deleted
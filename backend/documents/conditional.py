@@ -0,0 +1,76 @@
+"""
+Conditional GET (ETag / Last-Modified) for the document APIs.
+
+Validators are computed before any serialization: the list uses one
+aggregate (latest ``updated_at`` and row count) over the visible, filtered
+queryset, the detail view uses the per-document cache stamp. Both also hash
+the requesting user's grants, since ``can_edit`` / ``can_delete`` are part
+of the payload. A match returns ``304 Not Modified`` straight away.
+
+Only ``If-None-Match`` is answered with a 304. ``Last-Modified`` is sent for
+information, but ``updated_at`` has one-second resolution and does not move
+on sharing changes or deletions, so ``If-Modified-Since`` alone always gets
+the full body.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .caching import document_stamp
+from .permissions import permissions_for
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def _grants_digest(request):
+    grants = permissions_for(request).grants
+    return hashlib.md5(repr(sorted(grants.items())).encode('utf-8')).hexdigest()
+
+
+def list_validators(request, queryset):
+    """(etag, last_modified) for a filtered document queryset"""
+    summary = queryset.order_by().aggregate(latest=Max('updated_at'), total=Count('id', distinct=True))
+    latest = summary['latest']
+    etag = make_etag(
+        request.user.pk,
+        sorted(request.query_params.lists()),
+        latest.isoformat() if latest else '',
+        summary['total'],
+        _grants_digest(request),
+    )
+    return etag, latest
+
+
+def document_validators(request, document):
+    """(etag, last_modified) for a single document"""
+    etag = make_etag(
+        document.pk,
+        document_stamp(document.pk),
+        document.updated_at.isoformat(),
+        request.build_absolute_uri('/'),
+        _grants_digest(request),
+    )
+    return etag, document.updated_at
+
+
+def not_modified(request, etag):
+    """A 304 response if the request's If-None-Match matches ``etag``, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_validators(response, etag)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add ETag / Last-Modified and make clients revalidate every time"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -1,6 +1,8 @@
 import django_filters
 from django.db.models import Q
+from rest_framework import filters
 from .models import Document
+from .search import similar_documents
 
 class DocumentFilter(django_filters.FilterSet):
     created_date_from = django_filters.DateFilter(field_name="created_at", lookup_expr="gte")
@@ -17,3 +19,23 @@ class DocumentFilter(django_filters.FilterSet):
         if value:
             return queryset.filter(current_version__file_type__iexact=value)
         return queryset
+
+
+class DocumentSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter with an optional similarity mode.
+
+    ``?search=...&search_mode=similar`` ranks documents by trigram similarity of
+    the title (typo tolerant) instead of plain substring matching. It runs after
+    OrderingFilter so the similarity rank leads and the requested ordering
+    breaks ties.
+    """
+    search_mode_param = 'search_mode'
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.search_mode_param) == 'similar':
+            query = request.query_params.get(self.search_param, '').strip()
+            if query:
+                return similar_documents(queryset, query)
+            return queryset
+        return super().filter_queryset(request, queryset, view)
@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
+from django.conf import settings
 from documents.models import Document
 from audit.models import AuditLog
 
@@ -12,8 +11,8 @@ class Command(BaseCommand):
         parser.add_argument(
             '--grace-period',
             type=int,
-            default=30,
-            help='Grace period in days (default: 30)',
+            default=settings.TRASH_GRACE_PERIOD_DAYS,
+            help=f'Grace period in days (default: {settings.TRASH_GRACE_PERIOD_DAYS})',
         )
         parser.add_argument(
             '--dry-run',
@@ -25,13 +24,8 @@ class Command(BaseCommand):
         grace_period_days = options['grace_period']
         dry_run = options['dry_run']
         
-        # Calculate the cutoff date
-        cutoff_date = timezone.now() - timedelta(days=grace_period_days)
-        
         # Find documents deleted before the cutoff date
-        expired_documents = Document.objects.deleted_only().filter(
-            deleted_at__lt=cutoff_date
-        )
+        expired_documents = Document.objects.expired_trash(grace_period_days)
         
         count = expired_documents.count()
         
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.22 on 2026-10-19 00:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def initialise_usage_counts(apps, schema_editor):
+    Tag = apps.get_model('documents', 'Tag')
+    Document = apps.get_model('documents', 'Document')
+    through = Document.tags.through
+    live_count = (
+        through.objects.filter(tag_id=OuterRef('pk'), document__is_deleted=False)
+        .order_by()
+        .values('tag_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Tag.objects.update(usage_count=Coalesce(Subquery(live_count, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of non-deleted documents using this tag (maintained by signals)'),
+        ),
+        migrations.RunPython(initialise_usage_counts, migrations.RunPython.noop),
+    ]
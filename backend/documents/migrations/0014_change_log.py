@@ -0,0 +1,28 @@
+# Generated by Django 4.2.22 on 2026-10-19 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_tag_usage_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(choices=[('document', 'Document'), ('version', 'Version'), ('tag', 'Tag'), ('access', 'Access')], max_length=10)),
+                ('resource_id', models.CharField(max_length=64)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('document_id', models.UUIDField(blank=True, db_index=True, null=True)),
+                ('audience_id', models.BigIntegerField(blank=True, db_index=True, help_text='User who always sees this change (owner of the resource or grantee)', null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.22 on 2026-10-19 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def initialise_storage_usage(apps, schema_editor):
+    DocumentVersion = apps.get_model('documents', 'DocumentVersion')
+    StorageUsage = apps.get_model('documents', 'StorageUsage')
+    DocumentStorageUsage = apps.get_model('documents', 'DocumentStorageUsage')
+    versions = DocumentVersion.objects.filter(Q(file__isnull=False) & ~Q(file='')).order_by()
+
+    DocumentStorageUsage.objects.bulk_create([
+        DocumentStorageUsage(document_id=row['document_id'], bytes_used=row['total'], files_count=row['files'])
+        for row in versions.values('document_id').annotate(total=Sum('file_size'), files=Count('id'))
+    ], batch_size=1000)
+    StorageUsage.objects.bulk_create([
+        StorageUsage(user_id=row['document__created_by'], bytes_used=row['total'], files_count=row['files'])
+        for row in versions.values('document__created_by').annotate(total=Sum('file_size'), files=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0014_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bytes_used', models.BigIntegerField(default=0)),
+                ('files_count', models.IntegerField(default=0)),
+                ('quota_bytes', models.BigIntegerField(blank=True, help_text='Overrides STORAGE_QUOTA_BYTES for this user; empty uses the default', null=True)),
+                ('quota_files', models.IntegerField(blank=True, help_text='Overrides STORAGE_QUOTA_FILES for this user; empty uses the default', null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='storage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Storage usage',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentStorageUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bytes_used', models.BigIntegerField(default=0)),
+                ('files_count', models.IntegerField(default=0)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='storage', to='documents.document')),
+            ],
+        ),
+        migrations.RunPython(initialise_storage_usage, migrations.RunPython.noop),
+    ]
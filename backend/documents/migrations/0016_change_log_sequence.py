@@ -0,0 +1,33 @@
+# Generated by Django 4.2.22 on 2026-10-19 02:17
+
+from django.db import migrations, models
+
+
+def create_change_log_state(apps, schema_editor):
+    """Existing entries are numbered by the first numbering run"""
+    ChangeLogState = apps.get_model('documents', 'ChangeLogState')
+    ChangeLogState.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0015_storage_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sequence', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0, help_text='Highest sequence deleted by pruning; older cursors must resync')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Feed position, assigned after the entry is committed (see documents.changes)', null=True, unique=True),
+        ),
+        migrations.RunPython(create_change_log_state, migrations.RunPython.noop),
+    ]
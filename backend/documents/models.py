@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.text import slugify
+from datetime import timedelta
 import uuid
 import os
 import shortuuid
@@ -52,6 +55,46 @@ class DocumentManager(models.Manager):
         """Return only deleted documents"""
         return super().get_queryset().filter(is_deleted=True)
 
+    def expired_trash(self, grace_period_days):
+        """Return deleted documents whose trash grace period has run out"""
+        cutoff_date = timezone.now() - timedelta(days=grace_period_days)
+        return self.deleted_only().filter(deleted_at__lt=cutoff_date)
+
+
+class TagQuerySet(models.QuerySet):
+    """QuerySet helpers for tag usage counts"""
+    
+    def with_documents_count(self):
+        """
+        Annotate ``documents_count`` (non-deleted documents using the tag).
+        
+        Uses the maintained ``usage_count`` column when TAG_USAGE_COUNTS is
+        'counter', otherwise a COUNT over the tag/document join.
+        """
+        if settings.TAG_USAGE_COUNTS == 'counter':
+            return self.annotate(documents_count=models.F('usage_count'))
+        return self.annotate(
+            documents_count=models.Count(
+                'documents',
+                filter=models.Q(documents__is_deleted=False),
+                distinct=True,
+            )
+        )
+    
+    def refresh_usage_counts(self):
+        """Recompute ``usage_count`` for every tag in the queryset with one UPDATE"""
+        through = Document.tags.through
+        live_count = (
+            through.objects.filter(tag_id=models.OuterRef('pk'), document__is_deleted=False)
+            .order_by()
+            .values('tag_id')
+            .annotate(total=models.Count('*'))
+            .values('total')
+        )
+        return self.update(
+            usage_count=Coalesce(models.Subquery(live_count, output_field=models.IntegerField()), 0)
+        )
+
 
 class Tag(models.Model):
     """Tag model for document categorization with key-value support"""
@@ -60,6 +103,13 @@ class Tag(models.Model):
     color = models.CharField(max_length=7, default='#007bff')  # Hex color
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tags')
+    usage_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of non-deleted documents using this tag (maintained by signals)"
+    )
+    
+    objects = TagQuerySet.as_manager()
     
     class Meta:
         ordering = ['key', 'value']
@@ -130,6 +180,13 @@ class Document(models.Model):
         ordering = ['-updated_at']
         unique_together = ['title', 'created_by']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets post_save tell a soft delete / restore from other edits (None if deferred)
+        instance._saved_is_deleted = instance.__dict__.get('is_deleted')
+        return instance
+
     def soft_delete(self, user):
         """Soft delete the document"""
         self.is_deleted = True
@@ -388,3 +445,83 @@ class DocumentAccess(models.Model):
     
     def __str__(self):
         return f"{self.user.email} - {self.document.title} ({self.permission})"
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only record of changes, read by the client sync feed"""
+    RESOURCE_CHOICES = [
+        ('document', 'Document'),
+        ('version', 'Version'),
+        ('tag', 'Tag'),
+        ('access', 'Access'),
+    ]
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    resource_type = models.CharField(max_length=10, choices=RESOURCE_CHOICES)
+    resource_id = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Not foreign keys: tombstones must outlive the rows they describe
+    document_id = models.UUIDField(null=True, blank=True, db_index=True)
+    audience_id = models.BigIntegerField(
+        null=True, blank=True, db_index=True,
+        help_text="User who always sees this change (owner of the resource or grantee)"
+    )
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    sequence = models.BigIntegerField(
+        null=True, blank=True, unique=True, editable=False,
+        help_text="Feed position, assigned after the entry is committed (see documents.changes)"
+    )
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"#{self.id} {self.resource_type} {self.resource_id} {self.action}"
+
+
+class ChangeLogState(models.Model):
+    """Single row: how far the change log has been numbered and pruned"""
+    last_sequence = models.BigIntegerField(default=0)
+    pruned_through = models.BigIntegerField(
+        default=0,
+        help_text="Highest sequence deleted by pruning; older cursors must resync"
+    )
+    
+    def __str__(self):
+        return f"Change log numbered through {self.last_sequence}, pruned through {self.pruned_through}"
+
+
+class StorageUsage(models.Model):
+    """Bytes and files a user stores, maintained as versions are created and deleted"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='storage')
+    bytes_used = models.BigIntegerField(default=0)
+    files_count = models.IntegerField(default=0)
+    quota_bytes = models.BigIntegerField(
+        null=True, blank=True,
+        help_text="Overrides STORAGE_QUOTA_BYTES for this user; empty uses the default"
+    )
+    quota_files = models.IntegerField(
+        null=True, blank=True,
+        help_text="Overrides STORAGE_QUOTA_FILES for this user; empty uses the default"
+    )
+    
+    class Meta:
+        verbose_name_plural = 'Storage usage'
+    
+    def __str__(self):
+        return f"{self.user.email}: {self.bytes_used} bytes in {self.files_count} files"
+
+
+class DocumentStorageUsage(models.Model):
+    """Bytes and files stored across all versions of a document"""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='storage')
+    bytes_used = models.BigIntegerField(default=0)
+    files_count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.document.title}: {self.bytes_used} bytes in {self.files_count} files"
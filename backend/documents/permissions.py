@@ -0,0 +1,109 @@
+"""
+Document permission checks.
+
+A user's access grants (DocumentAccess rows) are loaded once into a
+``{document_id: permission}`` map, cached in Redis and memoized on the
+request, so every ``can_*`` check afterwards is a dictionary lookup. The
+cached map is dropped whenever one of the user's grants changes (see
+``signals.py`` and the bulk share action).
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DocumentAccess
+
+GRANTS_KEY = 'document_grants:{user_id}'
+GRANTS_TIMEOUT = 60 * 60  # 1 hour
+
+READ_PERMISSIONS = ('read', 'write', 'admin')
+WRITE_PERMISSIONS = ('write', 'admin')
+
+
+def invalidate_user_grants(*user_ids):
+    """Drop the cached grant maps now and again once the transaction commits"""
+    keys = [GRANTS_KEY.format(user_id=user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def load_user_grants(user_id):
+    key = GRANTS_KEY.format(user_id=user_id)
+    grants = cache.get(key)
+    if grants is None:
+        grants = {
+            str(document_id): permission
+            for document_id, permission in DocumentAccess.objects.filter(user_id=user_id)
+            .values_list('document_id', 'permission')
+        }
+        cache.set(key, grants, GRANTS_TIMEOUT)
+    return grants
+
+
+async def aload_user_grants(user_id):
+    """``load_user_grants`` for async views"""
+    key = GRANTS_KEY.format(user_id=user_id)
+    grants = await cache.aget(key)
+    if grants is None:
+        grants = {
+            str(document_id): permission
+            async for document_id, permission in DocumentAccess.objects.filter(user_id=user_id)
+            .values_list('document_id', 'permission')
+        }
+        await cache.aset(key, grants, GRANTS_TIMEOUT)
+    return grants
+
+
+class DocumentPermissions:
+    """Answers what one user may do with a document"""
+
+    def __init__(self, user):
+        self.user = user
+        self._grants = None
+
+    @property
+    def grants(self):
+        if self._grants is None:
+            if self.user.is_authenticated:
+                self._grants = load_user_grants(self.user.pk)
+            else:
+                self._grants = {}
+        return self._grants
+
+    async def aload(self):
+        """Load the grants without blocking; the ``can_*`` checks are then lookups"""
+        if self._grants is None and self.user.is_authenticated:
+            self._grants = await aload_user_grants(self.user.pk)
+        return self
+
+    def permission(self, document):
+        """The user's granted permission on the document, or None"""
+        return self.grants.get(str(document.pk))
+
+    def is_owner(self, document):
+        return self.user.is_authenticated and document.created_by_id == self.user.pk
+
+    def can_read(self, document, include_published=True):
+        if self.is_owner(document):
+            return True
+        if include_published and document.status == 'published':
+            return True
+        return self.permission(document) in READ_PERMISSIONS
+
+    def can_write(self, document):
+        return self.is_owner(document) or self.permission(document) in WRITE_PERMISSIONS
+
+    def can_admin(self, document):
+        return self.is_owner(document) or self.permission(document) == 'admin'
+
+
+def permissions_for(request):
+    """The DocumentPermissions of the request's user, built once per request"""
+    if request is None:
+        from django.contrib.auth.models import AnonymousUser
+        return DocumentPermissions(AnonymousUser())
+    permissions = getattr(request, '_document_permissions', None)
+    if permissions is None or permissions.user is not request.user:
+        permissions = DocumentPermissions(request.user)
+        request._document_permissions = permissions
+    return permissions
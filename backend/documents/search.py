@@ -0,0 +1,91 @@
+"""
+Similarity-ranked lookups for tags and document titles.
+
+On PostgreSQL these use pg_trgm similarity operators, which are served by the
+GIN trigram indexes created in migration 0012 and tolerate typos. Other
+databases (the SQLite test database) fall back to substring matching plus a
+difflib pass over the candidate values to catch near misses.
+"""
+import difflib
+
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+# Upper bound on distinct values scanned by the non-PostgreSQL typo fallback
+FALLBACK_CANDIDATE_LIMIT = 5000
+FALLBACK_CUTOFF = 0.75
+
+
+def trigram_search_available():
+    return connection.vendor == 'postgresql'
+
+
+def _close_matches(query, candidates):
+    """Candidates within typo distance of the query (case-insensitive)"""
+    lowered = {}
+    for candidate in candidates:
+        if candidate:
+            lowered.setdefault(candidate.lower(), []).append(candidate)
+    matches = difflib.get_close_matches(query.lower(), list(lowered), n=50, cutoff=FALLBACK_CUTOFF)
+    return [original for match in matches for original in lowered[match]]
+
+
+def _fallback_rank(field, query):
+    return Case(
+        When(**{f'{field}__iexact': query}, then=Value(3)),
+        When(**{f'{field}__istartswith': query}, then=Value(2)),
+        When(**{f'{field}__icontains': query}, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def similar_tags(queryset, query):
+    """Tags whose key or value resembles ``query``, annotated with ``rank``"""
+    if trigram_search_available():
+        return queryset.annotate(
+            rank=Greatest(
+                TrigramSimilarity('key', query),
+                TrigramSimilarity('value', query),
+                TrigramWordSimilarity(query, 'key'),
+                TrigramWordSimilarity(query, 'value'),
+            )
+        ).filter(
+            Q(key__trigram_similar=query)
+            | Q(value__trigram_similar=query)
+            | Q(key__trigram_word_similar=query)
+            | Q(value__trigram_word_similar=query)
+        )
+
+    candidates = set(queryset.values_list('key', flat=True)[:FALLBACK_CANDIDATE_LIMIT])
+    candidates |= set(queryset.values_list('value', flat=True)[:FALLBACK_CANDIDATE_LIMIT])
+    close = _close_matches(query, candidates)
+    return queryset.annotate(
+        rank=Greatest(_fallback_rank('key', query), _fallback_rank('value', query))
+    ).filter(
+        Q(key__icontains=query) | Q(value__icontains=query)
+        | Q(key__in=close) | Q(value__in=close)
+    )
+
+
+def similar_documents(queryset, query):
+    """Documents whose title resembles ``query``, best matches first"""
+    existing_ordering = list(queryset.query.order_by)
+
+    if trigram_search_available():
+        queryset = queryset.annotate(
+            similarity=Greatest(
+                TrigramSimilarity('title', query),
+                TrigramWordSimilarity(query, 'title'),
+            )
+        ).filter(Q(title__trigram_similar=query) | Q(title__trigram_word_similar=query))
+    else:
+        candidates = queryset.values_list('title', flat=True)[:FALLBACK_CANDIDATE_LIMIT]
+        close = _close_matches(query, candidates)
+        queryset = queryset.annotate(
+            similarity=_fallback_rank('title', query)
+        ).filter(Q(title__icontains=query) | Q(title__in=close))
+
+    return queryset.order_by('-similarity', *existing_ordering)
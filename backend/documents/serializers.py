@@ -1,13 +1,16 @@
 from rest_framework import serializers
 from .models import Document, DocumentVersion, Tag, DocumentAccess
-from accounts.serializers import UserProfileSerializer
+from .permissions import permissions_for
+from .bulk import BULK_MAX_DOCUMENTS, DOCUMENT_ACTIONS, TAG_OPERATIONS
+from .usage import QuotaExceeded, check_quota
+from accounts.summaries import UserSummaryField
 
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for Tag model with key-value support"""
     documents_count = serializers.SerializerMethodField()
     display_name = serializers.ReadOnlyField()
-    created_by = UserProfileSerializer(read_only=True)
+    created_by = UserSummaryField()
     
     class Meta:
         model = Tag
@@ -15,7 +18,11 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'created_by')
     
     def get_documents_count(self, obj):
-        return obj.documents.count()
+        # Annotated by Tag.objects.with_documents_count() on list querysets
+        count = getattr(obj, 'documents_count', None)
+        if count is None:
+            count = obj.usage_count
+        return count
     
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
@@ -30,7 +37,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 class DocumentVersionSerializer(serializers.ModelSerializer):
     """Serializer for DocumentVersion model"""
-    created_by = UserProfileSerializer(read_only=True)
+    created_by = UserSummaryField()
     file_url = serializers.SerializerMethodField()
     reason = serializers.CharField(read_only=True)
     
@@ -51,8 +58,8 @@ class DocumentVersionSerializer(serializers.ModelSerializer):
 
 class DocumentAccessSerializer(serializers.ModelSerializer):
     """Serializer for DocumentAccess model"""
-    user = UserProfileSerializer(read_only=True)
-    granted_by = UserProfileSerializer(read_only=True)
+    user = UserSummaryField()
+    granted_by = UserSummaryField()
     
     class Meta:
         model = DocumentAccess
@@ -62,7 +69,7 @@ class DocumentAccessSerializer(serializers.ModelSerializer):
 
 class DocumentListSerializer(serializers.ModelSerializer):
     """Serializer for Document list view"""
-    created_by = UserProfileSerializer(read_only=True)
+    created_by = UserSummaryField()
     tags = serializers.SerializerMethodField()  # Get from current version
     file_url = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
@@ -110,29 +117,16 @@ class DocumentListSerializer(serializers.ModelSerializer):
     def get_tags(self, obj):
         """Get tags from current version, fallback to document tags"""
         if obj.current_version:
-            return TagSerializer(obj.current_version.tags.all(), many=True).data
-        return TagSerializer(obj.tags.all(), many=True).data
+            return TagSerializer(obj.current_version.tags.all(), many=True, context=self.context).data
+        return TagSerializer(obj.tags.all(), many=True, context=self.context).data
     
     def get_can_edit(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        
-        # Owner can always edit
-        if obj.created_by == request.user:
-            return True
-        
-        # Check document access permissions
-        access = obj.access_permissions.filter(
-            user=request.user,
-            permission__in=['write', 'admin']
-        ).first()
-        return bool(access)
+        return permissions_for(self.context.get('request')).can_write(obj)
 
 
 class DocumentDetailSerializer(serializers.ModelSerializer):
     """Serializer for Document detail view"""
-    created_by = UserProfileSerializer(read_only=True)
+    created_by = UserSummaryField()
     tags = serializers.SerializerMethodField()  # Get from current version
     tag_ids = serializers.ListField(
         child=serializers.IntegerField(),
@@ -191,8 +185,8 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
     def get_tags(self, obj):
         """Get tags from current version, fallback to document tags"""
         if obj.current_version:
-            return TagSerializer(obj.current_version.tags.all(), many=True).data
-        return TagSerializer(obj.tags.all(), many=True).data
+            return TagSerializer(obj.current_version.tags.all(), many=True, context=self.context).data
+        return TagSerializer(obj.tags.all(), many=True, context=self.context).data
     
     def to_representation(self, instance):
         """Override to provide custom title/description from current version"""
@@ -215,42 +209,13 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
         return None
     
     def get_can_edit(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        
-        if obj.created_by == request.user:
-            return True
-        
-        access = obj.access_permissions.filter(
-            user=request.user,
-            permission__in=['write', 'admin']
-        ).first()
-        return bool(access)
+        return permissions_for(self.context.get('request')).can_write(obj)
     
     def get_can_delete(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        
-        if obj.created_by == request.user:
-            return True
-        
-        access = obj.access_permissions.filter(
-            user=request.user,
-            permission='admin'
-        ).first()
-        return bool(access)
+        return permissions_for(self.context.get('request')).can_admin(obj)
     
     def get_can_view(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return (
-            obj.created_by == request.user or
-            obj.status == 'published' or
-            obj.access_permissions.filter(user=request.user).exists()
-        )
+        return permissions_for(self.context.get('request')).can_read(obj)
 
     def update(self, instance, validated_data):
         tag_ids = validated_data.pop('tag_ids', None)
@@ -320,6 +285,13 @@ class DocumentCreateSerializer(serializers.ModelSerializer):
                 f'File type not supported. Allowed types: {", ".join(allowed_extensions)}'
             )
         
+        request = self.context.get('request')
+        if request is not None:
+            try:
+                check_quota(request.user.pk, value.size)
+            except QuotaExceeded as e:
+                raise serializers.ValidationError(str(e))
+        
         return value
     
     def validate_tags_data(self, value):
@@ -422,6 +394,14 @@ class DocumentVersionCreateSerializer(serializers.ModelSerializer):
         # If not inheriting metadata, title is required
         if not inherit_metadata and not data.get('title'):
             raise serializers.ValidationError({'title': 'Title is required when not inheriting metadata.'})
+        
+        # Versions count against the document owner's quota
+        document = self.context.get('document')
+        if document is not None and data.get('file'):
+            try:
+                check_quota(document.created_by_id, data['file'].size)
+            except QuotaExceeded as e:
+                raise serializers.ValidationError({'file': str(e)})
                 
         return data
     
@@ -454,6 +434,57 @@ class DocumentVersionCreateSerializer(serializers.ModelSerializer):
         return new_version
 
 
+class BulkTagSerializer(serializers.Serializer):
+    """Serializer for bulk tag operations across documents"""
+    document_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=BULK_MAX_DOCUMENTS
+    )
+    operation = serializers.ChoiceField(choices=TAG_OPERATIONS)
+    tag_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=True
+    )
+    
+    def validate(self, data):
+        if data['operation'] != 'replace' and not data['tag_ids']:
+            raise serializers.ValidationError({'tag_ids': 'At least one tag is required.'})
+        requested = set(data['tag_ids'])
+        owned = set(
+            Tag.objects.filter(id__in=requested, created_by=self.context['request'].user)
+            .values_list('id', flat=True)
+        )
+        unknown = sorted(requested - owned)
+        if unknown:
+            raise serializers.ValidationError({'tag_ids': f'Unknown tags: {unknown}'})
+        return data
+
+
+class BulkDocumentActionSerializer(serializers.Serializer):
+    """Serializer for bulk document actions, selected by ids or by filter"""
+    action = serializers.ChoiceField(choices=DOCUMENT_ACTIONS)
+    document_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=False,
+        max_length=BULK_MAX_DOCUMENTS
+    )
+    filters = serializers.DictField(required=False)
+    status = serializers.ChoiceField(choices=Document.STATUS_CHOICES, required=False)
+    email = serializers.EmailField(required=False)
+    permission = serializers.ChoiceField(choices=DocumentAccess.PERMISSION_CHOICES, default='read')
+    
+    def validate(self, data):
+        if ('document_ids' in data) == ('filters' in data):
+            raise serializers.ValidationError('Provide either document_ids or filters.')
+        if data['action'] == 'set_status' and not data.get('status'):
+            raise serializers.ValidationError({'status': 'Status is required for set_status.'})
+        if data['action'] == 'share' and not data.get('email'):
+            raise serializers.ValidationError({'email': 'Email is required for share.'})
+        return data
+
+
 class DocumentRollbackSerializer(serializers.Serializer):
     """Serializer for document rollback operations"""
     version_id = serializers.UUIDField(required=True)
@@ -487,7 +518,7 @@ class DocumentRollbackSerializer(serializers.Serializer):
 
 class DocumentVersionHistorySerializer(serializers.ModelSerializer):
     """Serializer for document version history"""
-    created_by = UserProfileSerializer(read_only=True)
+    created_by = UserSummaryField()
     tags = TagSerializer(many=True, read_only=True)
     file_url = serializers.SerializerMethodField()
     is_current = serializers.SerializerMethodField()
@@ -0,0 +1,251 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from backend import events, metrics
+
+from . import changes, usage
+from .caching import invalidate_documents, invalidate_tag_suggestions
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+from .permissions import invalidate_user_grants
+
+
+def _documents_using_tag(tag):
+    return list(
+        Document.objects.all_with_deleted()
+        .filter(Q(tags=tag) | Q(versions__tags=tag))
+        .values_list('id', flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Tag created, renamed or deleted"""
+    invalidate_tag_suggestions(instance.created_by_id)
+    if not kwargs.get('created'):
+        document_ids = getattr(instance, '_document_ids', None)
+        if document_ids is None:
+            document_ids = _documents_using_tag(instance)
+        invalidate_documents(*document_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    """Remember the documents before the cascade drops the through rows"""
+    instance._document_ids = _documents_using_tag(instance)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, **kwargs):
+    """Soft delete / restore changes which of the owner's tags are live"""
+    invalidate_tag_suggestions(instance.created_by_id)
+    if not created:
+        invalidate_documents(instance.pk)
+        # Counts only depend on is_deleted; title or status edits leave them alone
+        if getattr(instance, '_saved_is_deleted', None) != instance.is_deleted:
+            Tag.objects.filter(documents=instance).refresh_usage_counts()
+    instance._saved_is_deleted = instance.is_deleted
+
+
+@receiver(pre_delete, sender=Document)
+def document_deleting(sender, instance, **kwargs):
+    """Remember the tags before the cascade drops the through rows"""
+    instance._usage_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    invalidate_documents(instance.pk)
+    tag_ids = getattr(instance, '_usage_tag_ids', None)
+    if tag_ids:
+        Tag.objects.filter(id__in=tag_ids).refresh_usage_counts()
+
+
+@receiver(post_save, sender=DocumentVersion)
+@receiver(post_delete, sender=DocumentVersion)
+def version_changed(sender, instance, **kwargs):
+    """Versions are part of the document payload"""
+    invalidate_documents(instance.document_id)
+
+
+@receiver(post_save, sender=DocumentAccess)
+@receiver(post_delete, sender=DocumentAccess)
+def access_changed(sender, instance, **kwargs):
+    """Document shared, re-permissioned or unshared"""
+    invalidate_documents(instance.document_id)
+    invalidate_user_grants(instance.user_id)
+
+
+@receiver(m2m_changed, sender=DocumentVersion.tags.through)
+def version_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags attached to or removed from versions"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_documents(instance.document_id)
+    elif pk_set:
+        invalidate_documents(
+            *DocumentVersion.objects.filter(pk__in=pk_set).values_list('document_id', flat=True)
+        )
+    else:
+        invalidate_documents(*_documents_using_tag(instance))
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def document_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags attached to or removed from documents"""
+    if action == 'pre_clear':
+        if reverse:
+            instance._document_ids = list(instance.documents.values_list('id', flat=True))
+        else:
+            instance._usage_tag_ids = list(instance.tags.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # instance is a Tag, pk_set holds document ids
+        Tag.objects.filter(pk=instance.pk).refresh_usage_counts()
+        invalidate_tag_suggestions(instance.created_by_id)
+        invalidate_documents(*(pk_set or getattr(instance, '_document_ids', None) or []))
+        return
+
+    invalidate_documents(instance.pk)
+    if action == 'post_clear':
+        tag_ids = getattr(instance, '_usage_tag_ids', None) or []
+    else:
+        tag_ids = pk_set or []
+    if tag_ids:
+        Tag.objects.filter(pk__in=tag_ids).refresh_usage_counts()
+
+    owners = [instance.created_by_id]
+    if pk_set:
+        owners += Tag.objects.filter(pk__in=pk_set).values_list('created_by_id', flat=True).distinct()
+    invalidate_tag_suggestions(*owners)
+
+
+# Change log for the sync feed
+
+def _saved_action(created):
+    return 'created' if created else 'updated'
+
+
+@receiver(post_save, sender=Document)
+def log_document_saved(sender, instance, created, **kwargs):
+    action = 'deleted' if instance.is_deleted else _saved_action(created)
+    changes.record(changes.document_entry(instance, action))
+
+
+@receiver(post_delete, sender=Document)
+def log_document_deleted(sender, instance, **kwargs):
+    changes.record(changes.document_entry(instance, 'deleted'))
+
+
+@receiver(post_save, sender=DocumentVersion)
+def log_version_saved(sender, instance, created, **kwargs):
+    changes.record(changes.entry(
+        'version', instance.pk, _saved_action(created), document_id=instance.document_id
+    ))
+
+
+@receiver(post_delete, sender=DocumentVersion)
+def log_version_deleted(sender, instance, **kwargs):
+    changes.record(changes.entry('version', instance.pk, 'deleted', document_id=instance.document_id))
+
+
+@receiver(post_save, sender=Tag)
+def log_tag_saved(sender, instance, created, **kwargs):
+    changes.record(changes.entry(
+        'tag', instance.pk, _saved_action(created), audience_id=instance.created_by_id
+    ))
+
+
+@receiver(post_delete, sender=Tag)
+def log_tag_deleted(sender, instance, **kwargs):
+    changes.record(changes.entry('tag', instance.pk, 'deleted', audience_id=instance.created_by_id))
+
+
+@receiver(post_save, sender=DocumentAccess)
+def log_access_saved(sender, instance, created, **kwargs):
+    changes.record(changes.entry(
+        'access', instance.pk, _saved_action(created),
+        document_id=instance.document_id, audience_id=instance.user_id
+    ))
+
+
+@receiver(post_delete, sender=DocumentAccess)
+def log_access_deleted(sender, instance, **kwargs):
+    changes.record(changes.entry(
+        'access', instance.pk, 'deleted', document_id=instance.document_id, audience_id=instance.user_id
+    ))
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def log_document_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        changes.record(changes.document_entry(instance, 'updated'))
+        return
+    document_ids = pk_set or getattr(instance, '_document_ids', None) or []
+    changes.record(*[
+        changes.document_entry(document, 'updated')
+        for document in Document.objects.all_with_deleted().filter(pk__in=document_ids).only('id', 'created_by_id')
+    ])
+
+
+@receiver(m2m_changed, sender=DocumentVersion.tags.through)
+def log_version_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        changes.record(changes.entry('version', instance.pk, 'updated', document_id=instance.document_id))
+        return
+    versions = DocumentVersion.objects.filter(pk__in=pk_set or [])
+    changes.record(*[
+        changes.entry('version', version_id, 'updated', document_id=document_id)
+        for version_id, document_id in versions.values_list('id', 'document_id')
+    ])
+
+
+# Storage usage counters
+
+@receiver(post_save, sender=DocumentVersion)
+def count_version_storage(sender, instance, created, **kwargs):
+    if created:
+        usage.version_stored(instance)
+        size = instance.file_size or 0
+        transaction.on_commit(lambda: metrics.UPLOAD_BYTES.inc(size))
+
+
+@receiver(post_delete, sender=DocumentVersion)
+def uncount_version_storage(sender, instance, **kwargs):
+    usage.version_stored(instance, removed=True)
+
+
+# Live events for the SSE stream
+
+@receiver(post_save, sender=DocumentVersion)
+def publish_version_created(sender, instance, created, **kwargs):
+    if not created or not events.enabled():
+        return
+    document = instance.document
+    audience = [document.created_by_id, instance.created_by_id]
+    audience += DocumentAccess.objects.filter(document_id=document.pk).values_list('user_id', flat=True)
+    events.publish(audience, 'version.created', {
+        'document_id': document.pk,
+        'version_id': instance.pk,
+        'version_number': instance.version_number,
+    })
+
+
+@receiver(post_save, sender=DocumentAccess)
+def publish_document_shared(sender, instance, **kwargs):
+    events.publish([instance.user_id], 'document.shared', {
+        'document_ids': [instance.document_id],
+        'permission': instance.permission,
+        'granted_by': instance.granted_by_id,
+    })
@@ -1,7 +1,14 @@
 from celery import shared_task
 import time
 import redis
+import logging
 from django.conf import settings
+from backend.maintenance import maintenance_job
+
+logger = logging.getLogger(__name__)
+
+# How often long jobs report progress to the user's event stream
+PROGRESS_EVERY = 100
 
 @shared_task
 def add(x, y):
@@ -61,4 +68,217 @@ def long_running_task(task_name):
         time.sleep(1)
     
     print(f"Completed long task: {task_name}")
-    return f"Task {task_name} completed successfully" 
\ No newline at end of file
+    return f"Task {task_name} completed successfully" 
+
+# Periodic maintenance jobs (scheduled through CELERY_BEAT_SCHEDULE)
+
+def sync_tags_for_documents(documents, progress=None):
+    """
+    Push each document's tags to its current file in S3.
+
+    ``progress(done, updated, failed)`` is called every ``PROGRESS_EVERY``
+    documents.
+    """
+    from s3_file_manager import update_s3_object_tags
+
+    updated = 0
+    failed = []
+    for done, doc in enumerate(documents, start=1):
+        version = doc.current_version
+        tags_qs = version.tags.all() if version else doc.tags.all()
+        tags_dict = {tag.key: tag.value for tag in tags_qs}
+        try:
+            if update_s3_object_tags(doc.file.name, tags_dict):
+                updated += 1
+            else:
+                failed.append(str(doc.id))
+        except Exception:
+            failed.append(str(doc.id))
+        if progress and done % PROGRESS_EVERY == 0:
+            progress(done, updated, len(failed))
+    return {'updated': updated, 'failed': failed}
+
+
+@shared_task
+def sync_document_tags(document_ids, user_id=None, job_id=None):
+    """
+    Push S3 tags for a batch of documents (queued by bulk tag operations).
+
+    With ``user_id`` and ``job_id`` the user gets ``job.progress`` and
+    ``job.finished`` events on their event stream.
+    """
+    from backend import events
+    from .models import Document
+
+    def progress(done, updated, failed):
+        events.publish([user_id], 'job.progress', {
+            'job_id': job_id, 'kind': 'tag_sync', 'total': len(document_ids),
+            'done': done, 'updated': updated, 'failed': failed,
+        })
+
+    if not settings.USE_S3:
+        result = {'updated': 0, 'failed': [], 'skipped': 'S3 storage disabled'}
+    else:
+        documents = (
+            Document.objects.filter(id__in=document_ids, current_version__file__isnull=False)
+            .exclude(current_version__file='')
+            .select_related('current_version')
+            .prefetch_related('current_version__tags', 'tags')
+        )
+        result = sync_tags_for_documents(documents.iterator(chunk_size=500), progress if job_id else None)
+
+    if job_id:
+        events.publish([user_id], 'job.finished', {'job_id': job_id, 'kind': 'tag_sync', **result})
+    return result
+
+
+@maintenance_job('trash_purge')
+def purge_trash(grace_period_days=None):
+    """Permanently delete documents whose trash grace period has expired"""
+    from .models import Document
+    from audit.models import AuditLog
+
+    if grace_period_days is None:
+        grace_period_days = settings.TRASH_GRACE_PERIOD_DAYS
+
+    expired_documents = Document.objects.expired_trash(grace_period_days)
+    count = 0
+    for doc in expired_documents:
+        AuditLog.log_activity(
+            user=None,  # System action
+            action='permanent_delete',
+            resource_type='document',
+            resource_id=str(doc.id),
+            resource_name=doc.title,
+            details={
+                'reason': 'Grace period expired',
+                'grace_period_days': grace_period_days,
+                'deleted_at': doc.deleted_at.isoformat(),
+            },
+        )
+        count += 1
+
+    if count:
+        expired_documents.delete()
+    return {'deleted': count, 'grace_period_days': grace_period_days}
+
+
+@maintenance_job('s3_tag_sync', lock_timeout=2 * 60 * 60)
+def sync_document_tags_to_s3():
+    """Re-sync S3 object tags for every document that has a file"""
+    from .models import Document
+
+    if not settings.USE_S3:
+        return {'updated': 0, 'failed': [], 'skipped': 'S3 storage disabled'}
+
+    documents = (
+        Document.objects.filter(current_version__file__isnull=False)
+        .exclude(current_version__file='')
+        .select_related('current_version')
+        .prefetch_related('current_version__tags', 'tags')
+    )
+    return sync_tags_for_documents(documents.iterator(chunk_size=500))
+
+
+@maintenance_job('storage_reconcile', lock_timeout=2 * 60 * 60)
+def reconcile_storage(batch_size=500):
+    """Fix version file sizes that drifted from storage and report missing files"""
+    from .models import DocumentVersion
+
+    versions = (
+        DocumentVersion.objects.filter(file__isnull=False)
+        .exclude(file='')
+        .only('id', 'file', 'file_size')
+    )
+
+    checked = 0
+    missing = []
+    pending = []
+    fixed = 0
+    for version in versions.iterator(chunk_size=batch_size):
+        checked += 1
+        storage = version.file.storage
+        try:
+            if not storage.exists(version.file.name):
+                missing.append(str(version.id))
+                continue
+            size = storage.size(version.file.name)
+        except Exception as e:
+            logger.warning(f'[MAINTENANCE] Could not stat {version.file.name}: {e}')
+            continue
+
+        if size != version.file_size:
+            version.file_size = size
+            pending.append(version)
+        if len(pending) >= batch_size:
+            DocumentVersion.objects.bulk_update(pending, ['file_size'])
+            fixed += len(pending)
+            pending = []
+
+    if pending:
+        DocumentVersion.objects.bulk_update(pending, ['file_size'])
+        fixed += len(pending)
+
+    return {
+        'checked': checked,
+        'fixed_sizes': fixed,
+        'missing_files': len(missing),
+        'missing_sample': missing[:50],
+    }
+
+
+@maintenance_job('warm_tag_suggestions')
+def warm_tag_suggestions(active_within_hours=24, max_users=1000):
+    """Pre-fill the empty-query tag suggestions for recently active users"""
+    from datetime import timedelta
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from .caching import get_tag_suggestions
+
+    User = get_user_model()
+    since = timezone.now() - timedelta(hours=active_within_hours)
+    users = User.objects.filter(is_active=True, last_login__gte=since).order_by('-last_login')[:max_users]
+
+    warmed = 0
+    for user in users:
+        get_tag_suggestions(user, '')
+        warmed += 1
+    return {'warmed_users': warmed}
+
+
+@maintenance_job('tag_usage_reconcile')
+def reconcile_tag_usage_counts():
+    """Recompute Tag.usage_count from the tag/document join"""
+    from .models import Tag
+
+    updated = Tag.objects.all().refresh_usage_counts()
+    return {'tags': updated}
+
+
+@maintenance_job('storage_usage_reconcile')
+def reconcile_storage_usage():
+    """Recompute per-user and per-document storage counters from the versions table"""
+    from .usage import reconcile
+
+    return reconcile()
+
+
+@maintenance_job('change_log_sequence', lock_timeout=5 * 60)
+def sequence_change_log():
+    """Number change feed entries whose on-commit hook never ran"""
+    from .changes import sequence_entries
+
+    return {'numbered': sequence_entries()}
+
+
+@maintenance_job('change_log_prune')
+def prune_change_log(retention_days=None):
+    """Delete change feed entries past the retention period"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from .changes import prune
+
+    if retention_days is None:
+        retention_days = settings.CHANGE_LOG_RETENTION_DAYS
+    deleted = prune(timezone.now() - timedelta(days=retention_days))
+    return {'deleted': deleted, 'retention_days': retention_days}
@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import patch
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from backend.pagination import EstimatedCountPaginator
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+
+
+@pytest.mark.django_db
+class TestDocumentAdminChangelist:
+    """Test cases for the annotated admin changelists"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, media_root, locmem_cache, client, admin_user, user):
+        client.force_login(admin_user)
+        self.user = user
+        self.tag = Tag.objects.create(key="team", created_by=user)
+
+    def make_documents(self, count, start=0):
+        for number in range(start, start + count):
+            document = Document.objects.create(title=f"Doc {number}", created_by=self.user)
+            version = DocumentVersion.objects.create(
+                document=document, version_number=1, title=document.title, created_by=self.user,
+                file=ContentFile(b"x" * 10, name="file.txt"),
+            )
+            document.current_version = version
+            document.save()
+            document.tags.add(self.tag)
+            DocumentAccess.objects.create(document=document, user=self.user, permission='read', granted_by=self.user)
+
+    def queries_for(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(context)
+
+    @pytest.mark.parametrize('model', ['document', 'documentversion', 'documentaccess'])
+    def test_query_count_does_not_grow_with_rows(self, client, model):
+        """Test that the changelist query count is independent of the page size"""
+        url = reverse(f'admin:documents_{model}_changelist')
+        self.make_documents(2)
+        few = self.queries_for(client, url)
+        self.make_documents(10, start=2)
+        many = self.queries_for(client, url)
+
+        assert many == few
+
+    def test_document_columns_use_annotations(self, client):
+        self.make_documents(1)
+
+        response = client.get(reverse('admin:documents_document_changelist'))
+
+        content = response.content.decode()
+        assert '1 versions' in content
+        assert '10 B' in content
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+    """Test cases for the estimated-count admin paginator"""
+
+    def test_exact_count_outside_postgres(self, user):
+        Document.objects.create(title="One", created_by=user)
+        Document.objects.create(title="Two", created_by=user)
+
+        assert EstimatedCountPaginator(Document.objects.order_by('title'), 50).count == 2
+
+    def test_planner_estimate_for_large_tables(self, user):
+        """Test that large Postgres tables use the planner's estimate"""
+        paginator = EstimatedCountPaginator(Document.objects.order_by('title'), 50)
+        with patch.object(connection, 'vendor', 'postgresql'), \
+                patch.object(EstimatedCountPaginator, '_table_rows', return_value=5_000_000), \
+                patch.object(EstimatedCountPaginator, '_planned_rows', return_value=4_200_000):
+            assert paginator.count == 4_200_000
+            assert paginator.num_pages == 84_000
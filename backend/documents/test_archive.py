@@ -0,0 +1,88 @@
+import io
+import zipfile
+
+import pytest
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from rest_framework import status
+
+from . import archive
+from .models import Document, DocumentVersion
+
+
+def read_zip(response):
+    return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+
+@pytest.mark.django_db
+class TestDocumentArchive:
+    """Test cases for streaming ZIP downloads"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, media_root, api_client, user):
+        api_client.force_authenticate(user=user)
+        self.user = user
+
+    def make_document(self, title, *contents, owner=None):
+        owner = owner or self.user
+        document = Document.objects.create(title=title, created_by=owner)
+        for number, content in enumerate(contents, start=1):
+            version = DocumentVersion.objects.create(
+                document=document,
+                version_number=number,
+                title=title,
+                created_by=owner,
+                file=ContentFile(content, name="file.txt"),
+            )
+            document.current_version = version
+        document.save()
+        return document
+
+    def test_archive_of_selected_documents(self, api_client):
+        """Test that each document's current file is in the archive"""
+        first = self.make_document("Report", b"old", b"report body")
+        second = self.make_document("Notes", b"notes body")
+
+        response = api_client.post(
+            reverse('documents-archive'),
+            {'document_ids': [str(first.id), str(second.id)]},
+            format='json',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/zip'
+        archive_file = read_zip(response)
+        assert sorted(archive_file.namelist()) == ["Notes.txt", "Report.txt"]
+        assert archive_file.read("Report.txt") == b"report body"
+
+    def test_archive_skips_documents_without_access(self, api_client, django_user_model):
+        """Test that other users' drafts are not included"""
+        stranger = django_user_model.objects.create_user(
+            username="stranger", email="stranger@example.com", password="testpass123"
+        )
+        hidden = self.make_document("Hidden", b"secret", owner=stranger)
+
+        response = api_client.post(
+            reverse('documents-archive'), {'document_ids': [str(hidden.id)]}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_archive_of_all_versions(self, api_client, monkeypatch):
+        """Test that every version is streamed in small chunks"""
+        monkeypatch.setattr(archive, "ARCHIVE_CHUNK_SIZE", 4)
+        document = self.make_document("Plan", b"version one", b"version two", b"version three")
+
+        response = api_client.get(reverse('document-versions-archive', args=[document.id]))
+
+        assert response.status_code == status.HTTP_200_OK
+        archive_file = read_zip(response)
+        names = archive_file.namelist()
+        assert [name.split("-")[0] for name in names] == ["v1", "v2", "v3"]
+        assert archive_file.read(names[2]) == b"version three"
+
+    def test_duplicate_titles_get_unique_names(self):
+        """Test that entry names never collide"""
+        used = set()
+        assert archive._unique("a.txt", used) == "a.txt"
+        assert archive._unique("a.txt", used) == "a (2).txt"
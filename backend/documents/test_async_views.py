@@ -0,0 +1,140 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.middleware.csrf import _get_new_csrf_string
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from audit.models import AuditLog
+from . import async_views
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+def fetch(url, user=None, method='get', client=None, headers=None):
+    """Request ``url`` through the async handler and read the whole body"""
+    headers = dict(headers or {})
+    if user:
+        headers['Authorization'] = f'Bearer {AccessToken.for_user(user)}'
+    client = client or AsyncClient()
+
+    async def request():
+        response = await getattr(client, method)(url, headers=headers)
+        if response.streaming:
+            response.body = b''.join([chunk async for chunk in response.streaming_content])
+        else:
+            response.body = response.content
+        return response
+    return async_to_sync(request)()
+
+
+@pytest.mark.django_db
+class TestAsyncDocumentViews:
+    """Test cases for the async download and metadata endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, media_root, locmem_cache, user):
+        self.document = Document.objects.create(title="Report", created_by=user)
+        self.version = DocumentVersion.objects.create(
+            document=self.document,
+            version_number=1,
+            title="Report",
+            created_by=user,
+            file=ContentFile(b"x" * 1000, name="report.txt"),
+        )
+        self.document.current_version = self.version
+        self.document.save()
+        self.version_url = reverse('download-document-version', args=[self.document.id, self.version.id])
+
+    def test_requires_token(self):
+        assert fetch(self.version_url).status_code == 401
+
+    def test_streams_version_file(self, user, monkeypatch):
+        """Test that the file is streamed in chunks with its size and name"""
+        monkeypatch.setattr(async_views, 'DOWNLOAD_CHUNK_SIZE', 300)
+
+        response = fetch(self.version_url, user)
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response.body == b"x" * 1000
+        assert response['Content-Length'] == '1000'
+        assert response['Content-Type'] == 'text/plain'
+        assert 'attachment; filename="report' in response['Content-Disposition']
+        assert AuditLog.objects.filter(action='download', resource_id=str(self.version.id)).exists()
+
+    def test_version_download_needs_access(self, user, other_user):
+        """Test that published documents still need a grant for file downloads"""
+        Document.objects.filter(pk=self.document.pk).update(status='published')
+        assert fetch(self.version_url, other_user).status_code == 403
+
+        DocumentAccess.objects.create(document=self.document, user=other_user, permission='read', granted_by=user)
+        assert fetch(self.version_url, other_user).status_code == 200
+
+    def test_unknown_version(self, user):
+        url = reverse('download-document-version', args=[self.document.id, self.document.id])
+        assert fetch(url, user).status_code == 404
+
+    def test_document_download_link(self, user, other_user):
+        url = reverse('document-download', args=[self.document.id])
+
+        assert fetch(url, other_user).status_code == 403
+        response = fetch(url, user, method='post')
+
+        assert response.status_code == 200
+        assert response.json()['file_size'] == 1000
+        assert response.json()['download_url'].startswith('http://testserver/')
+
+    def test_metadata_requires_write_access(self, user, other_user):
+        tag = Tag.objects.create(key="team", value="ops", created_by=user)
+        self.version.tags.add(tag)
+        self.document.tags.add(tag)
+        url = reverse('get-document-metadata', args=[self.document.id])
+        DocumentAccess.objects.create(document=self.document, user=other_user, permission='read', granted_by=user)
+
+        assert fetch(url, other_user).status_code == 403
+        response = fetch(url, user)
+
+        assert response.status_code == 200
+        assert response.json()['current_version'] == 1
+        assert [item['display_name'] for item in response.json()['tags']] == [tag.display_name]
+
+    def test_session_login_is_accepted(self, user):
+        """Test that session users (admin, browsable API) can download too"""
+        client = AsyncClient(enforce_csrf_checks=True)
+        client.force_login(user)
+
+        assert fetch(self.version_url, client=client).status_code == 200
+
+    def test_session_post_needs_csrf_token(self, user):
+        """Test that unsafe methods from a session login are CSRF checked"""
+        url = reverse('document-download', args=[self.document.id])
+        client = AsyncClient(enforce_csrf_checks=True)
+        client.force_login(user)
+
+        assert fetch(url, method='post', client=client).status_code == 403
+
+        token = _get_new_csrf_string()
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = fetch(url, method='post', client=client, headers={'X-CSRFToken': token})
+        assert response.status_code == 200
+
+    def test_version_downloads_are_throttled(self, user, settings):
+        """Test that streaming downloads draw on the heavy budget"""
+        settings.THROTTLE_ENABLED = True
+        settings.THROTTLE_SCOPES = {'heavy': {'user': '1/min'}}
+
+        assert fetch(self.version_url, user).status_code == 200
+        response = fetch(self.version_url, user)
+        assert response.status_code == 429
+        assert 'Retry-After' in response
@@ -0,0 +1,206 @@
+import pytest
+from unittest.mock import patch
+from django.urls import reverse
+from rest_framework import status
+
+from audit.models import AuditLog
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.mark.django_db
+class TestBulkDocumentTags:
+    """Test cases for the bulk tag endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user):
+        api_client.force_authenticate(user=user)
+        self.url = reverse('document-bulk-tags')
+        self.alpha = Tag.objects.create(key="alpha", created_by=user)
+        self.beta = Tag.objects.create(key="beta", created_by=user)
+        self.plain = Document.objects.create(title="Plain", created_by=user)
+        self.versioned = Document.objects.create(title="Versioned", created_by=user)
+        version = DocumentVersion.objects.create(
+            document=self.versioned, version_number=1, title="Versioned", created_by=user
+        )
+        self.versioned.current_version = version
+        self.versioned.save()
+
+    def post(self, api_client, operation, tag_ids, documents=None):
+        documents = documents or [self.plain, self.versioned]
+        return api_client.post(self.url, {
+            'document_ids': [str(doc.id) for doc in documents],
+            'operation': operation,
+            'tag_ids': tag_ids,
+        }, format='json')
+
+    def test_add_tags(self, api_client):
+        """Test adding tags to documents with and without versions"""
+        response = self.post(api_client, 'add', [self.alpha.id, self.beta.id])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['updated']) == 2
+        assert set(self.plain.tags.values_list('key', flat=True)) == {"alpha", "beta"}
+        assert set(self.versioned.current_version.tags.values_list('key', flat=True)) == {"alpha", "beta"}
+        self.alpha.refresh_from_db()
+        assert self.alpha.usage_count == 1
+
+    def test_add_is_idempotent(self, api_client):
+        """Test that existing links are left alone"""
+        self.plain.tags.add(self.alpha)
+
+        response = self.post(api_client, 'add', [self.alpha.id])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert self.plain.tags.count() == 1
+
+    def test_remove_and_replace(self, api_client):
+        """Test removing and replacing tags"""
+        self.plain.tags.add(self.alpha, self.beta)
+
+        self.post(api_client, 'remove', [self.alpha.id])
+        assert list(self.plain.tags.values_list('key', flat=True)) == ["beta"]
+
+        self.post(api_client, 'replace', [self.alpha.id])
+        assert list(self.plain.tags.values_list('key', flat=True)) == ["alpha"]
+        self.beta.refresh_from_db()
+        assert self.beta.usage_count == 0
+
+    def test_skips_documents_of_other_users(self, api_client, other_user):
+        """Test that only the caller's documents are changed"""
+        foreign = Document.objects.create(title="Foreign", created_by=other_user)
+
+        response = self.post(api_client, 'add', [self.alpha.id], documents=[self.plain, foreign])
+
+        assert response.data['updated'] == [str(self.plain.id)]
+        assert response.data['skipped'] == [str(foreign.id)]
+        assert foreign.tags.count() == 0
+
+    def test_replace_with_foreign_tag_is_rejected(self, api_client, other_user):
+        """Test that unknown or foreign tag ids fail instead of clearing the tags"""
+        self.plain.tags.add(self.alpha)
+        foreign_tag = Tag.objects.create(key="foreign", created_by=other_user)
+
+        response = self.post(api_client, 'replace', [foreign_tag.id, 999999])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert str(foreign_tag.id) in str(response.data['tag_ids'])
+        assert '999999' in str(response.data['tag_ids'])
+        assert list(self.plain.tags.values_list('key', flat=True)) == ["alpha"]
+
+    def test_single_audit_record_and_s3_job(self, api_client, django_capture_on_commit_callbacks):
+        """Test that one audit entry and one sync task are written per call"""
+        with patch('documents.tasks.sync_document_tags.delay') as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                self.post(api_client, 'add', [self.alpha.id])
+
+        assert AuditLog.objects.filter(resource_id='bulk').count() == 1
+        delay.assert_called_once()
+        assert set(delay.call_args[0][0]) == {str(self.plain.id), str(self.versioned.id)}
+        assert delay.call_args[0][1] == self.plain.created_by_id
+
+    def test_requires_tags_for_add(self, api_client):
+        """Test validation of the request body"""
+        response = self.post(api_client, 'add', [])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestBulkDocumentActions:
+    """Test cases for the bulk document action endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user, other_user):
+        api_client.force_authenticate(user=user)
+        self.url = reverse('document-bulk-actions')
+        self.mine = [
+            Document.objects.create(title=f"Mine {i}", created_by=user) for i in range(3)
+        ]
+        self.foreign = Document.objects.create(title="Foreign", created_by=other_user)
+
+    def ids(self, documents):
+        return [str(doc.id) for doc in documents]
+
+    def test_set_status_reports_per_id(self, api_client):
+        """Test status change with owned, foreign and unknown ids"""
+        missing = "00000000-0000-0000-0000-000000000000"
+        response = api_client.post(self.url, {
+            'action': 'set_status',
+            'status': 'published',
+            'document_ids': self.ids(self.mine[:2] + [self.foreign]) + [missing],
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['updated'] == 2
+        results = response.data['results']
+        assert results[str(self.mine[0].id)] == 'updated'
+        assert results[str(self.foreign.id)] == 'permission_denied'
+        assert results[missing] == 'not_found'
+        assert Document.objects.filter(status='published').count() == 2
+        assert AuditLog.objects.filter(details__bulk_operation='set_status').count() == 2
+
+    def test_soft_delete_and_restore(self, api_client):
+        """Test soft deleting and restoring in bulk"""
+        tag = Tag.objects.create(key="alpha", created_by=self.mine[0].created_by)
+        self.mine[0].tags.add(tag)
+
+        api_client.post(self.url, {'action': 'soft_delete', 'document_ids': self.ids(self.mine)}, format='json')
+        assert Document.objects.filter(created_by=self.mine[0].created_by).count() == 0
+        tag.refresh_from_db()
+        assert tag.usage_count == 0
+
+        response = api_client.post(self.url, {'action': 'restore', 'document_ids': self.ids(self.mine)}, format='json')
+        assert response.data['updated'] == 3
+        assert Document.objects.filter(created_by=self.mine[0].created_by).count() == 3
+        tag.refresh_from_db()
+        assert tag.usage_count == 1
+
+    def test_select_by_filter(self, api_client):
+        """Test that a DocumentFilter expression selects only permitted documents"""
+        Document.objects.filter(id=self.mine[0].id).update(status='archived')
+        Document.objects.filter(id=self.foreign.id).update(status='archived')
+
+        response = api_client.post(self.url, {
+            'action': 'soft_delete',
+            'filters': {'status': 'archived'},
+        }, format='json')
+
+        assert response.data['results'] == {str(self.mine[0].id): 'updated'}
+        assert Document.objects.filter(id=self.foreign.id).exists()
+
+    def test_share_upserts_access(self, api_client, other_user):
+        """Test that sharing creates and updates access rows"""
+        DocumentAccess.objects.create(
+            document=self.mine[0], user=other_user, permission='read', granted_by=self.mine[0].created_by
+        )
+
+        response = api_client.post(self.url, {
+            'action': 'share',
+            'email': other_user.email,
+            'permission': 'write',
+            'document_ids': self.ids(self.mine),
+        }, format='json')
+
+        assert response.data['updated'] == 3
+        access = DocumentAccess.objects.filter(user=other_user)
+        assert access.count() == 3
+        assert set(access.values_list('permission', flat=True)) == {'write'}
+
+    def test_share_with_unknown_user(self, api_client):
+        """Test that an unknown share target is rejected"""
+        response = api_client.post(self.url, {
+            'action': 'share',
+            'email': 'nobody@example.com',
+            'document_ids': self.ids(self.mine),
+        }, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,187 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from .changes import decode_cursor, encode_cursor, sequence_entries
+from .models import ChangeLogEntry, Document, DocumentAccess, Tag
+from .tasks import prune_change_log
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.mark.django_db
+class TestChangeFeed:
+    """Test cases for the incremental sync feed"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user):
+        api_client.force_authenticate(user=user)
+        self.url = reverse('change-feed')
+
+    def feed(self, api_client, cursor=None, **params):
+        # Stands in for the on-commit hooks, which never run inside the test transaction
+        sequence_entries()
+        if cursor:
+            params['cursor'] = cursor
+        return api_client.get(self.url, params)
+
+    def test_cursor_round_trip(self):
+        """Test that cursors are opaque but reversible"""
+        assert decode_cursor(encode_cursor(42)) == 42
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_feed_returns_changes_since_cursor(self, api_client, user):
+        """Test that only changes after the cursor are returned"""
+        cursor = self.feed(api_client, "latest").data['cursor']
+
+        document = Document.objects.create(title="Synced", created_by=user)
+        Tag.objects.create(key="sync", created_by=user)
+        response = self.feed(api_client, cursor)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(c['resource_type'], c['action']) for c in response.data['results']] == [
+            ('document', 'created'),
+            ('tag', 'created'),
+        ]
+
+        document.soft_delete(user)
+        response = self.feed(api_client, response.data['cursor'])
+        assert [(c['resource_id'], c['action']) for c in response.data['results']] == [
+            (str(document.id), 'deleted'),
+        ]
+
+    def test_late_commit_of_a_lower_id_is_not_skipped(self, api_client, user):
+        """Test that an entry committed after the cursor moved past its id is still served"""
+        cursor = self.feed(api_client, "latest").data['cursor']
+        # A long transaction takes the next id ...
+        reserved = ChangeLogEntry.objects.create(resource_type='tag', resource_id='1', action='created')
+        reserved.delete()
+        # ... a later one commits and is read ...
+        Tag.objects.create(key="later", created_by=user)
+        cursor = self.feed(api_client, cursor).data['cursor']
+        # ... and only then does the first one commit
+        ChangeLogEntry.objects.create(
+            id=reserved.id, resource_type='tag', resource_id='1', action='created', audience_id=user.pk
+        )
+
+        results = self.feed(api_client, cursor).data['results']
+        assert [(c['resource_type'], c['resource_id']) for c in results] == [('tag', '1')]
+
+    def test_entries_are_numbered_when_the_write_commits(self, user, django_capture_on_commit_callbacks):
+        """Test that recording an entry numbers it once the transaction commits"""
+        with django_capture_on_commit_callbacks(execute=True):
+            Tag.objects.create(key="committed", created_by=user)
+
+        assert ChangeLogEntry.objects.get().sequence is not None
+
+    def test_reading_the_feed_never_writes(self, api_client, user):
+        """Test that the feed only serves numbered entries and numbers nothing itself"""
+        Tag.objects.create(key="uncommitted", created_by=user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(self.url)
+
+        assert response.data['results'] == []
+        assert ChangeLogEntry.objects.get().sequence is None
+        writes = ('INSERT', 'UPDATE', 'DELETE')
+        assert not [q for q in context.captured_queries if q['sql'].startswith(writes)]
+        assert not [q for q in context.captured_queries if 'FOR UPDATE' in q['sql']]
+
+    def test_cursor_follows_changes_the_user_cannot_see(self, api_client, user, other_user):
+        """Test that other users' changes still move the cursor past pruning"""
+        cursor = self.feed(api_client, "latest").data['cursor']
+        Tag.objects.create(key="mine", created_by=user)
+        cursor = self.feed(api_client, cursor).data['cursor']
+
+        Tag.objects.create(key="theirs", created_by=other_user)
+        data = self.feed(api_client, cursor).data
+        assert data['results'] == []
+        assert decode_cursor(data['cursor']) == ChangeLogEntry.objects.get(audience_id=other_user.pk).sequence
+
+        ChangeLogEntry.objects.update(changed_at=timezone.now() - timedelta(days=120))
+        prune_change_log(retention_days=90)
+        assert self.feed(api_client, cursor).status_code == status.HTTP_410_GONE
+        assert self.feed(api_client, data['cursor']).status_code == status.HTTP_200_OK
+
+    def test_empty_first_page_returns_numbered_position(self, api_client, other_user):
+        """Test that a client with nothing visible resumes after what was numbered"""
+        Tag.objects.create(key="theirs", created_by=other_user)
+
+        data = self.feed(api_client).data
+        assert data['results'] == []
+        assert decode_cursor(data['cursor']) == ChangeLogEntry.objects.get().sequence
+
+    def test_pagination(self, api_client, user):
+        """Test that has_more and the cursor walk the whole log"""
+        for i in range(5):
+            Document.objects.create(title=f"Doc {i}", created_by=user)
+
+        seen = []
+        cursor = None
+        while True:
+            data = self.feed(api_client, cursor, limit=2).data
+            seen += data['results']
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        assert len(seen) == 5
+
+    def test_feed_is_scoped_to_visible_documents(self, api_client, user, other_user):
+        """Test that other users' private changes are hidden but grants appear"""
+        cursor = self.feed(api_client, "latest").data['cursor']
+        private = Document.objects.create(title="Private", created_by=other_user)
+        Tag.objects.create(key="theirs", created_by=other_user)
+        assert self.feed(api_client, cursor).data['results'] == []
+
+        DocumentAccess.objects.create(document=private, user=user, permission='read', granted_by=other_user)
+        results = self.feed(api_client, cursor).data['results']
+        assert ('document', 'created') in [(c['resource_type'], c['action']) for c in results]
+        assert ('access', 'created') in [(c['resource_type'], c['action']) for c in results]
+
+    def test_permanent_delete_leaves_tombstone(self, api_client, user):
+        """Test that hard-deleted documents still show up as deleted"""
+        document = Document.objects.create(title="Gone", created_by=user)
+        cursor = self.feed(api_client, "latest").data['cursor']
+        document_id = str(document.id)
+        document.delete()
+
+        results = self.feed(api_client, cursor).data['results']
+        assert (document_id, 'deleted') in [(c['resource_id'], c['action']) for c in results]
+
+    def test_pruned_cursor_requires_resync(self, api_client, user):
+        """Test that a cursor older than the retention window is rejected"""
+        Document.objects.create(title="Old", created_by=user)
+        ChangeLogEntry.objects.update(changed_at=timezone.now() - timedelta(days=120))
+
+        prune_change_log(retention_days=90)
+
+        assert ChangeLogEntry.objects.count() == 0
+        response = self.feed(api_client, encode_cursor(0))
+        assert response.status_code == status.HTTP_410_GONE
+        assert self.feed(api_client).status_code == status.HTTP_200_OK
+
+    def test_prune_watermark_survives_a_cache_flush(self, api_client, user):
+        """Test that the watermark is kept in the database, not the cache"""
+        cursor = self.feed(api_client, "latest").data['cursor']
+        Document.objects.create(title="Old", created_by=user)
+        self.feed(api_client, cursor)
+        ChangeLogEntry.objects.update(changed_at=timezone.now() - timedelta(days=120))
+        prune_change_log(retention_days=90)
+
+        cache.clear()
+
+        assert self.feed(api_client, cursor).status_code == status.HTTP_410_GONE
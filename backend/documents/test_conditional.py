@@ -0,0 +1,66 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from .models import Document, DocumentAccess
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    """Test cases for ETag / Last-Modified on the document APIs"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, api_client, user):
+        api_client.force_authenticate(user=user)
+        self.document = Document.objects.create(title="Polled", created_by=user)
+
+    def test_list_returns_304_when_unchanged(self, api_client):
+        """Test that a matching If-None-Match skips the list body"""
+        url = reverse('document-list')
+        first = api_client.get(url)
+        assert first.status_code == status.HTTP_200_OK
+        assert first['ETag']
+        assert 'Last-Modified' in first
+
+        second = api_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+        assert second['ETag'] == first['ETag']
+
+    def test_list_etag_changes_with_data_and_filters(self, api_client, user):
+        """Test that edits, deletions and different filters change the ETag"""
+        url = reverse('document-list')
+        etag = api_client.get(url)['ETag']
+
+        assert api_client.get(url, {'status': 'draft'})['ETag'] != etag
+
+        Document.objects.create(title="Another", created_by=user)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+
+        Document.objects.filter(title="Another").delete()
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_detail_returns_304_until_the_document_changes(self, api_client):
+        """Test conditional GET on a single document"""
+        url = reverse('document-detail', args=[self.document.id])
+        etag = api_client.get(url)['ETag']
+
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.document.description = "Changed"
+        self.document.save()
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_detail_ignores_if_modified_since(self, api_client, user, django_user_model):
+        """Test that a share within the same second is not hidden behind Last-Modified"""
+        url = reverse('document-detail', args=[self.document.id])
+        last_modified = api_client.get(url)['Last-Modified']
+        reader = django_user_model.objects.create_user(
+            username="reader", email="reader@example.com", password="testpass123"
+        )
+        DocumentAccess.objects.create(document=self.document, user=reader, permission='read', granted_by=user)
+
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['access_permissions']) == 1
@@ -0,0 +1,100 @@
+import hashlib
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .caching import DOCUMENT_KEY, document_stamp, invalidate_documents
+from .models import Document, DocumentAccess, DocumentVersion, Tag
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.mark.django_db
+class TestDocumentRepresentationCache:
+    """Test cases for the cached document detail payload"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, user):
+        self.document = Document.objects.create(title="Cached", created_by=user, status="published")
+        self.version = DocumentVersion.objects.create(
+            document=self.document, version_number=1, title="Cached", created_by=user
+        )
+        self.document.current_version = self.version
+        self.document.save()
+        self.url = reverse('document-detail', args=[self.document.id])
+
+    def get(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        return api_client.get(self.url).data
+
+    def test_hit_skips_serialization_queries(self, api_client, user):
+        """Test that a cached retrieve issues fewer queries and the same body"""
+        with CaptureQueriesContext(connection) as miss:
+            first = self.get(api_client, user)
+        with CaptureQueriesContext(connection) as hit:
+            second = self.get(api_client, user)
+
+        assert first == second
+        assert len(hit) < len(miss)
+
+    def test_version_change_invalidates(self, api_client, user):
+        """Test that editing the current version refreshes the payload"""
+        self.get(api_client, user)
+        self.version.title = "Renamed"
+        self.version.save()
+
+        assert self.get(api_client, user)["title"] == "Renamed"
+
+    def test_tag_rename_invalidates(self, api_client, user):
+        """Test that renaming a tag refreshes documents using it"""
+        tag = Tag.objects.create(key="stage", value="draft", created_by=user)
+        self.version.tags.add(tag)
+        self.get(api_client, user)
+
+        tag.value = "final"
+        tag.save()
+
+        assert self.get(api_client, user)["tags"][0]["value"] == "final"
+
+    def test_permissions_are_per_viewer(self, api_client, user, other_user):
+        """Test that can_edit / can_delete are computed for each viewer"""
+        owner_view = self.get(api_client, user)
+        assert owner_view["can_edit"] and owner_view["can_delete"]
+
+        stranger_view = self.get(api_client, other_user)
+        assert not stranger_view["can_edit"] and not stranger_view["can_delete"]
+
+        DocumentAccess.objects.create(
+            document=self.document, user=other_user, permission="write", granted_by=user
+        )
+        shared_view = self.get(api_client, other_user)
+        assert shared_view["can_edit"] and not shared_view["can_delete"]
+        assert len(shared_view["access_permissions"]) == 1
+
+    def test_body_cached_before_commit_is_orphaned_on_commit(
+        self, api_client, user, django_capture_on_commit_callbacks
+    ):
+        """Test that a payload re-cached mid-transaction does not outlive the commit"""
+        with django_capture_on_commit_callbacks(execute=True):
+            DocumentVersion.objects.filter(pk=self.version.pk).update(title="Committed")
+            invalidate_documents(self.document.pk)
+            # A concurrent reader still sees the old row and caches it under the new stamp
+            body = dict(self.get(api_client, user), title="Stale")
+            cache_key = DOCUMENT_KEY.format(
+                document_id=self.document.pk,
+                stamp=document_stamp(self.document.pk),
+                variant=hashlib.md5(b'http://testserver/').hexdigest(),
+            )
+            cache.set(cache_key, body)
+
+        assert self.get(api_client, user)["title"] == "Committed"
@@ -0,0 +1,186 @@
+import json
+
+import pytest
+from unittest.mock import MagicMock, patch
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend import events
+from .models import Document, DocumentVersion
+from .tasks import sync_document_tags
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.fixture
+def sent(settings):
+    """Enable publishing and capture what would reach Redis"""
+    settings.EVENTS_REDIS_URL = 'redis://events-test:6379/2'
+    published = []
+    with patch('backend.events._send', side_effect=lambda user_ids, payload: published.append(
+        (set(user_ids), json.loads(payload))
+    )):
+        yield published
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.remove(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def pubsub(self):
+        return self._pubsub
+
+    async def aclose(self):
+        pass
+
+
+def get_events(params=None):
+    async def request():
+        return await AsyncClient().get(reverse('event_stream'), params or {})
+    return async_to_sync(request)()
+
+
+async def collect(stream, count):
+    frames = []
+    async for frame in stream:
+        frames.append(frame)
+        if len(frames) == count:
+            break
+    await stream.aclose()
+    return frames
+
+
+@pytest.mark.django_db
+class TestPublish:
+    """Test cases for publishing events"""
+
+    def test_publishes_on_commit(self, sent, user, django_capture_on_commit_callbacks):
+        """Test that nothing is sent before the transaction commits"""
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            events.publish([user.id, None], 'job.finished', {'job_id': 'abc'})
+            assert sent == []
+
+        assert len(callbacks) == 1
+        assert sent == [({user.id}, {'event': 'job.finished', 'data': {'job_id': 'abc'}})]
+
+    def test_disabled_without_redis_url(self, user, django_capture_on_commit_callbacks):
+        """Test that an empty EVENTS_REDIS_URL turns publishing off"""
+        with django_capture_on_commit_callbacks() as callbacks:
+            events.publish([user.id], 'job.finished')
+        assert callbacks == []
+
+    def test_pipelines_one_publish_per_user(self, settings):
+        """Test that each user gets the payload on their own channel"""
+        settings.EVENTS_REDIS_URL = 'redis://events-test:6379/2'
+        client = MagicMock()
+        with patch('backend.events._redis', return_value=client):
+            events._send({1, 2}, '{}')
+        pipe = client.pipeline.return_value
+        channels = {call.args[0] for call in pipe.publish.call_args_list}
+        assert channels == {'events:user:1', 'events:user:2'}
+        pipe.execute.assert_called_once()
+
+    def test_share_notifies_grantee(self, sent, api_client, user, other_user, django_capture_on_commit_callbacks):
+        """Test that sharing a document pushes an event to the new reader"""
+        document = Document.objects.create(title="Shared", created_by=user)
+        api_client.force_authenticate(user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse('document-share', args=[document.id]), {'email': other_user.email, 'permission': 'write'}
+            )
+
+        assert response.status_code == 200
+        shared = [(audience, data) for audience, data in sent if data['event'] == 'document.shared']
+        assert len(shared) == 1
+        audience, data = shared[0]
+        assert audience == {other_user.id}
+        assert data['data']['document_ids'] == [str(document.id)]
+        assert data['data']['permission'] == 'write'
+
+    def test_new_version_notifies_owner(self, sent, user, django_capture_on_commit_callbacks):
+        """Test that a new version is announced to the document's owner"""
+        document = Document.objects.create(title="Versioned", created_by=user)
+        with django_capture_on_commit_callbacks(execute=True):
+            version = DocumentVersion.objects.create(
+                document=document, version_number=1, title="Versioned", created_by=user
+            )
+
+        assert sent == [({user.id}, {'event': 'version.created', 'data': {
+            'document_id': str(document.id), 'version_id': str(version.id), 'version_number': 1,
+        }})]
+
+    def test_tag_sync_job_reports_completion(self, sent, settings, user, django_capture_on_commit_callbacks):
+        """Test that the bulk tag sync job tells the user when it is done"""
+        settings.USE_S3 = False
+        with django_capture_on_commit_callbacks(execute=True):
+            sync_document_tags(['a', 'b'], user.id, 'job-1')
+
+        assert sent[-1][0] == {user.id}
+        assert sent[-1][1]['event'] == 'job.finished'
+        assert sent[-1][1]['data']['job_id'] == 'job-1'
+
+
+@pytest.mark.django_db
+class TestEventStream:
+    """Test cases for the SSE endpoint"""
+
+    def test_relays_channel_messages(self, settings):
+        """Test the frames produced from the user's channel"""
+        settings.EVENTS_KEEPALIVE_SECONDS = 1
+        payload = json.dumps({'event': 'job.progress', 'data': {'done': 100}})
+        pubsub = FakePubSub([{'type': 'message', 'data': payload.encode()}, None])
+
+        with patch('backend.events.aioredis.Redis.from_url', return_value=FakeRedis(pubsub)):
+            frames = async_to_sync(collect)(events.stream(7), 3)
+
+        assert frames[0].startswith('retry: ')
+        assert 'event: ready' in frames[0]
+        assert frames[1] == 'event: job.progress\ndata: {"done": 100}\n\n'
+        assert frames[2] == ': keepalive\n\n'
+        assert pubsub.channels == []
+        assert pubsub.closed
+
+    def test_requires_token(self):
+        """Test that anonymous clients are rejected before streaming starts"""
+        response = get_events()
+        assert response.status_code == 401
+
+    def test_accepts_token_query_parameter(self, user):
+        """Test that EventSource clients can authenticate without headers"""
+        token = str(AccessToken.for_user(user))
+        with patch('backend.events.stream') as stream:
+            stream.return_value = iter([])
+            response = get_events({'token': token})
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        stream.assert_called_once_with(user.pk)
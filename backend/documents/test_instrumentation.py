@@ -0,0 +1,117 @@
+import logging
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+from django.core.cache.backends.locmem import LocMemCache
+from django.urls import reverse
+
+from backend.instrumentation import CacheStatsMixin, RequestStats, _current, instrument_boto3_session
+from .models import Document
+
+
+class StatsLocMemCache(CacheStatsMixin, LocMemCache):
+    pass
+
+
+@pytest.fixture
+def request_stats():
+    stats = RequestStats()
+    token = _current.set(stats)
+    yield stats
+    _current.reset(token)
+
+
+@pytest.mark.django_db
+class TestPerformanceMiddleware:
+    """Test cases for per-request instrumentation"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, locmem_cache, api_client, user):
+        settings.PERF_INSTRUMENTATION_ENABLED = True
+        settings.PERF_SERVER_TIMING = True
+        settings.PERF_LOG_ALL_REQUESTS = False
+        settings.PERF_SLOW_REQUEST_MS = 60 * 1000
+        settings.PERF_QUERY_COUNT_WARNING = 1000
+        self.settings = settings
+        self.client = api_client
+        Document.objects.create(title="Timed", created_by=user, status='published')
+        api_client.force_authenticate(user=user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('document-list'))
+
+        timing = response['Server-Timing']
+        assert 'db;dur=' in timing
+        assert 'cache;dur=' in timing
+        assert 'total;dur=' in timing
+        assert ' 0 queries' not in timing
+
+    def test_header_can_be_turned_off(self):
+        self.settings.PERF_SERVER_TIMING = False
+        assert 'Server-Timing' not in self.client.get(reverse('document-list'))
+
+    def test_slow_requests_are_logged_with_query_origins(self, caplog):
+        self.settings.PERF_SLOW_REQUEST_MS = 0
+        self.settings.PERF_SLOW_QUERY_MS = 0
+        self.settings.PERF_SLOW_QUERY_LIMIT = 2
+
+        with caplog.at_level(logging.INFO, logger='backend.instrumentation'):
+            self.client.get(reverse('document-list'))
+
+        [record] = [r for r in caplog.records if r.name == 'backend.instrumentation']
+        assert record.levelno == logging.WARNING
+        message = record.getMessage()
+        assert 'view=document-list status=200' in message
+        assert message.count('slow query') == 2
+        assert '.py:' in message.split('slow query', 1)[1]
+
+    def test_fast_requests_are_only_logged_when_asked(self, caplog):
+        with caplog.at_level(logging.INFO, logger='backend.instrumentation'):
+            self.client.get(reverse('document-list'))
+            self.settings.PERF_LOG_ALL_REQUESTS = True
+            self.client.get(reverse('document-list'))
+
+        [record] = [r for r in caplog.records if r.name == 'backend.instrumentation']
+        assert record.levelno == logging.INFO
+        assert 'db_queries=' in record.getMessage()
+        assert 'bytes=' in record.getMessage()
+
+
+class TestHooks:
+    """Test cases for the cache and S3 counters"""
+
+    def test_cache_hits_and_misses(self, request_stats):
+        cache = StatsLocMemCache('instrumentation-test', {})
+        cache.set('a', 1)
+
+        assert cache.get('a') == 1
+        assert cache.get('b', 'default') == 'default'
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 1}
+
+        assert request_stats.cache_hits == 2
+        assert request_stats.cache_misses == 3
+
+    def test_cached_none_is_a_hit(self, request_stats):
+        cache = StatsLocMemCache('instrumentation-test', {})
+        cache.set('none', None)
+
+        assert cache.get('none', 'default') is None
+        assert request_stats.cache_hits == 1
+
+    def test_s3_calls_are_timed(self, request_stats):
+        session = instrument_boto3_session(
+            boto3.Session(aws_access_key_id='test', aws_secret_access_key='test', region_name='us-east-1')
+        )
+        client = session.client('s3')
+        with Stubber(client) as stubber:
+            stubber.add_response('head_object', {}, {'Bucket': 'bucket', 'Key': 'key'})
+            client.head_object(Bucket='bucket', Key='key')
+
+        assert request_stats.s3_calls == 1
+        assert request_stats.s3_time > 0
+
+    def test_nothing_is_counted_outside_requests(self):
+        cache = StatsLocMemCache('instrumentation-test', {})
+        assert cache.get('missing') is None
+        assert _current.get() is None
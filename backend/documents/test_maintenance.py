@@ -0,0 +1,124 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend import maintenance
+from audit.models import AuditLog, AuditDailyRollup
+from audit.tasks import rollup_audit_logs
+from .models import Document
+from .tasks import purge_trash
+
+
+@pytest.mark.django_db
+class TestMaintenanceRegistry:
+    """Test cases for the maintenance job registry"""
+
+    def test_jobs_are_registered(self, locmem_cache):
+        """Test that app jobs show up in the registry"""
+        jobs = maintenance.load_jobs()
+        for name in ('trash_purge', 'audit_rollup', 'storage_reconcile', 's3_tag_sync'):
+            assert name in jobs
+            assert jobs[name]['task'].name == f'maintenance.{name}'
+
+    def test_run_records_metrics(self, locmem_cache):
+        """Test that a successful run records last-success metrics"""
+        result = purge_trash()
+
+        assert result['status'] == 'success'
+        metrics = maintenance.get_metrics('trash_purge')
+        assert metrics['runs'] == 1
+        assert metrics['last_status'] == 'success'
+        assert metrics['last_success_at'] is not None
+        assert metrics['last_duration'] is not None
+
+    def test_locked_job_is_skipped(self, locmem_cache):
+        """Test that a job already holding the lock is not run twice"""
+        token = maintenance.acquire_lock('trash_purge', 60)
+        try:
+            result = purge_trash()
+        finally:
+            maintenance.release_lock('trash_purge', token)
+
+        assert result['status'] == 'skipped'
+        assert maintenance.get_metrics('trash_purge')['skipped'] == 1
+        assert maintenance.acquire_lock('trash_purge', 60) is not None
+
+    def test_release_leaves_a_lock_taken_by_another_worker(self, locmem_cache):
+        """Test that an expired owner does not release the next owner's lock"""
+        token = maintenance.acquire_lock('trash_purge', 60)
+        cache.delete(maintenance.LOCK_KEY.format(name='trash_purge'))
+        assert maintenance.acquire_lock('trash_purge', 60) is not None
+
+        maintenance.release_lock('trash_purge', token)
+
+        assert maintenance.acquire_lock('trash_purge', 60) is None
+
+    def test_redis_release_is_one_compare_and_delete(self, locmem_cache):
+        """Test that on Redis the lock is released by a single script"""
+        script = MagicMock()
+        redis = MagicMock()
+        redis.register_script.return_value = script
+        client = MagicMock()
+        client.get_client.return_value = redis
+        client.encode.side_effect = lambda value: f'encoded:{value}'.encode()
+
+        with patch('backend.maintenance._redis', return_value=client), \
+                patch('backend.maintenance._release_script', None):
+            maintenance.release_lock('trash_purge', 'token')
+
+        redis.register_script.assert_called_once_with(maintenance.RELEASE_LOCK)
+        script.assert_called_once_with(
+            keys=[cache.make_key('maintenance:lock:trash_purge')], args=[b'encoded:token'], client=redis
+        )
+
+    def test_failed_run_records_error(self, locmem_cache):
+        """Test that failures are recorded and the lock is released"""
+        @maintenance.maintenance_job('test_failing_job')
+        def failing_job():
+            raise RuntimeError('boom')
+
+        try:
+            with pytest.raises(RuntimeError):
+                failing_job()
+
+            metrics = maintenance.get_metrics('test_failing_job')
+            assert metrics['failures'] == 1
+            assert metrics['last_error'] == 'boom'
+            assert maintenance.acquire_lock('test_failing_job', 60) is not None
+        finally:
+            maintenance.JOBS.pop('test_failing_job', None)
+
+
+@pytest.mark.django_db
+class TestMaintenanceJobs:
+    """Test cases for the built-in maintenance jobs"""
+
+    def test_trash_purge_deletes_expired_documents(self, locmem_cache, user):
+        """Test that only documents past the grace period are purged"""
+        expired = Document.objects.create(title="Expired", created_by=user)
+        recent = Document.objects.create(title="Recent", created_by=user)
+        expired.soft_delete(user)
+        recent.soft_delete(user)
+        Document.objects.all_with_deleted().filter(id=expired.id).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+
+        result = purge_trash(grace_period_days=30)
+
+        assert result['result']['deleted'] == 1
+        assert not Document.objects.all_with_deleted().filter(id=expired.id).exists()
+        assert Document.objects.all_with_deleted().filter(id=recent.id).exists()
+
+    def test_audit_rollup_counts_actions(self, locmem_cache, user):
+        """Test that audit logs are rolled up per day and action"""
+        for _ in range(3):
+            AuditLog.log_activity(user=user, action='read', resource_type='document', resource_id='list')
+        AuditLog.log_activity(user=user, action='login', resource_type='user', resource_id=user.id)
+
+        rollup_audit_logs()
+
+        today = timezone.localdate()
+        assert AuditDailyRollup.objects.get(day=today, action='read', resource_type='document').count == 3
+        assert AuditDailyRollup.objects.get(day=today, action='login', resource_type='user').count == 1
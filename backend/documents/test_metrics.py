@@ -0,0 +1,98 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.signals import task_postrun, task_prerun
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from audit.models import AuditLog
+from backend import metrics
+from .models import Document
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+    """Test cases for the Prometheus scrape endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, locmem_cache, client):
+        settings.PERF_INSTRUMENTATION_ENABLED = True
+        settings.METRICS_TOKEN = ''
+        settings.CELERY_BROKER_URL = 'memory://'
+        self.settings = settings
+        self.client = client
+
+    def test_request_latency_is_recorded_per_route(self, api_client, user):
+        Document.objects.create(title="Counted", created_by=user, status='published')
+        api_client.force_authenticate(user=user)
+        labels = {'method': 'GET', 'route': 'api/documents/', 'status': '200'}
+        before = sample('http_request_duration_seconds_count', labels)
+        queries_before = sample('db_query_duration_seconds_count')
+
+        api_client.get(reverse('document-list'))
+
+        assert sample('http_request_duration_seconds_count', labels) == before + 1
+        assert sample('db_query_duration_seconds_count') > queries_before
+
+    def test_exposition_format(self):
+        response = self.client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        body = response.content.decode()
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert '# TYPE cache_requests_total counter' in body
+
+    def test_token(self):
+        self.settings.METRICS_TOKEN = 'secret'
+
+        assert self.client.get('/metrics').status_code == 401
+        assert self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 401
+        assert self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code == 200
+
+    def test_celery_queue_length(self):
+        self.settings.CELERY_BROKER_URL = 'redis://broker:6379/0'
+        self.settings.METRICS_CELERY_QUEUES = ['celery', 'maintenance']
+        pipe = MagicMock()
+        pipe.execute.return_value = [7, 0]
+
+        with patch('backend.metrics.redis.Redis.from_url') as from_url:
+            from_url.return_value.pipeline.return_value = pipe
+            body = self.client.get('/metrics').content.decode()
+
+        assert 'celery_queue_length{queue="celery"} 7.0' in body
+        assert 'celery_queue_length{queue="maintenance"} 0.0' in body
+
+    def test_multiprocess_registry(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+        registry = metrics.registry()
+
+        assert registry is not REGISTRY
+        assert self.client.get('/metrics').status_code == 200
+
+    def test_audit_writes(self, user):
+        before = sample('audit_log_entries_total')
+        writes = sample('audit_log_write_duration_seconds_count')
+
+        AuditLog.log_activity(user, 'read', 'document', 'list')
+        AuditLog.log_many([AuditLog.build_entry(user, 'read', 'document', i) for i in range(3)])
+
+        assert sample('audit_log_entries_total') == before + 4
+        assert sample('audit_log_write_duration_seconds_count') == writes + 2
+
+
+def test_celery_task_durations():
+    task = MagicMock()
+    task.name = 'documents.tasks.example'
+    labels = {'task': task.name, 'state': 'SUCCESS'}
+    before = sample('celery_task_duration_seconds_count', labels)
+
+    task_prerun.send(sender=task, task_id='task-1', task=task)
+    task_postrun.send(sender=task, task_id='task-1', task=task, state='SUCCESS')
+
+    assert sample('celery_task_duration_seconds_count', labels) == before + 1
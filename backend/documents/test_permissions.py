@@ -0,0 +1,82 @@
+import pytest
+from django.test import RequestFactory
+
+from .models import Document, DocumentAccess
+from .permissions import load_user_grants, permissions_for
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+def make_request(user):
+    request = RequestFactory().get("/")
+    request.user = user
+    return request
+
+
+@pytest.mark.django_db
+class TestDocumentPermissions:
+    """Test cases for the per-user permission map"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, user, other_user):
+        self.owner = user
+        self.reader = other_user
+        self.draft = Document.objects.create(title="Draft", created_by=user)
+        self.published = Document.objects.create(title="Public", created_by=user, status="published")
+
+    def grant(self, document, permission):
+        return DocumentAccess.objects.create(
+            document=document, user=self.reader, permission=permission, granted_by=self.owner
+        )
+
+    def test_owner_can_do_everything(self):
+        """Test that the owner passes every check"""
+        permissions = permissions_for(make_request(self.owner))
+
+        assert permissions.can_read(self.draft)
+        assert permissions.can_write(self.draft)
+        assert permissions.can_admin(self.draft)
+
+    def test_grant_levels(self):
+        """Test read, write and admin grants"""
+        self.grant(self.draft, "write")
+        permissions = permissions_for(make_request(self.reader))
+
+        assert permissions.can_read(self.draft, include_published=False)
+        assert permissions.can_write(self.draft)
+        assert not permissions.can_admin(self.draft)
+
+    def test_published_documents_are_readable(self):
+        """Test that published documents are readable without a grant"""
+        permissions = permissions_for(make_request(self.reader))
+
+        assert permissions.can_read(self.published)
+        assert not permissions.can_read(self.published, include_published=False)
+        assert not permissions.can_read(self.draft)
+
+    def test_grants_load_once_per_request(self, django_assert_num_queries):
+        """Test that repeated checks reuse the loaded map"""
+        request = make_request(self.reader)
+        with django_assert_num_queries(1):
+            for _ in range(3):
+                permissions_for(request).can_write(self.draft)
+                permissions_for(request).can_admin(self.published)
+
+    def test_grants_are_cached_and_invalidated(self, django_assert_num_queries):
+        """Test the cached map across requests and its invalidation on share"""
+        load_user_grants(self.reader.pk)
+        with django_assert_num_queries(0):
+            assert load_user_grants(self.reader.pk) == {}
+
+        access = self.grant(self.draft, "read")
+        assert load_user_grants(self.reader.pk) == {str(self.draft.pk): "read"}
+
+        access.delete()
+        assert load_user_grants(self.reader.pk) == {}
@@ -0,0 +1,117 @@
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from .models import Document, DocumentStorageUsage, DocumentVersion, StorageUsage
+from .tasks import reconcile_storage_usage
+
+
+@pytest.mark.django_db
+class TestStorageUsage:
+    """Test cases for the maintained storage counters and quotas"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, media_root, locmem_cache, settings, api_client, user):
+        settings.STORAGE_QUOTA_BYTES = 0
+        settings.STORAGE_QUOTA_FILES = 0
+        api_client.force_authenticate(user=user)
+        self.user = user
+
+    def add_version(self, document, number, size):
+        return DocumentVersion.objects.create(
+            document=document,
+            version_number=number,
+            title=document.title,
+            created_by=self.user,
+            file=ContentFile(b"x" * size, name="file.txt"),
+        )
+
+    def usage(self):
+        return StorageUsage.objects.get(user=self.user)
+
+    def test_counters_follow_version_create_and_delete(self):
+        """Test that counters move with every stored version"""
+        document = Document.objects.create(title="Report", created_by=self.user)
+        first = self.add_version(document, 1, 100)
+        self.add_version(document, 2, 50)
+        DocumentVersion.objects.create(document=document, version_number=3, title="No file", created_by=self.user)
+
+        assert (self.usage().bytes_used, self.usage().files_count) == (150, 2)
+        document_usage = DocumentStorageUsage.objects.get(document=document)
+        assert (document_usage.bytes_used, document_usage.files_count) == (150, 2)
+
+        first.delete()
+        assert (self.usage().bytes_used, self.usage().files_count) == (50, 1)
+
+        document.delete()
+        assert (self.usage().bytes_used, self.usage().files_count) == (0, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """Test that the reconcile job recomputes counters from the versions"""
+        document = Document.objects.create(title="Report", created_by=self.user)
+        self.add_version(document, 1, 100)
+        StorageUsage.objects.filter(user=self.user).update(bytes_used=999, files_count=9)
+        DocumentStorageUsage.objects.filter(document=document).update(bytes_used=5)
+        empty = Document.objects.create(title="Empty", created_by=self.user)
+        DocumentStorageUsage.objects.create(document=empty, bytes_used=10, files_count=1)
+
+        result = reconcile_storage_usage()
+
+        assert result['result'] == {'documents': 1, 'users': 1}
+        assert (self.usage().bytes_used, self.usage().files_count) == (100, 1)
+        assert DocumentStorageUsage.objects.get(document=document).bytes_used == 100
+        assert DocumentStorageUsage.objects.get(document=empty).bytes_used == 0
+
+    def test_usage_endpoint(self, api_client, settings):
+        settings.STORAGE_QUOTA_BYTES = 1000
+        document = Document.objects.create(title="Report", created_by=self.user)
+        self.add_version(document, 1, 300)
+
+        response = api_client.get(reverse('storage-usage'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['bytes_used'] == 300
+        assert response.data['bytes_remaining'] == 700
+        assert response.data['quota_files'] is None
+        assert response.data['files_remaining'] is None
+
+    def test_upload_rejected_over_quota(self, api_client, settings):
+        """Test that uploads past the quota are refused before anything is stored"""
+        settings.STORAGE_QUOTA_BYTES = 120
+        document = Document.objects.create(title="Report", created_by=self.user)
+        self.add_version(document, 1, 100)
+
+        response = api_client.post(
+            reverse('document-create'),
+            {'title': 'Big', 'file': SimpleUploadedFile("big.txt", b"y" * 50)},
+            format='multipart',
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'quota' in str(response.data['file'][0])
+        assert not Document.objects.filter(title='Big').exists()
+
+        response = api_client.post(
+            reverse('document-upload-version', args=[document.id]),
+            {'file': SimpleUploadedFile("next.txt", b"y" * 50)},
+            format='multipart',
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert document.versions.count() == 1
+
+    def test_per_user_quota_overrides_default(self, api_client, settings):
+        settings.STORAGE_QUOTA_FILES = 1
+        document = Document.objects.create(title="Report", created_by=self.user)
+        self.add_version(document, 1, 10)
+        StorageUsage.objects.filter(user=self.user).update(quota_files=5)
+
+        response = api_client.post(
+            reverse('document-create'),
+            {'title': 'Second', 'file': SimpleUploadedFile("second.txt", b"z" * 10)},
+            format='multipart',
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert self.usage().files_count == 2
@@ -0,0 +1,241 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from .caching import get_tag_suggestions
+from .models import Document, Tag
+
+
+@pytest.mark.django_db
+class TestTagSuggestions:
+    """Test cases for tag auto-complete suggestions"""
+
+    @pytest.fixture(autouse=True)
+    def tags(self, locmem_cache, user):
+        Tag.objects.create(key="project", value="apollo", created_by=user)
+        Tag.objects.create(key="project", value="gemini", created_by=user)
+        Tag.objects.create(key="status", value="", created_by=user)
+        Tag.objects.create(key="team", value="platform", created_by=user)
+
+    def test_suggestions_include_key_and_values(self, user):
+        """Test that each key is suggested alone and with its values"""
+        suggestions = get_tag_suggestions(user)
+
+        assert suggestions == [
+            {"key": "project", "value": ""},
+            {"key": "project", "value": "apollo"},
+            {"key": "project", "value": "gemini"},
+            {"key": "status", "value": ""},
+            {"key": "team", "value": ""},
+            {"key": "team", "value": "platform"},
+        ]
+
+    def test_query_matches_value_returns_all_values_of_key(self, user):
+        """Test that matching one value suggests the whole key"""
+        suggestions = get_tag_suggestions(user, "gem")
+
+        assert suggestions == [
+            {"key": "project", "value": ""},
+            {"key": "project", "value": "apollo"},
+            {"key": "project", "value": "gemini"},
+        ]
+
+    def test_suggestions_run_in_a_single_query(self, user, django_assert_num_queries):
+        """Test that a cache miss costs exactly one query and a hit none"""
+        with django_assert_num_queries(1):
+            get_tag_suggestions(user, "pro")
+        with django_assert_num_queries(0):
+            get_tag_suggestions(user, "pro")
+
+    def test_longer_prefix_is_served_from_cache(self, user, django_assert_num_queries):
+        """Test that a complete shorter prefix answers longer queries"""
+        get_tag_suggestions(user, "")
+
+        with django_assert_num_queries(0):
+            suggestions = get_tag_suggestions(user, "PLAT")
+
+        assert suggestions == [
+            {"key": "team", "value": ""},
+            {"key": "team", "value": "platform"},
+        ]
+
+    def test_tag_changes_invalidate_cache(self, user):
+        """Test that creating or deleting a tag refreshes suggestions"""
+        get_tag_suggestions(user, "")
+
+        tag = Tag.objects.create(key="priority", value="high", created_by=user)
+        assert {"key": "priority", "value": "high"} in get_tag_suggestions(user, "")
+
+        tag.delete()
+        assert {"key": "priority", "value": "high"} not in get_tag_suggestions(user, "")
+
+    def test_deleted_documents_hide_their_tags(self, user):
+        """Test that tags only used by trashed documents are not suggested"""
+        tag = Tag.objects.get(key="team")
+        document = Document.objects.create(title="Roadmap", created_by=user)
+        document.tags.add(tag)
+        assert {"key": "team", "value": "platform"} in get_tag_suggestions(user, "")
+
+        document.soft_delete(user)
+        assert {"key": "team", "value": "platform"} not in get_tag_suggestions(user, "")
+
+    def test_suggestions_are_per_user(self, user, other_user):
+        """Test that other users' tags are never suggested"""
+        Tag.objects.create(key="secret", value="x", created_by=other_user)
+
+        assert all(s["key"] != "secret" for s in get_tag_suggestions(user, "sec"))
+
+    def test_suggestions_view(self, api_client, user):
+        """Test the suggestions endpoint"""
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(reverse('tag-suggestions'), {'q': 'stat'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [{"key": "status", "value": ""}]
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="otheruser",
+        email="other@example.com",
+        password="testpass123"
+    )
+
+
+@pytest.mark.django_db
+class TestSimilaritySearch:
+    """Test cases for the similarity-ranked lookup mode"""
+
+    def test_similar_tag_suggestions_tolerate_typos(self, locmem_cache, user):
+        """Test that a misspelt query still finds the tag"""
+        Tag.objects.create(key="department", value="finance", created_by=user)
+        Tag.objects.create(key="owner", value="", created_by=user)
+
+        suggestions = get_tag_suggestions(user, "finanse", mode="similar")
+
+        assert {"key": "department", "value": "finance"} in suggestions
+        assert all(s["key"] != "owner" for s in suggestions)
+
+    def test_similar_document_search_ranks_best_match_first(self, locmem_cache, api_client, user):
+        """Test the document list similarity search mode"""
+        api_client.force_authenticate(user=user)
+        Document.objects.create(title="Quarterly report", created_by=user)
+        Document.objects.create(title="Report", created_by=user)
+        Document.objects.create(title="Meeting notes", created_by=user)
+
+        response = api_client.get(reverse('document-list'), {'search': 'report', 'search_mode': 'similar'})
+
+        assert response.status_code == status.HTTP_200_OK
+        titles = [doc['title'] for doc in response.data['results']]
+        assert titles == ["Report", "Quarterly report"]
+
+    def test_similar_document_search_tolerates_typos(self, locmem_cache, api_client, user):
+        """Test that a typo in the title still matches"""
+        api_client.force_authenticate(user=user)
+        Document.objects.create(title="Roadmap", created_by=user)
+
+        response = api_client.get(reverse('document-list'), {'search': 'raodmap', 'search_mode': 'similar'})
+
+        assert [doc['title'] for doc in response.data['results']] == ["Roadmap"]
+
+
+@pytest.mark.django_db
+class TestTagUsageCounts:
+    """Test cases for annotated and maintained tag usage counts"""
+
+    @pytest.fixture
+    def tagged(self, locmem_cache, user):
+        tag = Tag.objects.create(key="project", value="apollo", created_by=user)
+        first = Document.objects.create(title="First", created_by=user)
+        second = Document.objects.create(title="Second", created_by=user)
+        first.tags.add(tag)
+        second.tags.add(tag)
+        return tag, first, second
+
+    def test_counter_follows_m2m_changes(self, tagged):
+        """Test that adding, removing and clearing tags updates usage_count"""
+        tag, first, second = tagged
+        tag.refresh_from_db()
+        assert tag.usage_count == 2
+
+        first.tags.remove(tag)
+        tag.refresh_from_db()
+        assert tag.usage_count == 1
+
+        second.tags.clear()
+        tag.refresh_from_db()
+        assert tag.usage_count == 0
+
+    def test_counter_ignores_deleted_documents(self, tagged):
+        """Test that soft delete, restore and hard delete update usage_count"""
+        tag, first, second = tagged
+        first.soft_delete(first.created_by)
+        tag.refresh_from_db()
+        assert tag.usage_count == 1
+
+        first.restore()
+        tag.refresh_from_db()
+        assert tag.usage_count == 2
+
+        second.delete()
+        tag.refresh_from_db()
+        assert tag.usage_count == 1
+
+    def test_ordinary_edits_do_not_recount(self, tagged):
+        """Test that title and status edits issue no tag UPDATE"""
+        tag, first, second = tagged
+        first = Document.objects.get(pk=first.pk)
+        first.title = "Renamed"
+        first.status = 'published'
+
+        with CaptureQueriesContext(connection) as context:
+            first.save()
+
+        assert not [q for q in context.captured_queries if q['sql'].startswith('UPDATE "documents_tag"')]
+
+    @pytest.mark.parametrize("mode", ["annotate", "counter"])
+    def test_with_documents_count(self, settings, tagged, mode):
+        """Test both ways of reading the count"""
+        settings.TAG_USAGE_COUNTS = mode
+        tag, first, second = tagged
+        first.soft_delete(first.created_by)
+
+        assert Tag.objects.with_documents_count().get(pk=tag.pk).documents_count == 1
+
+    def test_reconcile_job_repairs_drift(self, tagged):
+        """Test that the maintenance job recomputes every counter"""
+        from .tasks import reconcile_tag_usage_counts
+
+        tag = tagged[0]
+        Tag.objects.filter(pk=tag.pk).update(usage_count=99)
+
+        reconcile_tag_usage_counts()
+
+        tag.refresh_from_db()
+        assert tag.usage_count == 2
+
+    def test_tag_list_is_scoped_paginated_and_counted_in_one_query(
+        self, api_client, user, other_user, tagged, django_assert_max_num_queries
+    ):
+        """Test the tag list only shows the user's tags, with counts, in pages"""
+        Tag.objects.create(key="foreign", created_by=other_user)
+        for i in range(3):
+            Tag.objects.create(key=f"extra{i}", created_by=user)
+        api_client.force_authenticate(user=user)
+
+        # one SELECT, wrapped in the ATOMIC_REQUESTS savepoint
+        with django_assert_max_num_queries(3):
+            response = api_client.get(reverse('tag-list-create'), {'page_size': 2})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [t['key'] for t in response.data['results']] == ["extra0", "extra1"]
+        assert response.data['next']
+
+        response = api_client.get(response.data['next'])
+        keys = [t['key'] for t in response.data['results']]
+        assert keys == ["extra2", "project"]
+        assert response.data['results'][1]['documents_count'] == 2
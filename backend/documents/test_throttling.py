@@ -0,0 +1,151 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.urls import reverse
+from redis.exceptions import RedisError
+from rest_framework import status
+
+from backend import throttling
+from backend.throttling import parse_rate, take
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="other", email="other@example.com", password="testpass123"
+    )
+
+
+@pytest.mark.django_db
+class TestThrottling:
+    """Test cases for the token-bucket throttles"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, locmem_cache, settings):
+        settings.THROTTLE_ENABLED = True
+        settings.THROTTLE_SCOPES = {
+            'auth': {'ip': '3/min'},
+            'heavy': {'user': '40/hour'},
+        }
+        self.settings = settings
+
+    def test_parse_rate(self):
+        assert parse_rate('30/min') == (30, 0.5)
+        assert parse_rate('3600/hour') == (3600, 1)
+
+    def test_bucket_refills_over_time(self):
+        buckets = [('bucket', 2, 1.0)]
+        with patch('backend.throttling.time.time', return_value=1000.0):
+            assert take(buckets) == 0
+            assert take(buckets) == 0
+            assert take(buckets) == pytest.approx(1.0)
+        with patch('backend.throttling.time.time', return_value=1000.5):
+            assert take(buckets) == pytest.approx(0.5)
+        with patch('backend.throttling.time.time', return_value=1001.0):
+            assert take(buckets) == 0
+
+    def test_all_buckets_are_charged_or_none(self):
+        small, large = ('small', 1, 0.001), ('large', 10, 0.001)
+        assert take([small, large]) == 0
+        assert take([small, large]) > 0
+        # The refused request did not take from the large bucket
+        assert take([large], cost=9) == 0
+
+    def test_login_is_limited_per_ip(self, api_client, user):
+        data = {'email': user.email, 'password': 'testpass123'}
+        for _ in range(3):
+            assert api_client.post(reverse('user-login'), data).status_code == status.HTTP_200_OK
+
+        response = api_client.post(reverse('user-login'), data)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response['Retry-After']) > 0
+
+        other_ip = api_client.post(reverse('user-login'), data, REMOTE_ADDR='10.0.0.2')
+        assert other_ip.status_code == status.HTTP_200_OK
+
+    def test_forwarded_for_is_not_trusted_without_proxies(self, api_client, user):
+        data = {'email': user.email, 'password': 'testpass123'}
+        for i in range(3):
+            api_client.post(reverse('user-login'), data, HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+
+        response = api_client.post(reverse('user-login'), data, HTTP_X_FORWARDED_FOR='203.0.113.99')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_auth_is_limited_per_target_account_and_ip(self, api_client, user, other_user):
+        self.settings.THROTTLE_SCOPES = {'auth': {'ip': '100/min', 'account_ip': '2/min'}}
+        wrong = {'email': user.email.upper(), 'password': 'wrong'}
+        for _ in range(2):
+            api_client.post(reverse('user-login'), wrong, REMOTE_ADDR='10.0.1.1')
+
+        response = api_client.post(reverse('user-login'), wrong, REMOTE_ADDR='10.0.1.1')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        # Guesses from elsewhere do not lock the owner out
+        right = {'email': user.email, 'password': 'testpass123'}
+        assert api_client.post(reverse('user-login'), right, REMOTE_ADDR='10.0.1.2').status_code == 200
+        other = {'email': other_user.email, 'password': 'testpass123'}
+        assert api_client.post(reverse('user-login'), other, REMOTE_ADDR='10.0.1.1').status_code == 200
+
+    def test_mfa_guesses_are_limited_per_user_id(self, api_client, user):
+        self.settings.THROTTLE_SCOPES = {'auth': {'ip': '100/min', 'account_ip': '2/min'}}
+        for _ in range(2):
+            api_client.post(reverse('mfa-verify'), {'user_id': user.id, 'code': '000000'}, REMOTE_ADDR='10.0.2.1')
+
+        response = api_client.post(reverse('mfa-verify'), {'user_id': user.id, 'code': '000000'}, REMOTE_ADDR='10.0.2.1')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_reset_requests_do_not_throttle_logins(self, api_client, user):
+        self.settings.THROTTLE_SCOPES = {
+            'auth': {'ip': '100/min', 'account_ip': '2/min'},
+            'email': {'ip': '100/min', 'account': '2/min'},
+        }
+        for i in range(2):
+            api_client.post(reverse('password-reset-request'), {'email': user.email}, REMOTE_ADDR=f'10.0.3.{i}')
+        response = api_client.post(reverse('password-reset-request'), {'email': user.email}, REMOTE_ADDR='10.0.3.99')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        data = {'email': user.email, 'password': 'testpass123'}
+        for ip in ('10.0.3.0', '10.0.3.99'):
+            assert api_client.post(reverse('user-login'), data, REMOTE_ADDR=ip).status_code == status.HTTP_200_OK
+
+    def test_heavy_endpoints_cost_more(self, api_client, user, other_user):
+        api_client.force_authenticate(user=user)
+        url = reverse('documents-archive')
+
+        # An archive costs 20 of the 40 tokens an hour
+        assert api_client.post(url, {'document_ids': []}, format='json').status_code != 429
+        assert api_client.post(url, {'document_ids': []}, format='json').status_code != 429
+        assert api_client.post(url, {'document_ids': []}, format='json').status_code == 429
+
+        # Budgets are per user
+        api_client.force_authenticate(user=other_user)
+        assert api_client.post(url, {'document_ids': []}, format='json').status_code != 429
+
+    def test_disabled(self, api_client, user):
+        self.settings.THROTTLE_ENABLED = False
+        data = {'email': user.email, 'password': 'testpass123'}
+        for _ in range(5):
+            assert api_client.post(reverse('user-login'), data).status_code == status.HTTP_200_OK
+
+    def test_redis_runs_one_script_for_all_buckets(self):
+        script = MagicMock(return_value=1500)
+        client = MagicMock()
+        client.register_script.return_value = script
+
+        with patch('backend.throttling._redis', return_value=client), \
+                patch('backend.throttling._script', None):
+            assert take([('a', 10, 1.0), ('b', 5, 0.5)], cost=2) == 1.5
+
+        client.register_script.assert_called_once_with(throttling.TAKE_TOKENS)
+        kwargs = script.call_args.kwargs
+        assert len(kwargs['keys']) == 2
+        assert kwargs['args'] == [2, 10, 1.0, 5, 0.5]
+        assert kwargs['client'] is client
+
+    def test_redis_errors_let_requests_through(self):
+        client = MagicMock()
+        client.register_script.return_value = MagicMock(side_effect=RedisError('down'))
+
+        with patch('backend.throttling._redis', return_value=client), \
+                patch('backend.throttling._script', None):
+            assert take([('a', 1, 1.0)], cost=1) == 0
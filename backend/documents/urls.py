@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [    # Tags
     path('tags/', views.TagListCreateView.as_view(), name='tag-list-create'),
@@ -10,8 +10,11 @@ urlpatterns = [    # Tags
     path('documents/', views.DocumentListView.as_view(), name='document-list'),
     path('documents/create/', views.DocumentCreateView.as_view(), name='document-create'),
     path('documents/deleted/', views.deleted_documents, name='deleted-documents'),
+    path('documents/bulk/', views.bulk_document_actions, name='document-bulk-actions'),
+    path('documents/bulk/tags/', views.bulk_document_tags, name='document-bulk-tags'),
+    path('documents/archive/', views.documents_archive, name='documents-archive'),
     path('documents/<uuid:pk>/', views.DocumentDetailView.as_view(), name='document-detail'),
-    path('documents/<uuid:pk>/download/', views.document_download, name='document-download'),
+    path('documents/<uuid:pk>/download/', async_views.document_download, name='document-download'),
     path('documents/<uuid:pk>/share/', views.document_share, name='document-share'),
     path('documents/<uuid:pk>/restore/', views.restore_document, name='document-restore'),
     path('documents/<uuid:pk>/permanent/', views.permanent_delete_document, name='document-permanent-delete'),
@@ -19,10 +22,13 @@ urlpatterns = [    # Tags
     
     # Document Versions
     path('documents/<uuid:pk>/versions/', views.document_version_history, name='document-version-history'),
+    path('documents/<uuid:pk>/versions/archive/', views.document_versions_archive, name='document-versions-archive'),
     path('documents/<uuid:pk>/versions/create/', views.create_document_version, name='create-document-version'),
-    path('documents/<uuid:pk>/versions/<uuid:version_id>/download/', views.download_document_version, name='download-document-version'),
+    path('documents/<uuid:pk>/versions/<uuid:version_id>/download/', async_views.download_document_version, name='download-document-version'),
     path('documents/<uuid:pk>/versions/<uuid:version_id>/delete/', views.delete_document_version, name='delete-document-version'),
     path('documents/<uuid:pk>/rollback/', views.rollback_document, name='rollback-document'),
-    path('documents/<uuid:pk>/metadata/', views.get_document_metadata_for_version, name='get-document-metadata'),
+    path('documents/<uuid:pk>/metadata/', async_views.get_document_metadata_for_version, name='get-document-metadata'),
+    path('changes/', views.change_feed, name='change-feed'),
+    path('storage/usage/', views.storage_usage, name='storage-usage'),
     path('sync-all-tags-to-s3/', views.sync_all_document_tags_to_s3, name='sync-all-tags-to-s3'),
 ]
@@ -0,0 +1,127 @@
+"""
+Storage usage counters and quotas.
+
+Every stored version file adds its size to two counters: one per document
+(``DocumentStorageUsage``) and one per document owner (``StorageUsage``).
+The counters are adjusted with ``F()`` updates in the same transaction as
+the version insert / delete (see ``signals.py``), so reading usage or
+checking a quota is a single-row lookup. Soft-deleted documents still count
+until they are purged. ``reconcile()`` recomputes everything from the
+versions table and is run nightly by the ``storage_usage_reconcile`` job.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+
+from .models import Document, DocumentStorageUsage, DocumentVersion, StorageUsage
+
+STORED_FILE = Q(file__isnull=False) & ~Q(file='')
+
+
+class QuotaExceeded(Exception):
+    """Storing the upload would take the user over their storage quota"""
+
+
+def _adjust(model, lookup, bytes_delta, files_delta):
+    values = {
+        'bytes_used': F('bytes_used') + bytes_delta,
+        'files_count': F('files_count') + files_delta,
+    }
+    # Removals never create rows: the counter may already be gone with its
+    # document or user in a cascade
+    if not model.objects.filter(**lookup).update(**values) and files_delta > 0:
+        model.objects.get_or_create(**lookup)
+        model.objects.filter(**lookup).update(**values)
+
+
+def _owner_id(version):
+    try:
+        return version.document.created_by_id
+    except Document.DoesNotExist:
+        return None  # cascade from the owner's deletion; their counter goes too
+
+
+def version_stored(version, removed=False):
+    """Count a version's file in (or, with ``removed``, out of) its counters"""
+    if not version.file:
+        return
+    sign = -1 if removed else 1
+    size = (version.file_size or 0) * sign
+    _adjust(DocumentStorageUsage, {'document_id': version.document_id}, size, sign)
+    owner_id = _owner_id(version)
+    if owner_id:
+        _adjust(StorageUsage, {'user_id': owner_id}, size, sign)
+
+
+def limits(usage):
+    """(quota_bytes, quota_files) for a usage row; None means unlimited"""
+    quota_bytes = usage.quota_bytes if usage.quota_bytes is not None else settings.STORAGE_QUOTA_BYTES or None
+    quota_files = usage.quota_files if usage.quota_files is not None else settings.STORAGE_QUOTA_FILES or None
+    return quota_bytes, quota_files
+
+
+def usage_for(user_id):
+    return StorageUsage.objects.filter(user_id=user_id).first() or StorageUsage(user_id=user_id)
+
+
+def check_quota(user_id, incoming_bytes, incoming_files=1):
+    """Raise QuotaExceeded if storing ``incoming_bytes`` more would exceed the quota"""
+    usage = usage_for(user_id)
+    quota_bytes, quota_files = limits(usage)
+    if quota_bytes is not None and usage.bytes_used + incoming_bytes > quota_bytes:
+        raise QuotaExceeded(
+            f'Storage quota exceeded: {usage.bytes_used + incoming_bytes} of {quota_bytes} bytes'
+        )
+    if quota_files is not None and usage.files_count + incoming_files > quota_files:
+        raise QuotaExceeded(f'File quota exceeded: at most {quota_files} files')
+
+
+def usage_summary(user_id):
+    usage = usage_for(user_id)
+    quota_bytes, quota_files = limits(usage)
+    return {
+        'bytes_used': usage.bytes_used,
+        'files_count': usage.files_count,
+        'quota_bytes': quota_bytes,
+        'quota_files': quota_files,
+        'bytes_remaining': max(quota_bytes - usage.bytes_used, 0) if quota_bytes is not None else None,
+        'files_remaining': max(quota_files - usage.files_count, 0) if quota_files is not None else None,
+    }
+
+
+def _upsert(model, field, totals, batch_size):
+    """Write ``totals`` ({related_id: (bytes, files)}) into the counters keyed by ``field``"""
+    model.objects.bulk_create(
+        [
+            model(**{f'{field}_id': pk, 'bytes_used': size, 'files_count': files})
+            for pk, (size, files) in totals.items()
+        ],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=[field],
+        update_fields=['bytes_used', 'files_count'],
+    )
+    return len(totals)
+
+
+def reconcile(batch_size=1000):
+    """Recompute every counter from the versions table"""
+    versions = DocumentVersion.objects.filter(STORED_FILE).order_by()
+
+    per_document = {
+        row['document_id']: (row['total'], row['files'])
+        for row in versions.values('document_id').annotate(total=Sum('file_size'), files=Count('id'))
+    }
+    per_user = {
+        row['document__created_by']: (row['total'], row['files'])
+        for row in versions.values('document__created_by').annotate(total=Sum('file_size'), files=Count('id'))
+    }
+
+    documents = _upsert(DocumentStorageUsage, 'document', per_document, batch_size)
+    DocumentStorageUsage.objects.exclude(document_id__in=versions.values('document_id')).update(
+        bytes_used=0, files_count=0
+    )
+    users = _upsert(StorageUsage, 'user', per_user, batch_size)
+    StorageUsage.objects.exclude(user_id__in=versions.values('document__created_by')).update(
+        bytes_used=0, files_count=0
+    )
+    return {'documents': documents, 'users': users}
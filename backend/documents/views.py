@@ -1,9 +1,11 @@
 from rest_framework import generics, permissions, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from django.http import Http404
+from django.core.exceptions import ValidationError
+from django.utils.text import get_valid_filename
 from .models import Document, DocumentVersion, Tag, DocumentAccess
 from .serializers import (
     DocumentListSerializer,
@@ -15,28 +17,50 @@ from .serializers import (
     DocumentRollbackSerializer,
     DocumentVersionHistorySerializer,
     DocumentVersionCreateSerializer,
+    BulkTagSerializer,
+    BulkDocumentActionSerializer,
 )
-from .filters import DocumentFilter
+from .filters import DocumentFilter, DocumentSearchFilter
+from .permissions import permissions_for
+from . import changes
+from .conditional import document_validators, list_validators, not_modified, set_validators
+from .caching import get_document_representation, get_tag_suggestions
+from .bulk import BulkOperationError, bulk_document_action, bulk_update_tags
+from .archive import ARCHIVE_MAX_DOCUMENTS, document_entries, stream_zip, version_entries
+from .usage import QuotaExceeded, check_quota, usage_summary
+from accounts.summaries import UserSideloadMixin
 from audit.models import AuditLog
+from backend.throttling import throttle
 import json
 import boto3
 from django.conf import settings
 from s3_file_manager import update_s3_object_tags
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import CursorPagination
 
 
-class TagListCreateView(generics.ListCreateAPIView):
+class TagPagination(CursorPagination):
+    """Keyset pagination over (key, value, id); no COUNT or OFFSET scans"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('key', 'value', 'id')
+
+
+class TagListCreateView(UserSideloadMixin, generics.ListCreateAPIView):
     """List and create tags"""
 
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TagPagination
 
     def get_queryset(self):
-        # Only return tags that are either:
-        # 1. Associated with non-deleted documents, OR
-        # 2. Not associated with any documents yet (for new tag creation)
-        # Return all tags created by the user, associated with non-deleted documents or not associated yet
-        return Tag.objects.all()
+        # The user's own tags with usage counts annotated in the same query
+        return (
+            Tag.objects.filter(created_by=self.request.user)
+            .select_related('created_by')
+            .with_documents_count()
+        )
 
     def perform_create(self, serializer):
         tag = serializer.save()
@@ -90,15 +114,15 @@ class TagDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
-class DocumentListView(generics.ListAPIView):
+class DocumentListView(UserSideloadMixin, generics.ListAPIView):
     """List documents with filtering and search"""
 
     serializer_class = DocumentListSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        DocumentSearchFilter,
     ]
     filterset_class = DocumentFilter
     search_fields = ["title", "description"]
@@ -131,7 +155,14 @@ class DocumentListView(generics.ListAPIView):
         return queryset
 
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
+        # Conditional GET: answer 304 before paginating or serializing
+        etag, last_modified = list_validators(
+            request, self.filter_queryset(self.get_queryset())
+        )
+        response = not_modified(request, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        set_validators(response, etag, last_modified)
 
         # Log document list access
         AuditLog.log_activity(
@@ -176,12 +207,20 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
             content_object=instance,
             request=request,
         )
-        return super().retrieve(request, *args, **kwargs)
+        etag, last_modified = document_validators(request, instance)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        data = get_document_representation(
+            instance, request, lambda document: self.get_serializer(document).data
+        )
+        return set_validators(Response(data), etag, last_modified)
 
     def perform_update(self, serializer):
         instance = self.get_object()
         user = self.request.user
-        if instance.created_by != user:
+        if not permissions_for(self.request).is_owner(instance):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You do not have permission to edit this document.")
         document = serializer.save()
@@ -207,7 +246,7 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_destroy(self, instance):
         user = self.request.user
-        if instance.created_by != user:
+        if not permissions_for(self.request).is_owner(instance):
             from rest_framework.exceptions import PermissionDenied
 
             raise PermissionDenied(
@@ -227,6 +266,7 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
 class DocumentCreateView(generics.CreateAPIView):
     serializer_class = DocumentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttle("heavy", cost=5)]
 
     def perform_create(self, serializer):
         document = serializer.save()  # Uploads file to S3 via django-storages
@@ -254,40 +294,7 @@ class DocumentCreateView(generics.CreateAPIView):
         )
 
 
-@api_view(["GET", "POST"])
-@permission_classes([permissions.IsAuthenticated])
-def document_download(request, pk):
-    """Download document file"""
-    try:
-        user = request.user
-        document = Document.objects.get(pk=pk)
-
-        # Log download
-        AuditLog.log_activity(
-            user=user,
-            action="download",
-            resource_type="document",
-            resource_id=str(document.id),
-            resource_name=document.title,
-            content_object=document,
-            request=request,
-        )
-
-        return Response(
-            {
-                "download_url": request.build_absolute_uri(document.file.url),
-                "filename": document.file.name.split("/")[-1],
-                "file_size": document.file_size,
-            }
-        )
-
-    except Document.DoesNotExist:
-        return Response(
-            {"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND
-        )
-
-
-class DocumentVersionListView(generics.ListAPIView):
+class DocumentVersionListView(UserSideloadMixin, generics.ListAPIView):
     """List document versions"""
 
     serializer_class = DocumentVersionSerializer
@@ -299,12 +306,9 @@ class DocumentVersionListView(generics.ListAPIView):
         # Verify user has access to the document
         try:
             document = Document.objects.get(pk=document_id)
-            user = self.request.user
 
-            if document.created_by != user:
-                access = document.access_permissions.filter(user=user).first()
-                if not access:
-                    return DocumentVersion.objects.none()
+            if not permissions_for(self.request).can_read(document, include_published=False):
+                return DocumentVersion.objects.none()
 
             return DocumentVersion.objects.filter(document=document)
 
@@ -321,14 +325,10 @@ def document_share(request, pk):
         user = request.user
 
         # Check if user can share (owner or admin)
-        if document.created_by != user:
-            access = document.access_permissions.filter(
-                user=user, permission="admin"
-            ).first()
-            if not access:
-                return Response(
-                    {"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN
-                )
+        if not permissions_for(request).can_admin(document):
+            return Response(
+                {"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN
+            )
 
         email = request.data.get("email")
         permission = request.data.get("permission", "read")
@@ -385,6 +385,98 @@ def document_share(request, pk):
         )
 
 
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+@throttle_classes([throttle("heavy", cost=10)])
+def bulk_document_tags(request):
+    """Add, remove or replace tags on many documents in one call"""
+    serializer = BulkTagSerializer(data=request.data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+    try:
+        result = bulk_update_tags(
+            user=request.user,
+            document_ids=serializer.validated_data["document_ids"],
+            operation=serializer.validated_data["operation"],
+            tag_ids=serializer.validated_data["tag_ids"],
+            request=request,
+        )
+    except BulkOperationError as e:
+        return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+@throttle_classes([throttle("heavy", cost=10)])
+def bulk_document_actions(request):
+    """Change status, soft delete, restore or share many documents at once"""
+    serializer = BulkDocumentActionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    try:
+        result = bulk_document_action(
+            user=request.user,
+            action=data["action"],
+            document_ids=data.get("document_ids"),
+            filters=data.get("filters"),
+            status=data.get("status"),
+            email=data.get("email"),
+            permission=data["permission"],
+            request=request,
+        )
+    except BulkOperationError as e:
+        return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def change_feed(request):
+    """
+    Changes visible to the user since ``cursor``, oldest first.
+
+    Without a cursor the feed starts at the oldest retained change;
+    ``?cursor=latest`` returns no changes and the current position, for
+    clients that have just done a full sync.
+    """
+    cursor = request.query_params.get("cursor")
+    try:
+        limit = min(max(int(request.query_params.get("limit", 200)), 1), 1000)
+    except ValueError:
+        return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if cursor == "latest":
+        return Response({"results": [], "cursor": changes.latest_cursor(), "has_more": False})
+
+    try:
+        after = changes.decode_cursor(cursor) if cursor else None
+        entries, has_more, last_sequence = changes.changes_for(request.user, after, limit)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except changes.CursorExpired:
+        return Response(
+            {"error": "Cursor has expired, a full resync is required"},
+            status=status.HTTP_410_GONE,
+        )
+
+    return Response({
+        "results": [
+            {
+                "resource_type": entry.resource_type,
+                "resource_id": entry.resource_id,
+                "document_id": entry.document_id,
+                "action": entry.action,
+                "changed_at": entry.changed_at,
+            }
+            for entry in entries
+        ],
+        # A client that has seen everything resumes after the whole log, not
+        # after its last visible entry, so its cursor never falls behind pruning
+        "cursor": changes.encode_cursor(entries[-1].sequence if has_more else last_sequence),
+        "has_more": has_more,
+    })
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def restore_document(request, pk):
@@ -395,14 +487,10 @@ def restore_document(request, pk):
 
         # Check restore permissions (only owner or admin can restore)
         user = request.user
-        if document.created_by != user:
-            access = document.access_permissions.filter(
-                user=user, permission="admin"
-            ).first()
-            if not access:
-                return Response(
-                    {"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN
-                )
+        if not permissions_for(request).can_admin(document):
+            return Response(
+                {"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN
+            )
 
         # Restore the document
         document.restore()
@@ -440,7 +528,7 @@ def deleted_documents(request):
     deleted_docs = Document.objects.deleted_only().filter(created_by=user)
 
     # Grace period in days (configurable)
-    GRACE_PERIOD_DAYS = 30
+    GRACE_PERIOD_DAYS = settings.TRASH_GRACE_PERIOD_DAYS
 
     documents_data = []
     for doc in deleted_docs:
@@ -466,46 +554,10 @@ def deleted_documents(request):
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def tag_suggestions(request):
-    """Get tag suggestions for auto-complete"""
+    """Get tag suggestions for auto-complete (?mode=similar for typo-tolerant ranking)"""
     query = request.query_params.get("q", "").strip()
-    user = request.user
-    # Get unique keys for the user (only from non-deleted documents)
-    keys_queryset = (
-        Tag.objects.filter(created_by=user)
-        .filter(Q(documents__isnull=True) | Q(documents__is_deleted=False))
-        .distinct()
-    )
-
-    if query:
-        # Filter by key or value containing the query
-        keys_queryset = keys_queryset.filter(
-            Q(key__icontains=query) | Q(value__icontains=query)
-        )
-
-    # Get unique keys
-    unique_keys = set(keys_queryset.values_list("key", flat=True))
-    # For each key, get all unique values (only from non-deleted documents)
-    suggestions = []
-    for key in unique_keys:
-        values = (
-            Tag.objects.filter(created_by=user, key=key)
-            .filter(Q(documents__isnull=True) | Q(documents__is_deleted=False))
-            .values_list("value", flat=True)
-            .distinct()
-        )
-
-        # Add the key without value
-        suggestions.append({"key": key, "value": ""})
-
-        # Add key-value combinations
-        for value in values:
-            if value:  # Only add non-empty values
-                suggestions.append({"key": key, "value": value})
-
-    # Sort suggestions
-    suggestions.sort(key=lambda x: (x["key"], x["value"]))
-
-    return Response(suggestions[:20])  # Limit to 20 suggestions
+    mode = request.query_params.get("mode", "prefix")
+    return Response(get_tag_suggestions(request.user, query, mode=mode))
 
 
 @api_view(["DELETE"])
@@ -515,7 +567,7 @@ def permanent_delete_document(request, pk):
     try:
         user = request.user
         document = Document.objects.all_with_deleted().get(pk=pk)
-        if document.created_by != user:
+        if not permissions_for(request).is_owner(document):
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
 
         # Delete file from S3 if exists
@@ -629,6 +681,7 @@ def document_rollback(request, pk):
 
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([throttle("heavy", cost=5)])
 def upload_document_version(request, pk):
     """Upload a new version of a document (file)."""
     from s3_file_manager import update_s3_object_tags
@@ -636,11 +689,15 @@ def upload_document_version(request, pk):
         document = Document.objects.get(pk=pk)
     except Document.DoesNotExist:
         return Response({"detail": "Document not found."}, status=404)
-    if document.created_by != request.user:
+    if not permissions_for(request).is_owner(document):
         return Response({"detail": "You do not have permission to upload a new version for this document."}, status=403)
     if 'file' not in request.FILES:
         return Response({"detail": "No file uploaded."}, status=400)
     new_file = request.FILES['file']
+    try:
+        check_quota(document.created_by_id, new_file.size)
+    except QuotaExceeded as e:
+        return Response({"detail": str(e)}, status=400)
     # Get next version number  
     next_version = document.versions.count() + 1
     
@@ -685,15 +742,9 @@ def document_version_history(request, pk):
         return Response({"detail": "Document not found."}, status=404)
     
     # Check if user has permission to view document
-    if document.created_by != request.user:
-        # Allow access if document is published OR user has explicit permissions
-        if document.status != 'published':
-            access = document.access_permissions.filter(
-                user=request.user,
-                permission__in=['read', 'write', 'admin']
-            ).first()
-            if not access:
-                return Response({"detail": "You do not have permission to view this document."}, status=403)
+    # Allow access if document is published OR user has explicit permissions
+    if not permissions_for(request).can_read(document):
+        return Response({"detail": "You do not have permission to view this document."}, status=403)
     
     versions = document.versions.all().order_by('-version_number')
     serializer = DocumentVersionHistorySerializer(versions, many=True, context={'request': request})
@@ -708,6 +759,7 @@ def document_version_history(request, pk):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([throttle('heavy', cost=5)])
 def create_document_version(request, pk):
     """Create a new version of a document (owner only)"""
     try:
@@ -716,7 +768,7 @@ def create_document_version(request, pk):
         return Response({"detail": "Document not found."}, status=404)
     
     # Check if user is the document owner
-    if document.created_by != request.user:
+    if not permissions_for(request).is_owner(document):
         return Response({"detail": "Only the document owner can create new versions."}, status=403)
     
     # Debug logging
@@ -774,7 +826,7 @@ def rollback_document(request, pk):
         return Response({"detail": "Document not found."}, status=404)
     
     # Check if user is the document owner
-    if document.created_by != request.user:
+    if not permissions_for(request).is_owner(document):
         return Response({"detail": "Only the document owner can rollback versions."}, status=403)
     
     serializer = DocumentRollbackSerializer(
@@ -793,78 +845,85 @@ def rollback_document(request, pk):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
+def _zip_response(entries, filename):
+    from django.http import StreamingHttpResponse
+
+    response = StreamingHttpResponse(stream_zip(entries), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
-def download_document_version(request, pk, version_id):
-    """Download a specific version of a document"""
+@throttle_classes([throttle("heavy", cost=20)])
+def documents_archive(request):
+    """Stream a ZIP of the current file of each selected document"""
+    document_ids = request.data.get("document_ids") or []
+    if not isinstance(document_ids, list) or not document_ids:
+        return Response({"error": "document_ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(document_ids) > ARCHIVE_MAX_DOCUMENTS:
+        return Response(
+            {"error": f"At most {ARCHIVE_MAX_DOCUMENTS} documents per archive"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user = request.user
     try:
-        document = Document.objects.get(pk=pk)
-        version = document.versions.get(id=version_id)
-    except (Document.DoesNotExist, DocumentVersion.DoesNotExist):
-        return Response({"detail": "Document or version not found."}, status=404)
-    
-    # Check if user has permission to view document
-    if document.created_by != request.user:
-        access = document.access_permissions.filter(
-            user=request.user,
-            permission__in=['read', 'write', 'admin']
-        ).first()
-        if not access:
-            return Response({"detail": "You do not have permission to view this document."}, status=403)
-    
-    if not version.file:
-        return Response({"detail": "No file associated with this version."}, status=404)
-    
-    # Log download
-    AuditLog.log_activity(
-        user=request.user,
-        action="download",
-        resource_type="document_version",
-        resource_id=str(version.id),
-        resource_name=f"{document.title} v{version.version_number}",
-        details={
-            "document_id": str(document.id),
-            "version_number": version.version_number
-        },
-        content_object=version,
-        request=request,
-    )
-    
-    # Return file download response
-    from django.http import HttpResponse
-    from django.utils.encoding import smart_str
-    import mimetypes
-    
-    response = HttpResponse(version.file.read(), content_type=mimetypes.guess_type(version.file.name)[0])
-    response['Content-Disposition'] = f'attachment; filename="{smart_str(version.file.name.split("/")[-1])}"'
-    return response
+        documents = list(
+            Document.objects.filter(id__in=document_ids)
+            .filter(Q(status="published") | Q(created_by=user) | Q(access_permissions__user=user))
+            .select_related("current_version")
+            .distinct()
+            .order_by("title")
+        )
+    except ValidationError:
+        return Response({"error": "Invalid document id"}, status=status.HTTP_400_BAD_REQUEST)
+    if not documents:
+        return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    AuditLog.log_many([
+        AuditLog.build_entry(
+            user=user,
+            action="download",
+            resource_type="document",
+            resource_id=str(document.id),
+            resource_name=document.title,
+            details={"archive": True},
+            content_object=document,
+            request=request,
+        )
+        for document in documents
+    ])
+    return _zip_response(document_entries(documents), "documents.zip")
 
-@api_view(['GET'])
+
+@api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
-def get_document_metadata_for_version(request, pk):
-    """Get current document metadata for creating a new version"""
+@throttle_classes([throttle("heavy", cost=20)])
+def document_versions_archive(request, pk):
+    """Stream a ZIP of every version of a document"""
     try:
         document = Document.objects.get(pk=pk)
     except Document.DoesNotExist:
         return Response({"detail": "Document not found."}, status=404)
-    
-    # Check if user has permission to edit document
-    if document.created_by != request.user:
-        access = document.access_permissions.filter(
-            user=request.user,
-            permission__in=['write', 'admin']
-        ).first()
-        if not access:
-            return Response({"detail": "You do not have permission to edit this document."}, status=403)
-    
-    # Return current document metadata
-    return Response({
-        'title': document.title,
-        'description': document.description,
-        'tags': TagSerializer(document.tags.all(), many=True).data,
-        'current_version': document.current_version.version_number if document.current_version else 0
-    })
+
+    if not permissions_for(request).can_read(document, include_published=False):
+        return Response({"detail": "You do not have permission to view this document."}, status=403)
+
+    versions = list(document.versions.order_by("version_number"))
+    AuditLog.log_activity(
+        user=request.user,
+        action="download",
+        resource_type="document",
+        resource_id=str(document.id),
+        resource_name=document.title,
+        details={"archive": True, "versions": len(versions)},
+        content_object=document,
+        request=request,
+    )
+    filename = get_valid_filename(f"{document.title}-versions.zip")
+    return _zip_response(version_entries(versions), filename)
+
 
 @api_view(['DELETE'])
 @permission_classes([permissions.IsAuthenticated])
@@ -877,7 +936,7 @@ def delete_document_version(request, pk, version_id):
         return Response({"detail": "Document or version not found."}, status=404)
     
     # Check if user is the document owner
-    if document.created_by != request.user:
+    if not permissions_for(request).is_owner(document):
         return Response({"detail": "Only the document owner can delete versions."}, status=403)
     
     # Prevent deletion of the current version
@@ -927,25 +986,28 @@ def delete_document_version(request, pk, version_id):
     return Response({"message": "Version deleted successfully."}, status=204)
 
 
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def storage_usage(request):
+    """Bytes and files the user stores, with their quota"""
+    return Response(usage_summary(request.user.pk))
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAdminUser])
+@throttle_classes([throttle("heavy", cost=100)])
 def sync_all_document_tags_to_s3(request):
     """Sync all document tags in the database to S3 for all documents with files."""
-    from s3_file_manager import update_s3_object_tags
-    updated = 0
-    failed = []
-    for doc in Document.objects.filter(file__isnull=False):
-        tags_dict = {tag.key: tag.value for tag in doc.tags.all()}
-        try:
-            ok = update_s3_object_tags(doc.file.name, tags_dict)
-            if ok:
-                updated += 1
-            else:
-                failed.append(doc.id)
-        except Exception as e:
-            failed.append(doc.id)
+    from .tasks import sync_tags_for_documents
+    documents = (
+        Document.objects.filter(current_version__file__isnull=False)
+        .exclude(current_version__file='')
+        .select_related('current_version')
+        .prefetch_related('current_version__tags', 'tags')
+    )
+    result = sync_tags_for_documents(documents)
     return Response({
-        "updated": updated,
-        "failed": failed,
-        "total": Document.objects.filter(file__isnull=False).count(),
+        "updated": result["updated"],
+        "failed": result["failed"],
+        "total": documents.count(),
     })